@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the Cloud Run entry points
+(ocr_sheet.py / recheck_ocr.py / summary_daily_record.py).
+
+- ocr_parse  : OCR text → duration / km / photo date (regexes compiled once at import)
+- drive_ocr  : Drive download + Vision OCR wrapper
+- sheets_io  : Google API clients + Sheets values / grid helpers
+- startup    : import-time budget per entry point (``python -m core.startup``)
+
+Heavy optional dependencies (Vision, PIL, googleapiclient.discovery, pyarrow, numpy)
+are imported inside the function that needs them, not at module import.
+
+Deploy: copy this folder next to main.py in each function's source.
+"""
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Drive download + Vision OCR wrapper (ใช้ร่วมกันระหว่าง ocr_sheet และ recheck_ocr).
+
+dependency หนักโหลดเมื่อใช้ครั้งแรกเท่านั้น (entry point ที่ไม่ได้ OCR ไม่ต้องจ่าย):
+- ``google.cloud.vision`` (~0.45 วินาที) — client เดียวต่อ process (gRPC, thread-safe) แทนการสร้างใหม่ทุกภาพ
+- ``PIL`` — ตรวจ byte ว่าเป็นรูปจริง
+- ``googleapiclient.http.MediaIoBaseDownload`` — ดาวน์โหลดไฟล์จาก Drive
+
+``ocr_image_bytes_safe`` กันพัง 3 ชั้น: metadata → byte เป็นรูปได้จริง → Vision ใน try/except
+"""
+
+import io
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+ALLOWED_IMAGE_MIMES = {
+    "image/jpeg", "image/png", "image/webp", "image/gif",
+    "image/tiff", "image/bmp"  # เพิ่มได้ตามที่คุณรองรับจริง
+}
+ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".tif", ".tiff", ".bmp"}
+
+# รองรับ comma/space/newline และแพทเทิร์น /d/<id> หรือ ?id=<id>
+_LINK_SPLIT_RE = re.compile(r"[, \n]+")
+_DRIVE_PATH_ID_RE = re.compile(r"/d/([A-Za-z0-9_-]+)")
+_DRIVE_QUERY_ID_RE = re.compile(r"[?&]id=([A-Za-z0-9_-]+)")
+
+_vision_client = None
+_vision_lock = threading.Lock()
+
+
+def vision_client():
+    """Vision client ของ process (สร้างครั้งแรกที่เรียก)"""
+    global _vision_client
+    if _vision_client is None:
+        with _vision_lock:
+            if _vision_client is None:
+                from google.cloud import vision
+                _vision_client = vision.ImageAnnotatorClient()
+    return _vision_client
+
+
+# ---------- Image checks ----------
+def looks_like_image_by_meta(filename: str, content_type: Optional[str]) -> bool:
+    fn = (filename or "").lower()
+    if content_type and content_type.startswith("image/"):
+        return True
+    if content_type in ALLOWED_IMAGE_MIMES:
+        return True
+    # กันกรณี content-type ว่าง: ใช้สกุลไฟล์ช่วยตัดสินคร่าว ๆ
+    return any(fn.endswith(ext) for ext in ALLOWED_EXTS)
+
+
+def bytes_is_valid_image(data: bytes) -> bool:
+    # เปิดรูปแบบไม่โหลดทั้งภาพ เพื่อเช็คว่า “เป็นไฟล์รูปจริงไหม”
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            im.verify()   # ถ้าไฟล์พังจะโยน error
+        return True
+    except (UnidentifiedImageError, OSError, ValueError):
+        return False
+
+
+# ---------- Main OCR wrapper ----------
+def ocr_image_bytes_safe(
+    data: bytes,
+    filename: str,
+    content_type: Optional[str],
+) -> Tuple[str, str, Optional[str]]:
+    """
+    Return: (status, reason, text)
+      - status: "OK" | "NG"
+      - reason: สาเหตุถ้า NG (เช่น "non-image", "corrupt/bad image data", "vision-error")
+      - text:   ผลลัพธ์ OCR ถ้า OK; otherwise None
+    """
+    # ชั้นที่ 1: เช็ค metadata
+    if not looks_like_image_by_meta(filename, content_type):
+        return "NG", "non-image", None
+
+    # ชั้นที่ 2: เช็ค byte เป็นรูปได้จริงไหม
+    if not bytes_is_valid_image(data):
+        return "NG", "corrupt/bad image data", None
+
+    # ชั้นที่ 3: เรียก Vision ใน try/except
+    from google.cloud import vision
+    client = vision_client()
+    image = vision.Image(content=data)
+    try:
+        resp = client.text_detection(image=image)
+        if resp.error.message:
+            # Vision บอก error ชัดเจน
+            return "NG", f"vision-error: {resp.error.message}", None
+
+        text = (resp.full_text_annotation.text or "").strip() if resp.full_text_annotation else ""
+        return ("OK", "", text) if text else ("OK", "", "")
+    except Exception as e:
+        # กันตก: ไม่ให้พังทั้งแถว
+        return "NG", f"vision-exception: {e.__class__.__name__}", None
+
+
+# ---------- Drive ----------
+def file_ids_from_cell(cell: str) -> List[str]:
+    links = _LINK_SPLIT_RE.split((cell or "").strip())
+    ids: List[str] = []
+    for url in links:
+        if not url:
+            continue
+        m = _DRIVE_PATH_ID_RE.search(url) or _DRIVE_QUERY_ID_RE.search(url)
+        if m:
+            ids.append(m.group(1))
+    return ids
+
+
+def file_size(drive, file_id: str) -> Optional[int]:
+    """ขนาดไฟล์จาก Drive metadata (ไม่ดาวน์โหลด); ไม่รู้ขนาด / error → None"""
+    try:
+        size = drive.files().get(fileId=file_id, fields="size").execute().get("size")
+        return int(size) if size is not None else None
+    except (HttpError, ValueError):
+        return None
+
+
+def download_bytes_and_meta(drive, file_id: str) -> Tuple[bytes, str, str]:
+    """
+    return: (content_bytes, filename, mime_type)
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+    meta = drive.files().get(fileId=file_id, fields="name,mimeType").execute()
+    filename = meta.get("name") or ""
+    mime = meta.get("mimeType") or ""
+
+    req = drive.files().get_media(fileId=file_id)
+    buf = io.BytesIO()
+    dl = MediaIoBaseDownload(buf, req)
+    done = False
+    while not done:
+        _, done = dl.next_chunk()
+    return buf.getvalue(), filename, mime
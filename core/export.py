@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Local file export ของแท็บสรุปรายวัน (นอกจากชีต).
+
+ผู้ใช้ข้อมูล (dashboard, leaderboard) อ่านไฟล์แทนการเรียก Sheets API ซ้ำ
+เปิดใช้: env ``EXPORT_DIR`` (เช่น volume ที่ mount จาก Cloud Storage บน Cloud Run; ว่าง = ปิด)
+
+โครงไฟล์ (partition ตามวัน, เขียนทับทั้งไฟล์แบบ atomic ทุกครั้งที่วันนั้นถูกสรุปใหม่):
+
+    <EXPORT_DIR>/date=2025-09-17/summary.csv
+    <EXPORT_DIR>/date=2025-09-17/summary.jsonl
+    <EXPORT_DIR>/date=2025-09-17/summary.parquet   (เฉพาะเมื่อติดตั้ง pyarrow)
+
+schema คงที่ (``EXPORT_FIELDS``, ลำดับเดียวกับ ``OUT_HEADER``) + ``date``;
+ใน JSONL / Parquet ``input_km`` และ ``distance_km`` เป็นตัวเลข (อ่านไม่ได้ = null), ที่เหลือเป็น string
+"""
+
+import os
+import csv
+import json
+from typing import Dict, List, Optional
+
+from core.rows import to_float
+from core.summary import OUT_HEADER
+
+EXPORT_DIR     = os.getenv("EXPORT_DIR", "").strip()
+EXPORT_FORMATS = [f.strip().lower() for f in os.getenv("EXPORT_FORMATS", "csv,jsonl,parquet").split(",") if f.strip()]
+
+# ชื่อคอลัมน์ในไฟล์ (ตรงกับ OUT_HEADER ทีละตำแหน่ง)
+EXPORT_FIELDS = [
+    "timestamp", "team", "employee_id", "input_km", "where",
+    "img_out", "selfie_out", "img_in_digi", "img_in_mach", "selfie_in",
+    "distance_km", "duration", "value_condition", "check_distance", "check_date", "summary",
+]
+NUMERIC_FIELDS = ("input_km", "distance_km")
+assert len(EXPORT_FIELDS) == len(OUT_HEADER)
+
+FILE_STEM = "summary"
+
+
+def enabled() -> bool:
+    return bool(EXPORT_DIR)
+
+
+def day_dir(day: str, root: Optional[str] = None) -> str:
+    return os.path.join(root or EXPORT_DIR, f"date={day}")
+
+
+def exported(day: str, root: Optional[str] = None) -> bool:
+    """มีไฟล์ของวันนี้ครบทุก format ที่เขียนได้แล้วหรือยัง"""
+    d = day_dir(day, root)
+    return all(os.path.exists(os.path.join(d, f"{FILE_STEM}.{fmt}")) for fmt in _formats())
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def _formats() -> List[str]:
+    return [f for f in EXPORT_FORMATS if f in ("csv", "jsonl") or (f == "parquet" and _pyarrow() is not None)]
+
+
+def _records(day: str, rows: List[List]) -> List[Dict]:
+    out = []
+    for r in rows:
+        rec = {"date": day}
+        for k, name in enumerate(EXPORT_FIELDS):
+            v = r[k] if k < len(r) else ""
+            rec[name] = to_float(v) if name in NUMERIC_FIELDS else ("" if v is None else str(v))
+        out.append(rec)
+    return out
+
+
+def _atomic(path: str, write):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def export_day(day: str, rows: List[List], root: Optional[str] = None) -> List[str]:
+    """แถวสรุปของวัน (ไม่รวม header) → ไฟล์ทุก format; คืน path ที่เขียน"""
+    d = day_dir(day, root)
+    os.makedirs(d, exist_ok=True)
+    recs = _records(day, rows)
+    written = []
+    for fmt in _formats():
+        path = os.path.join(d, f"{FILE_STEM}.{fmt}")
+        if fmt == "csv":
+            def write(p):
+                with open(p, "w", newline="", encoding="utf-8") as f:
+                    w = csv.DictWriter(f, fieldnames=["date"] + EXPORT_FIELDS)
+                    w.writeheader()
+                    w.writerows(recs)
+        elif fmt == "jsonl":
+            def write(p):
+                with open(p, "w", encoding="utf-8") as f:
+                    for rec in recs:
+                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        else:
+            pa = _pyarrow()
+
+            def write(p):
+                schema = pa.schema([("date", pa.string())] + [
+                    (name, pa.float64() if name in NUMERIC_FIELDS else pa.string()) for name in EXPORT_FIELDS
+                ])
+                table = pa.Table.from_pylist(recs, schema=schema)
+                pa.parquet.write_table(table, p, compression="zstd")
+        _atomic(path, write)
+        written.append(path)
+    return written
+
+
+def export_days(outputs: Dict[str, List[List]], root: Optional[str] = None) -> Dict[str, List[str]]:
+    """{day: [OUT_HEADER] + rows} (รูปเดียวกับที่เขียนลงชีต) → export ทุกวัน"""
+    return {day: export_day(day, values[1:], root) for day, values in outputs.items()}
+
+
+def read_day(day: str, root: Optional[str] = None) -> Optional[List[List[str]]]:
+    """ไฟล์ CSV ของวัน → [OUT_HEADER] + แถว (รูปเดียวกับค่าในแท็บ); ไม่มีไฟล์ → None"""
+    path = os.path.join(day_dir(day, root), f"{FILE_STEM}.csv")
+    if not os.path.exists(path):
+        return None
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [[rec.get(name, "") for name in EXPORT_FIELDS] for rec in csv.DictReader(f)]
+    return [list(OUT_HEADER)] + rows
+
+
+def exported_days(root: Optional[str] = None) -> List[str]:
+    base = root or EXPORT_DIR
+    if not base or not os.path.isdir(base):
+        return []
+    return sorted(n[len("date="):] for n in os.listdir(base) if n.startswith("date="))
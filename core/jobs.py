@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Resumable backfill jobs.
+
+job หนึ่ง = ช่วงเวลาหนึ่งที่ต้อง backfill (อาจต้องใช้หลาย invocation ถ้าติด time budget)
+บันทึกเป็นแถวในแท็บ ``BACKFILL_JOBS_SHEET_NAME`` (หนึ่งแถวต่อ job, เขียนทับแถวเดิมเมื่อคืบหน้า):
+
+- ``cursor`` = Timestamp ของแถวเป้าหมายแรกที่ยังไม่ได้ทำ → รอบถัดไปเริ่มช่วงจากตรงนี้
+  (แถวก่อนหน้านั้นมีสถานะแล้วทั้งหมด)
+- ``status``: running → paused (หมด budget / limit) → ... → done; error = ล้มกลางทาง
+- continuation token = ``job_id`` (ส่งกลับมาเป็นพารามิเตอร์ ``job``)
+
+job ที่เป็น "running" แต่ไม่ได้อัปเดตเกิน ``BACKFILL_JOB_LEASE_SEC`` ถือว่า invocation เดิมตายไปแล้ว
+(เช่นโดน request timeout) → resume ต่อได้; invocation ที่ยังทำงานอยู่ต่อ lease ด้วย ``lease_renewer``
+"""
+
+import os
+import time
+import uuid
+import threading
+import datetime as dt
+from typing import Callable, Dict, List, Optional
+
+from core.sheets_reader import first_row_of
+
+BACKFILL_JOBS_SHEET_NAME = os.getenv("BACKFILL_JOBS_SHEET_NAME", "Backfill Jobs")
+BACKFILL_JOB_LEASE_SEC   = int(os.getenv("BACKFILL_JOB_LEASE_SEC", "900"))
+
+JOB_HEADER = ["Job ID", "From", "To", "Status", "Cursor", "Runs",
+              "Processed", "Updated", "Quarantined", "Images", "Created", "Updated At", "Detail"]
+_FIELDS = ["job_id", "from", "to", "status", "cursor", "runs",
+           "processed", "updated", "quarantined", "images", "created", "updated_at", "detail"]
+_COUNTERS = ("runs", "processed", "updated", "quarantined", "images")
+
+OPEN_STATUSES = ("running", "paused", "error")
+
+
+def _now() -> str:
+    return dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def new_job(start_iso: str, end_iso: str) -> Dict:
+    now = _now()
+    job = {f: "" for f in _FIELDS}
+    job.update({"job_id": uuid.uuid4().hex[:12], "from": start_iso, "to": end_iso,
+                "status": "running", "created": now, "updated_at": now})
+    for k in _COUNTERS:
+        job[k] = 0
+    return job
+
+
+def _from_row(row: List, row_num: int) -> Dict:
+    cells = list(row) + [""] * (len(_FIELDS) - len(row))
+    job = dict(zip(_FIELDS, cells))
+    for k in _COUNTERS:
+        try:
+            job[k] = int(float(job[k] or 0))
+        except (TypeError, ValueError):
+            job[k] = 0
+    job["_row"] = row_num
+    return job
+
+
+def _load_all(sheets, spreadsheet_id: str, sheet_name: str) -> List[Dict]:
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    if sheet_name not in [sh["properties"]["title"] for sh in meta.get("sheets", [])]:
+        return []
+    values = sheets.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id, range=f"{sheet_name}!A:M",
+    ).execute().get("values", [])
+    return [_from_row(r, k + 2) for k, r in enumerate(values[1:]) if r and r[0]]
+
+
+def load_job(sheets, spreadsheet_id: str, job_id: str,
+             sheet_name: str = BACKFILL_JOBS_SHEET_NAME) -> Optional[Dict]:
+    for job in _load_all(sheets, spreadsheet_id, sheet_name):
+        if job["job_id"] == job_id:
+            return job
+    return None
+
+
+def find_open_job(sheets, spreadsheet_id: str, start_iso: str, end_iso: str,
+                  sheet_name: str = BACKFILL_JOBS_SHEET_NAME) -> Optional[Dict]:
+    """job ล่าสุดของช่วงเดียวกันที่ยังไม่เสร็จ (สำหรับ auto-resume)"""
+    found = [j for j in _load_all(sheets, spreadsheet_id, sheet_name)
+             if j["from"] == start_iso and j["to"] == end_iso and j["status"] in OPEN_STATUSES]
+    return found[-1] if found else None
+
+
+def lease_active(job: Dict) -> bool:
+    """job "running" ที่ยังอัปเดตภายใน lease → มี invocation อื่นทำอยู่"""
+    if job.get("status") != "running":
+        return False
+    try:
+        seen = dt.datetime.fromisoformat(str(job.get("updated_at", "")).replace("Z", ""))
+    except ValueError:
+        return False
+    return (dt.datetime.utcnow() - seen).total_seconds() < BACKFILL_JOB_LEASE_SEC
+
+
+def save_job(sheets, spreadsheet_id: str, job: Dict,
+             sheet_name: str = BACKFILL_JOBS_SHEET_NAME) -> Dict:
+    """เขียน job ลงแถวเดิม (``_row``) หรือ append แถวใหม่; สร้างแท็บ + header ถ้ายังไม่มี"""
+    job["updated_at"] = _now()
+    row = [job.get(f, "") for f in _FIELDS]
+    if job.get("_row"):
+        sheets.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=f"{sheet_name}!A{job['_row']}",
+            valueInputOption="RAW",
+            body={"values": [row]},
+        ).execute()
+        return job
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+    rows = [row]
+    if sheet_name not in titles:
+        sheets.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]},
+        ).execute()
+        rows = [JOB_HEADER] + rows
+    resp = sheets.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range=f"{sheet_name}!A:M",
+        valueInputOption="RAW",
+        insertDataOption="INSERT_ROWS",
+        body={"values": rows},
+    ).execute()
+    rng = ((resp or {}).get("updates") or {}).get("updatedRange", "")
+    first = first_row_of(rng)
+    if first is not None:
+        job["_row"] = first + len(rows) - 1
+    return job
+
+
+def lease_renewer(sheets_factory: Callable[[], object], spreadsheet_id: str, job: Dict,
+                  every_sec: Optional[float] = None,
+                  sheet_name: str = BACKFILL_JOBS_SHEET_NAME) -> Callable[[], None]:
+    """
+    heartbeat ของ invocation ที่ถือ job อยู่: เรียกได้บ่อยเท่าไรก็ได้ (ทุกแถว / จากหลาย thread)
+    → ``save_job`` จริงทุก ``every_sec`` (default = 1/3 ของ lease) ด้วย client ใหม่ (googleapiclient ไม่ thread-safe)
+    เขียนไม่สำเร็จ → ข้าม (งานหลักทำต่อ; ครั้งถัดไปลองใหม่)
+    """
+    every = BACKFILL_JOB_LEASE_SEC / 3.0 if every_sec is None else every_sec
+    lock = threading.Lock()
+    state = {"last": time.monotonic()}
+
+    def renew():
+        if time.monotonic() - state["last"] < every or not lock.acquire(blocking=False):
+            return
+        try:
+            state["last"] = time.monotonic()
+            save_job(sheets_factory(), spreadsheet_id, job, sheet_name)
+        except Exception:
+            pass
+        finally:
+            lock.release()
+
+    return renew
+
+
+def record_run(job: Dict, result: Dict) -> Dict:
+    """สะสม counter จากผลของ run_backfill_window และเลื่อน cursor"""
+    job["runs"] += 1
+    job["processed"] += int(result.get("processed_rows", 0))
+    job["updated"] += int(result.get("updated_rows", 0))
+    job["quarantined"] += int(result.get("quarantined", 0))
+    job["images"] += int(result.get("images", 0))
+    job["cursor"] = result.get("resume_from") or ""
+    job["status"] = "paused" if result.get("stopped") else "done"
+    job["detail"] = result.get("stopped") or ""
+    return job
+
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Leaderboard: ยอดสะสมระยะทาง / เวลา ต่อพนักงาน และต่อทีม ข้ามทุกวันของงาน.
+
+input = แท็บสรุปรายวัน (YYYY-MM-DD, หนึ่งแถวต่อพนักงานต่อวัน จาก summarize_day / upsert)
+→ อ่านทุกแท็บใน batchGet เดียว แล้วสะสมรอบเดียว (O(แถว)):
+
+- ต่อพนักงาน: km / วินาทีรวม, จำนวนวัน, km ของวันล่าสุด (delta) และยอดสะสมถึงเมื่อวาน
+- ต่อทีม (``COL_TEAM``): ผลรวมของสมาชิก, จำนวนสมาชิก, delta ของวันล่าสุด
+
+อันดับ top-K ใช้ ``heapq.nlargest`` บน aggregate (O(n log K)); อันดับเมื่อวานของคนที่แสดงผล
+ใช้ bisect บน key ที่เรียงไว้ครั้งเดียว → ไม่ต้องเรียงทั้งตารางซ้ำต่อคน
+
+นับเฉพาะแถวที่ Summary = "OK" (``LEADERBOARD_ONLY_OK=0`` → นับทุกแถว)
+``LEADERBOARD_SOURCE=export`` → อ่านแถวรายวันจากไฟล์ของ core/export.py (EXPORT_DIR) แทนแท็บ;
+เรียก Sheets API เหลือแค่ความยาวแท็บ standings เดิม + การเขียน
+ผลลัพธ์เขียนแท็บ ``LEADERBOARD_SHEET_NAME`` ใน values.update เดียว (เติมแถวว่างทับของเดิมที่ยาวกว่า)
+"""
+
+import os
+import re
+import heapq
+import bisect
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+from core import export
+from core.rows import resolve_schema, hms_to_sec
+from core.summary import COL_EID, COL_TEAM, OUT_DISTANCE_COL, OUT_DURATION_COL, OUT_SUMMARY
+
+LEADERBOARD_SHEET_NAME = os.getenv("LEADERBOARD_SHEET_NAME", "Leaderboard")
+LEADERBOARD_TOP_K      = int(os.getenv("LEADERBOARD_TOP_K", "50"))
+LEADERBOARD_ONLY_OK    = os.getenv("LEADERBOARD_ONLY_OK", "1") == "1"
+LEADERBOARD_SOURCE     = os.getenv("LEADERBOARD_SOURCE", "sheet").strip().lower()   # "sheet" | "export"
+
+DAY_TAB_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+DAY_FIELDS = {"eid": COL_EID, "team": COL_TEAM, "dist": OUT_DISTANCE_COL,
+              "dur": OUT_DURATION_COL, "summary": OUT_SUMMARY}
+
+PERSON_HEADER = ["Rank", "Employee ID", "Team", "Total km", "Total Duration", "Days",
+                 "Today km", "Rank Change"]
+TEAM_HEADER   = ["Rank", "Team", "Total km", "Total Duration", "Members", "Today km"]
+GRID_WIDTH    = len(PERSON_HEADER)
+
+
+class Totals:
+    __slots__ = ("name", "team", "km", "sec", "days", "last_km", "members")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.team = ""
+        self.km = 0.0
+        self.sec = 0
+        self.days = 0
+        self.last_km = 0.0     # km ของวันล่าสุดในช่วง
+        self.members = 0       # เฉพาะทีม
+
+    def key(self, prev: bool = False) -> Tuple:
+        """อันดับ: km มากกว่า → เวลาน้อยกว่า → ชื่อ (คงที่ทุกรอบ)"""
+        km = self.km - self.last_km if prev else self.km
+        return (round(km, 3), -self.sec, self.name)
+
+
+def _hms(sec: int) -> str:
+    h, rem = divmod(int(sec), 3600)
+    m, s = divmod(rem, 60)
+    return f"{h:d}:{m:02d}:{s:02d}"
+
+
+def aggregate(day_values: Dict[str, List[List]], only_ok: bool = LEADERBOARD_ONLY_OK):
+    """{day: values ของแท็บวันนั้น (header + แถว)} → (people, teams, last_day)"""
+    people: Dict[str, Totals] = {}
+    last_day = max(day_values) if day_values else None
+    for day in sorted(day_values):
+        values = day_values[day]
+        if not values:
+            continue
+        schema = resolve_schema(values[0], DAY_FIELDS)
+        if schema.missing("eid", "dist"):
+            continue
+        for r in schema.wrap_all(values[1:]):
+            emp = r.get("eid").strip()
+            if not emp or (only_ok and r.get("summary").strip() != "OK"):
+                continue
+            km = r.num("dist") or 0.0
+            p = people.get(emp)
+            if p is None:
+                p = people[emp] = Totals(emp)
+            p.team = r.get("team").strip() or p.team
+            p.km += km
+            p.sec += hms_to_sec(r.get("dur")) or 0
+            p.days += 1
+            if day == last_day:
+                p.last_km += km
+
+    teams: Dict[str, Totals] = {}
+    for p in people.values():
+        t = teams.get(p.team)
+        if t is None:
+            t = teams[p.team] = Totals(p.team)
+        t.km += p.km
+        t.sec += p.sec
+        t.last_km += p.last_km
+        t.members += 1
+    return people, teams, last_day
+
+
+def top_k(items: Dict[str, Totals], k: int) -> List[Totals]:
+    return heapq.nlargest(k, items.values(), key=Totals.key)
+
+
+def prev_ranks(items: Dict[str, Totals], shown: List[Totals]) -> Dict[str, Optional[int]]:
+    """อันดับเมื่อวาน (ยอดสะสมก่อนวันล่าสุด) ของแถวที่แสดงผล; ยังไม่มียอดก่อนหน้า → None"""
+    keys = sorted(t.key(prev=True) for t in items.values())
+    out: Dict[str, Optional[int]] = {}
+    for t in shown:
+        if t.km - t.last_km <= 0:
+            out[t.name] = None
+            continue
+        # จำนวน key ที่มากกว่า key ของคนนี้ + 1
+        out[t.name] = len(keys) - bisect.bisect_right(keys, t.key(prev=True)) + 1
+    return out
+
+
+def standings_grid(people: Dict[str, Totals], teams: Dict[str, Totals], last_day: Optional[str],
+                   k: int = LEADERBOARD_TOP_K) -> List[List]:
+    now = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    grid: List[List] = [["Leaderboard", f"through {last_day or '-'}", "Updated At", now,
+                         "Participants", len(people)], []]
+
+    shown = top_k(people, k)
+    before = prev_ranks(people, shown)
+    grid.append(PERSON_HEADER)
+    for rank, p in enumerate(shown, 1):
+        was = before[p.name]
+        grid.append([rank, p.name, p.team, round(p.km, 2), _hms(p.sec), p.days,
+                     round(p.last_km, 2), "new" if was is None else was - rank])
+
+    grid += [[], TEAM_HEADER]
+    for rank, t in enumerate(top_k(teams, len(teams)), 1):
+        grid.append([rank, t.name, round(t.km, 2), _hms(t.sec), t.members, round(t.last_km, 2)])
+    return grid
+
+
+def publish(sheets, spreadsheet_id: str, days: Optional[List[str]] = None,
+            sheet_name: str = LEADERBOARD_SHEET_NAME, k: int = LEADERBOARD_TOP_K) -> Dict:
+    """
+    อ่านแท็บรายวัน (``days``; None = ทุกแท็บชื่อ YYYY-MM-DD) + ความยาวแท็บ standings เดิม ใน batchGet เดียว
+    → เขียนแท็บ standings ใน values.update เดียว
+    (``LEADERBOARD_SOURCE=export`` + EXPORT_DIR → วันและแถวมาจากไฟล์ export แทนแท็บ)
+    """
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+    has_tab = sheet_name in titles
+    from_files = LEADERBOARD_SOURCE == "export" and export.enabled()
+    if from_files:
+        day_tabs = [d for d in export.exported_days() if DAY_TAB_RE.match(d) and (days is None or d in days)]
+    else:
+        day_tabs = sorted(t for t in titles if DAY_TAB_RE.match(t) and (days is None or t in days))
+
+    ranges = ([] if from_files else [f"{t}!A:P" for t in day_tabs]) + ([f"{sheet_name}!A:A"] if has_tab else [])
+    got = sheets.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id, ranges=ranges,
+    ).execute().get("valueRanges", []) if ranges else []
+    if from_files:
+        day_values = {t: (export.read_day(t) or []) for t in day_tabs}
+    else:
+        day_values = {t: (got[k_].get("values") or []) for k_, t in enumerate(day_tabs)}
+    old_rows = len(got[-1].get("values") or []) if has_tab and got else 0
+
+    people, teams, last_day = aggregate(day_values)
+    grid = standings_grid(people, teams, last_day, k)
+    grid = [list(r) + [""] * (GRID_WIDTH - len(r)) for r in grid]
+    grid += [[""] * GRID_WIDTH for _ in range(old_rows - len(grid))]   # ล้างแถวเก่าที่ยาวกว่า
+
+    if not has_tab:
+        sheets.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]},
+        ).execute()
+    sheets.spreadsheets().values().update(
+        spreadsheetId=spreadsheet_id,
+        range=f"{sheet_name}!A1",
+        valueInputOption="RAW",
+        body={"values": grid},
+    ).execute()
+    return {"days": len(day_tabs), "last_day": last_day, "participants": len(people),
+            "teams": len(teams), "rows": len(grid)}
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Time-partitioned Working tabs (optional).
+
+ปกติทุกแถวอยู่ในแท็บ Working เดียว ซึ่งโตขึ้นตลอดงาน และทุกฟังก์ชันอ่านทั้งแท็บ
+เปิด ``WORK_PARTITION=day`` → แถวถูกแยกไปแท็บรายวันตามวันที่ local ของ Timestamp:
+
+    "<Working> 2025-09-17", "<Working> 2025-09-18", ...   (Timestamp อ่านไม่ได้ → "<Working> undated")
+
+แท็บ index เล็ก ๆ (``PARTITION_INDEX_SHEET_NAME``) เก็บ 1 แถวต่อวัน: Day, Tab, Rows, Updated At
+- ocr_sheet: เทียบจำนวนแถว RAW ของแต่ละวันกับ Rows ใน index → แตะเฉพาะวันที่มีแถวใหม่ (+ วันนี้)
+- recheck_ocr: อ่านเฉพาะแท็บของวันที่อยู่ในช่วงเวลา
+- summarize_day: อ่านเฉพาะแท็บของวันนั้น
+→ แต่ละรอบอ่านประมาณหนึ่งวัน ไม่ว่างานจะยาวกี่วัน
+"""
+
+import os
+import datetime as dt
+from typing import Callable, Dict, Iterable, List, Optional
+
+WORK_PARTITION             = os.getenv("WORK_PARTITION", "").strip().lower()   # "" (ปิด) | "day"
+PARTITION_INDEX_SHEET_NAME = os.getenv("PARTITION_INDEX_SHEET_NAME", "Working Index")
+UNDATED = "undated"
+
+INDEX_HEADER = ["Day", "Tab", "Rows", "Updated At"]
+
+
+def enabled() -> bool:
+    return WORK_PARTITION == "day"
+
+
+def partition_tab(base: str, day: str) -> str:
+    """ชื่อแท็บของวัน (``day`` = YYYY-MM-DD หรือ ``UNDATED``)"""
+    return f"{base} {day}"
+
+
+def day_of(epoch: Optional[float], tz: dt.tzinfo) -> str:
+    if epoch is None:
+        return UNDATED
+    return dt.datetime.fromtimestamp(epoch, tz).date().isoformat()
+
+
+def split_by_day(rows: Iterable[List], idx_ts: int, ts_epoch: Callable[[object], Optional[float]],
+                 tz: dt.tzinfo) -> Dict[str, List[List]]:
+    """แถว → {day: [rows]} (คงลำดับเดิมภายในวัน)"""
+    out: Dict[str, List[List]] = {}
+    for r in rows:
+        v = r[idx_ts] if idx_ts < len(r) else ""
+        out.setdefault(day_of(ts_epoch(v), tz), []).append(r)
+    return out
+
+
+def days_in_window(start: dt.datetime, end: dt.datetime, tz: dt.tzinfo) -> List[str]:
+    """วันที่ local ทุกวันที่ช่วง [start, end] ครอบ"""
+    d, last = start.astimezone(tz).date(), end.astimezone(tz).date()
+    out = []
+    while d <= last:
+        out.append(d.isoformat())
+        d += dt.timedelta(days=1)
+    return out
+
+
+def load_index(sheets, spreadsheet_id: str, sheet_name: str = PARTITION_INDEX_SHEET_NAME) -> Dict[str, Dict]:
+    """{day: {"tab", "rows", "updated_at"}}; ยังไม่มีแท็บ → {}"""
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    if sheet_name not in [sh["properties"]["title"] for sh in meta.get("sheets", [])]:
+        return {}
+    values = sheets.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id, range=f"{sheet_name}!A:D",
+    ).execute().get("values", [])
+    out: Dict[str, Dict] = {}
+    for r in values[1:]:
+        if not r or not r[0]:
+            continue
+        try:
+            n = int(float(r[2])) if len(r) > 2 and r[2] != "" else 0
+        except ValueError:
+            n = 0
+        out[str(r[0])] = {"tab": r[1] if len(r) > 1 else "", "rows": n,
+                          "updated_at": r[3] if len(r) > 3 else ""}
+    return out
+
+
+def save_index(sheets, spreadsheet_id: str, index: Dict[str, Dict],
+               sheet_name: str = PARTITION_INDEX_SHEET_NAME):
+    """เขียนทั้งแท็บ index ใหม่ในคำขอเดียว (ไม่กี่สิบแถว); สร้างแท็บถ้ายังไม่มี"""
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    if sheet_name not in [sh["properties"]["title"] for sh in meta.get("sheets", [])]:
+        sheets.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]},
+        ).execute()
+    now = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    rows = [INDEX_HEADER] + [[day, e.get("tab", ""), e.get("rows", 0), e.get("updated_at") or now]
+                             for day, e in sorted(index.items())]
+    sheets.spreadsheets().values().update(
+        spreadsheetId=spreadsheet_id,
+        range=f"{sheet_name}!A1",
+        valueInputOption="RAW",
+        body={"values": rows},
+    ).execute()
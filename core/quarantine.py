@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Poison-row quarantine.
+
+แถวที่ประมวลผลไม่ได้ (เช่นค่า "Where did you run?" ไม่รู้จัก) จะไม่ทำให้ทั้ง run ล้ม:
+- ผู้เรียกเขียนสถานะ ``STATUS_QUARANTINED`` ลงแถวนั้น (รอบถัดไปจะไม่ถูกเลือกซ้ำ)
+- บันทึกรายละเอียดลงแท็บข้าง ``QUARANTINE_SHEET_NAME``
+
+แก้ข้อมูลแล้วอยากให้ OCR ใหม่ → ลบค่าใน Out_Status / In_Status ของแถวนั้นให้ว่าง
+"""
+
+import os
+from typing import List
+
+QUARANTINE_SHEET_NAME = os.getenv("QUARANTINE_SHEET_NAME", "Quarantine")
+STATUS_QUARANTINED    = os.getenv("STATUS_QUARANTINED", "Quarantined")
+
+QUARANTINE_HEADER = ["Run_ts", "Source", "Sheet", "Row", "Timestamp", "Employee ID", "Reason", "Value"]
+
+
+def record_quarantine(sheets, spreadsheet_id: str, entries: List[List],
+                      sheet_name: str = QUARANTINE_SHEET_NAME) -> int:
+    """Append entries (ตาม QUARANTINE_HEADER) ลงแท็บ quarantine; สร้างแท็บ + header ถ้ายังไม่มี"""
+    if not entries:
+        return 0
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+    rows = [list(e) for e in entries]
+    if sheet_name not in titles:
+        sheets.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]},
+        ).execute()
+        rows = [QUARANTINE_HEADER] + rows
+    sheets.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range=f"{sheet_name}!A:H",
+        valueInputOption="RAW",
+        insertDataOption="INSERT_ROWS",
+        body={"values": rows},
+    ).execute()
+    return len(entries)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+RAW ↔ WORK reconciliation ด้วย composite key.
+
+เดิม: ocr_sheet ถือว่าแถว N ของ RAW = แถว N ของ WORK (คัดลอก "ส่วนต่างของจำนวนแถว" จากท้าย RAW)
+และ recheck เทียบด้วย Timestamp อย่างเดียว → ถ้ามีคนเรียง / ลบแถว หรือส่งฟอร์มเวลาเดียวกัน จะคัดลอกผิด
+
+key ของแถว = (Timestamp → epoch วินาที, Employee ID, file IDs ของรูปทุกช่อง)
+Employee ID / ลิงก์รูปถูกคนแก้ใน WORK ได้ → ตัวตนของแถวคือ Timestamp (ส่วนแรกของ key, WORK ไม่แก้)
+ส่วนที่เหลือใช้แค่จับคู่แถวที่ Timestamp ชนกัน. ``reconcile()`` สร้าง hash index (dict) ของ key ฝั่ง WORK
+แล้วไล่ RAW สองรอบ (O(n)): รอบแรกจับคู่ key ตรงทั้งก้อน, รอบสองจับคู่แถวที่เหลือด้วย Timestamp อย่างเดียว
+(แถวที่ถูกแก้ใน WORK → ``edited``; ไม่คัดลอกซ้ำ):
+
+- ``missing``    ตำแหน่งใน RAW ที่ WORK ยังไม่มี → ต้องคัดลอก (ส่วนต่างจริงเท่านั้น)
+- ``duplicates`` ตำแหน่งใน WORK ที่ Timestamp ซ้ำเกินจำนวนใน RAW (สำเนาเกิน; รายงานเท่านั้น ไม่ลบ)
+- ``orphans``    ตำแหน่งใน WORK ที่ไม่มีใน RAW แล้ว (ถูกลบจาก RAW; รายงานเท่านั้น)
+- ``moved``      จำนวนคู่ที่ตรงกันแต่ลำดับแถวสลับกัน (เช่น RAW ถูก sort) → ไม่ต้องคัดลอก
+
+key ซ้ำใน RAW (ส่งซ้ำเหมือนกันทุกช่อง) จับคู่แบบนับจำนวน: RAW มี 2 แถว WORK มี 1 → คัดลอก 1
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_DRIVE_ID_RES = (re.compile(r"/d/([A-Za-z0-9_-]+)"), re.compile(r"[?&]id=([A-Za-z0-9_-]+)"))
+_LINK_SPLIT_RE = re.compile(r"[, \n]+")
+
+IMAGE_KEY_FIELDS = ("img", "selfie", "digi", "mach")
+KEY_FIELDS = ("ts", "emp_id") + IMAGE_KEY_FIELDS   # field ใน RowSchema ที่ใช้สร้าง key
+
+Key = Tuple
+
+
+def drive_file_ids(cell) -> Tuple[str, ...]:
+    """file IDs ของลิงก์ Drive ใน cell (คั่นด้วย , / ช่องว่าง / ขึ้นบรรทัด)"""
+    out = []
+    for url in _LINK_SPLIT_RE.split(str(cell or "").strip()):
+        if not url:
+            continue
+        for rx in _DRIVE_ID_RES:
+            m = rx.search(url)
+            if m:
+                out.append(m.group(1))
+                break
+    return tuple(out)
+
+
+def row_key(ts, emp_id, image_cells: Iterable, ts_epoch: Callable[[object], Optional[float]]) -> Key:
+    """key ของแถว; Timestamp ที่ parse ไม่ได้ใช้ string เดิมแทน epoch"""
+    ep = ts_epoch(ts)
+    return (
+        round(ep) if ep is not None else str(ts).strip(),
+        str(emp_id).strip().upper(),
+        tuple(drive_file_ids(c) for c in image_cells),
+    )
+
+
+def make_keyer(schema, ts_epoch: Callable[[object], Optional[float]],
+               fields: Sequence[str] = KEY_FIELDS) -> Callable[[Sequence], Key]:
+    """cells (list หรือ Row) → key; คอลัมน์มาจาก ``schema.col(field)`` (ไม่มีในชีต → ว่าง)"""
+    ts_field, emp_field, *image_fields = fields
+    i_ts, i_emp = schema.col(ts_field), schema.col(emp_field)
+    i_imgs = [schema.col(f) for f in image_fields]
+
+    def cell(cells, i):
+        return cells[i] if (i is not None and i < len(cells)) else ""
+
+    def key(cells) -> Key:
+        return row_key(cell(cells, i_ts), cell(cells, i_emp), [cell(cells, i) for i in i_imgs], ts_epoch)
+
+    return key
+
+
+class Reconciliation:
+    __slots__ = ("missing", "duplicates", "orphans", "moved", "matched", "edited")
+
+    def __init__(self):
+        self.missing: List[int] = []
+        self.duplicates: List[int] = []
+        self.orphans: List[int] = []
+        self.moved = 0
+        self.matched = 0
+        self.edited = 0
+
+    def summary(self) -> Dict[str, int]:
+        return {"matched": self.matched, "missing": len(self.missing), "duplicates": len(self.duplicates),
+                "orphans": len(self.orphans), "moved": self.moved, "edited": self.edited}
+
+
+def reconcile(raw_keys: Iterable[Key], work_keys: Iterable[Key],
+              raw_pos: Optional[Sequence[int]] = None,
+              work_pos: Optional[Sequence[int]] = None) -> Reconciliation:
+    """
+    เทียบ key สองฝั่ง; ตำแหน่งที่คืน = ค่าจาก ``raw_pos`` / ``work_pos`` (default = ลำดับใน iterable)
+    ตัวตนของแถว = ``key[0]`` (Timestamp); ส่วนที่เหลือของ key ใช้เลือกคู่เมื่อ Timestamp ชนกัน
+    ``moved`` นับคู่ที่ลำดับใน WORK ย้อนกลับเมื่อเทียบกับลำดับใน RAW
+    """
+    index: Dict[Key, List[int]] = {}
+    for k, key in enumerate(work_keys):
+        index.setdefault(key, []).append(k)
+
+    rec = Reconciliation()
+    pairs: List[Tuple[int, int]] = []      # (ลำดับใน RAW, ลำดับใน WORK)
+    used: Dict[Key, int] = {}
+    unmatched: List[Tuple[int, Key]] = []
+    for k, key in enumerate(raw_keys):
+        slots = index.get(key)
+        n = used.get(key, 0)
+        if slots is None or n >= len(slots):
+            unmatched.append((k, key))
+            continue
+        used[key] = n + 1
+        pairs.append((k, slots[n]))
+
+    # แถว WORK ที่เหลือ → จับคู่ด้วย Timestamp อย่างเดียว (Employee ID / ลิงก์รูปถูกแก้ใน WORK)
+    by_ts: Dict[object, List[int]] = {}
+    for key, slots in index.items():
+        by_ts.setdefault(key[0], []).extend(slots[used.get(key, 0):])
+    for slots in by_ts.values():
+        slots.sort()
+    seen_ts = {key[0] for key in used}
+    for k, key in unmatched:
+        slots = by_ts.get(key[0])
+        if not slots:
+            rec.missing.append(raw_pos[k] if raw_pos is not None else k)
+            continue
+        pairs.append((k, slots.pop(0)))
+        seen_ts.add(key[0])
+        rec.edited += 1
+
+    last = -1
+    for _k, slot in sorted(pairs):
+        rec.matched += 1
+        if slot < last:
+            rec.moved += 1
+        else:
+            last = slot
+
+    for ts, slots in by_ts.items():
+        bucket = rec.duplicates if ts in seen_ts else rec.orphans
+        for k in slots:
+            bucket.append(work_pos[k] if work_pos is not None else k)
+    rec.duplicates.sort()
+    rec.orphans.sort()
+    return rec
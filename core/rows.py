@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Compact row type สำหรับแถวของ Working sheet.
+
+- ``RowSchema``: header → slot map + ความกว้างของแถว + field (ชื่อในโค้ด) → คอลัมน์
+- ``resolve_schema()``: cache RowSchema ตาม fingerprint ของ header (อยู่ได้ตลอด warm instance)
+  → รอบถัดไปที่ header เหมือนเดิมไม่ต้องไล่หา index / ตรวจคอลัมน์บังคับซ้ำ
+- ``Row``: ห่อ list ของ cell เดิม (pad ครั้งเดียวตอนสร้าง แบบ in-place ไม่ copy)
+  อ่าน/เขียนด้วย index แบบ list ได้เหมือนเดิม (``r[idx]``) และมี ``get()`` / ``num()`` / ``sec()``
+  ที่รับ index หรือชื่อ field; ``num`` / ``sec`` parse ค่า km / HH:MM:SS ครั้งเดียวแล้ว cache ไว้
+  (เขียน cell ใหม่ → cache ของ cell นั้นถูกล้าง)
+
+แถวที่ส่งเข้า ``wrap`` ถือว่าเป็นของ Row แล้ว (ถูกแก้ความยาวในที่)
+"""
+
+import re
+import json
+import math
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+Key = Union[int, str, None]   # index ของคอลัมน์ หรือชื่อ field ใน RowSchema.fields
+
+
+# =============== value converters ===============
+def to_float(v) -> Optional[float]:
+    """ตัวเลข / ข้อความตัวเลข (ทศนิยม , หรือ .) → float; ว่าง / อ่านไม่ได้ / NaN → None"""
+    try:
+        if v is None or v == "":
+            return None
+        f = float(v) if isinstance(v, (int, float)) else float(str(v).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return None if math.isnan(f) else f
+
+
+def hms_to_sec(v) -> Optional[int]:
+    """'H:MM:SS' → วินาที; รูปแบบอื่น / ว่าง → None"""
+    try:
+        h, m, s = str(v).strip().split(":")
+        return int(h) * 3600 + int(m) * 60 + int(s)
+    except ValueError:
+        return None
+
+
+# =============== row type ===============
+class Row:
+    __slots__ = ("cells", "schema", "row_num", "_num", "_sec")
+
+    def __init__(self, cells: List, schema: "RowSchema", row_num: Optional[int] = None):
+        width = schema.width
+        if len(cells) < width:
+            cells.extend([""] * (width - len(cells)))
+        elif len(cells) > width:
+            del cells[width:]
+        self.cells = cells
+        self.schema = schema
+        self.row_num = row_num   # เลขแถวจริงในชีต (header = 1)
+        self._num: Optional[Dict[int, Optional[float]]] = None
+        self._sec: Optional[Dict[int, Optional[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __getitem__(self, i: int):
+        return self.cells[i]
+
+    def __setitem__(self, i: int, value):
+        self.cells[i] = value
+        if self._num:
+            self._num.pop(i, None)
+        if self._sec:
+            self._sec.pop(i, None)
+
+    def get(self, i: Key) -> str:
+        """cell เป็น str (ไม่มีคอลัมน์ → "")"""
+        if isinstance(i, str):
+            i = self.schema.col(i)
+        if i is None:
+            return ""
+        v = self.cells[i]
+        return v if isinstance(v, str) else ("" if v is None else str(v))
+
+    def num(self, i: Key) -> Optional[float]:
+        if isinstance(i, str):
+            i = self.schema.col(i)
+        if i is None:
+            return None
+        if self._num is None:
+            self._num = {}
+        elif i in self._num:
+            return self._num[i]
+        v = self._num[i] = to_float(self.cells[i])
+        return v
+
+    def preset_num(self, i: Key, value):
+        """ตัวเลขที่อ่านมาแล้ว (เช่น UNFORMATTED_VALUE) → เติม cache ของ num() ไม่ต้อง parse string"""
+        if isinstance(i, str):
+            i = self.schema.col(i)
+        if i is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        if self._num is None:
+            self._num = {}
+        self._num[i] = float(value)
+
+    def sec(self, i: Key) -> Optional[int]:
+        if isinstance(i, str):
+            i = self.schema.col(i)
+        if i is None:
+            return None
+        if self._sec is None:
+            self._sec = {}
+        elif i in self._sec:
+            return self._sec[i]
+        v = self._sec[i] = hms_to_sec(self.cells[i]) if self.cells[i] else None
+        return v
+
+
+def _fold(s: str) -> str:
+    return (s or "").lower().strip()
+
+
+def _loose(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
+
+
+def header_fingerprint(header: List[str]) -> str:
+    return hashlib.sha1(json.dumps(list(header), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RowSchema:
+    """
+    header → slot: เทียบชื่อแบบ lower/strip ก่อน (ชื่อซ้ำ = ตัวแรกชนะ)
+    ไม่เจอ → เทียบแบบตัดทุกอย่างที่ไม่ใช่ a-z0-9 (ใช้เฉพาะเมื่อได้คอลัมน์เดียว)
+    """
+
+    __slots__ = ("header", "width", "fingerprint", "slots", "_loose", "fields", "_cols", "_missing")
+
+    def __init__(self, header: List[str], fields: Optional[Dict[str, str]] = None):
+        self.header = list(header)
+        self.width = len(self.header)
+        self.fingerprint = header_fingerprint(self.header)
+        self.slots: Dict[str, int] = {}
+        loose: Dict[str, List[int]] = {}
+        for i, h in enumerate(self.header):
+            self.slots.setdefault(_fold(h), i)
+            loose.setdefault(_loose(h), []).append(i)
+        self._loose = {k: v[0] for k, v in loose.items() if k and len(v) == 1}
+        self.fields: Dict[str, str] = dict(fields or {})
+        self._cols: Dict[str, Optional[int]] = {f: self.slot(name) for f, name in self.fields.items()}
+        self._missing: Dict[Tuple[str, ...], List[str]] = {}
+
+    def slot(self, name: str) -> Optional[int]:
+        i = self.slots.get(_fold(name))
+        return i if i is not None else self._loose.get(_loose(name))
+
+    def col(self, field: str) -> Optional[int]:
+        """index ของ field (ชื่อในโค้ด); ไม่มีในชีต → None"""
+        return self._cols[field]
+
+    def missing(self, *fields: str) -> List[str]:
+        """ชื่อคอลัมน์ (ตาม header) ของ field ที่หาไม่เจอ; ตรวจครั้งเดียวต่อชุด field"""
+        got = self._missing.get(fields)
+        if got is None:
+            got = self._missing[fields] = [self.fields[f] for f in fields if self._cols[f] is None]
+        return got
+
+    def wrap(self, cells: List, row_num: Optional[int] = None) -> Row:
+        return Row(cells, self, row_num)
+
+    def wrap_all(self, rows: Iterable[List], first_row_num: int = 2) -> List[Row]:
+        return [Row(r, self, first_row_num + k) for k, r in enumerate(rows)]
+
+
+_SCHEMAS: Dict[Tuple[str, str], RowSchema] = {}
+_SCHEMAS_MAX = 32
+
+
+def resolve_schema(header: List[str], fields: Optional[Dict[str, str]] = None) -> RowSchema:
+    """RowSchema ของ header นี้ (cache ตาม fingerprint ของ header + ชุด field)"""
+    key = (header_fingerprint(header), json.dumps(fields or {}, ensure_ascii=False, sort_keys=True))
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        if len(_SCHEMAS) >= _SCHEMAS_MAX:
+            _SCHEMAS.clear()
+        schema = _SCHEMAS[key] = RowSchema(header, fields)
+    return schema
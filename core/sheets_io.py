@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Google API clients + Sheets values helpers ที่ entry point ทุกตัวใช้ร่วมกัน.
+
+client สร้างผ่าน ``build_client`` — import ``googleapiclient.discovery`` (และ ``googleapiclient.http``
+ที่ตามมา, รวม ~0.25 วินาที) ตอนสร้าง client ครั้งแรก ไม่ใช่ตอน import โมดูล
+→ import entry point เร็วขึ้น (ดู core/startup.py)
+
+helper ของ values รับ ``spreadsheet_id`` เอง (entry point ผูกกับ SPREADSHEET_ID ของตัวเอง);
+helper ของ grid (header / แถว / A1) เป็น pure
+"""
+
+from typing import List, Optional
+
+SHEETS_SCOPE   = "https://www.googleapis.com/auth/spreadsheets"
+DRIVE_RO_SCOPE = "https://www.googleapis.com/auth/drive.readonly"
+
+
+# ---------- Google API clients ----------
+def credentials(*scopes: str):
+    import google.auth
+    creds, _ = google.auth.default(scopes=list(scopes))
+    return creds
+
+
+def build_client(api: str, version: str, creds):
+    from googleapiclient.discovery import build
+    return build(api, version, credentials=creds, cache_discovery=False)
+
+
+def sheets_client():
+    """Sheets client ใหม่ (ใช้แยกต่อ thread กับ batch writer แบบขนาน)"""
+    return build_client("sheets", "v4", credentials(SHEETS_SCOPE))
+
+
+def drive_client():
+    """Drive client ใหม่ (read-only; ใช้แยกต่อ thread กับ OCR แบบขนาน)"""
+    return build_client("drive", "v3", credentials(DRIVE_RO_SCOPE))
+
+
+# ---------- Sheets values ----------
+def get_values(sheets, spreadsheet_id: str, a1: str) -> List[List[str]]:
+    return sheets.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id, range=a1
+    ).execute().get("values", [])
+
+
+def update_values(sheets, spreadsheet_id: str, a1: str, values: List[List[str]]):
+    return sheets.spreadsheets().values().update(
+        spreadsheetId=spreadsheet_id,
+        range=a1,
+        valueInputOption="RAW",
+        body={"values": values},
+    ).execute()
+
+
+def append_values(sheets, spreadsheet_id: str, a1: str, values: List[List[str]]):
+    return sheets.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range=a1,
+        valueInputOption="RAW",
+        insertDataOption="INSERT_ROWS",
+        body={"values": values},
+    ).execute()
+
+
+def sheet_titles(sheets, spreadsheet_id: str) -> List[str]:
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    return [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+
+
+def ensure_sheet(sheets, spreadsheet_id: str, title: str):
+    if title in sheet_titles(sheets, spreadsheet_id):
+        return
+    sheets.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": [{"addSheet": {"properties": {"title": title}}}]},
+    ).execute()
+
+
+# ---------- Grid helpers ----------
+def find_col(header: List[str], name: str) -> Optional[int]:
+    """index ของคอลัมน์ชื่อ ``name`` (ไม่สนตัวพิมพ์ / ช่องว่างหัวท้าย); ไม่มี → None"""
+    name = (name or "").lower().strip()
+    for i, h in enumerate(header):
+        if (h or "").lower().strip() == name:
+            return i
+    return None
+
+
+def ensure_col(header: List[str], rows: List[List[str]], name: str) -> int:
+    """Ensure column exists; if not, append to header and every row."""
+    i = find_col(header, name)
+    if i is None:
+        header.append(name)
+        i = len(header) - 1
+        for r in rows:
+            r.append("")
+    return i
+
+
+def pad_row(row: List[str], target_len: int) -> List[str]:
+    if len(row) < target_len:
+        return row + [""] * (target_len - len(row))
+    return row[:target_len]
+
+
+def col_letter(n: int) -> str:
+    s = []
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s.append(chr(65 + r))
+    return "".join(reversed(s))
+
+
+def range_for_row(sheet_name: str, row_1based: int, num_cols: int) -> str:
+    last_col = col_letter(num_cols)
+    return f"{sheet_name}!A{row_1based}:{last_col}{row_1based}"
+
+
+def get_cell(row: List[str], idx: Optional[int]) -> str:
+    """อ่าน cell แบบปลอดภัย – ถ้า idx None หรือเลยความยาว ให้คืน "" """
+    if idx is None:
+        return ""
+    return row[idx] if idx < len(row) else ""
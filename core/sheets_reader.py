@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Partial reads for Sheets ``values.batchGet`` (เฉพาะคอลัมน์ / เฉพาะแถวที่ต้องใช้).
+
+การอ่านปกติได้ค่าแบบ formatted (เช่น Timestamp = ``9/17/2025 9:28:21`` ตาม locale ของชีต)
+ซึ่งต้อง parse ใหม่และเดา D/M vs M/D เอง. ``read_columns_unformatted`` ขอเฉพาะคอลัมน์ที่ต้องใช้
+แบบ ``UNFORMATTED_VALUE`` + ``SERIAL_NUMBER`` → Timestamp เป็นเลข serial, ตัวเลขเป็น float
+
+ค่าที่ได้ใช้ "คู่ขนาน" กับแถวเดิมเท่านั้น (index / กรอง / เทียบ) — ไม่เขียน serial กลับลงแถว
+
+เปิดใช้: env ``SERIAL_READS=1``
+
+``read_rows`` อ่านเฉพาะเลขแถวที่ต้องการ (แถวติดกันรวมเป็น range เดียว) สำหรับโหมด
+"index then fetch": อ่านคอลัมน์ Timestamp / สถานะก่อน → คำนวณแถวเป้าหมาย → ดึงเฉพาะแถวนั้น
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.sheets_io import col_letter
+
+SERIAL_READS = os.getenv("SERIAL_READS", "0") == "1"
+READ_MAX_RANGES = int(os.getenv("READ_MAX_RANGES", "100"))   # ranges ต่อ batchGet (ความยาว URL)
+
+_A1_FIRST_ROW_RE = re.compile(r"!\$?[A-Z]+\$?(\d+)")
+
+
+def first_row_of(a1: str) -> Optional[int]:
+    """เลขแถวแรกของ A1 range เช่น ``'Sheet'!A61:AZ70`` → 61"""
+    m = _A1_FIRST_ROW_RE.search(a1 or "")
+    return int(m.group(1)) if m else None
+
+
+def read_columns_unformatted(sheets, spreadsheet_id: str, sheet_name: str,
+                             cols: Dict[str, Optional[int]], first_row: int = 2,
+                             last_row: Optional[int] = None) -> Dict[str, List]:
+    return read_columns(sheets, spreadsheet_id, sheet_name, cols, first_row, last_row, unformatted=True)
+
+
+def read_columns(
+    sheets,
+    spreadsheet_id: str,
+    sheet_name: str,
+    cols: Dict[str, Optional[int]],
+    first_row: int = 2,
+    last_row: Optional[int] = None,
+    *,
+    unformatted: bool = False,
+) -> Dict[str, List]:
+    """
+    อ่านคอลัมน์ (index 0-based) ตั้งแต่ ``first_row`` ถึง ``last_row`` ในคำขอเดียว
+    (``unformatted`` → UNFORMATTED_VALUE + SERIAL_NUMBER)
+
+    Return: key -> list ยาวเท่าจำนวนแถวที่ขอ (ช่องว่าง / แถวที่ API ตัดทิ้ง = "")
+    ถ้าไม่ระบุ ``last_row`` ความยาว = เท่าที่ API ส่งกลับมา
+    """
+    wanted = {k: i for k, i in cols.items() if i is not None}
+    if not wanted or (last_row is not None and last_row < first_row):
+        return {k: [] for k in cols}
+    tail = str(last_row) if last_row is not None else ""
+    ranges = [f"{sheet_name}!{col_letter(i + 1)}{first_row}:{col_letter(i + 1)}{tail}"
+              for i in wanted.values()]
+    render = ({"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}
+              if unformatted else {})
+    resp = sheets.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id, ranges=ranges, majorDimension="COLUMNS", **render,
+    ).execute()
+    out: Dict[str, List] = {k: [] for k in cols}
+    for key, vr in zip(wanted, resp.get("valueRanges", [])):
+        vals = (vr.get("values") or [[]])[0]
+        if last_row is not None:
+            n = last_row - first_row + 1
+            vals = list(vals[:n]) + [""] * max(0, n - len(vals))
+        out[key] = vals
+    if last_row is None:
+        # API ตัดช่องว่างท้ายคอลัมน์ไม่เท่ากัน → เติมให้ยาวเท่ากัน
+        n = max((len(v) for v in out.values()), default=0)
+        for key in wanted:
+            out[key] = list(out[key]) + [""] * (n - len(out[key]))
+    return out
+
+
+def coalesce_rows(row_nums: Iterable[int]) -> List[Tuple[int, int]]:
+    """เลขแถว → ช่วงแถวติดกัน [(first, last), ...]"""
+    out: List[Tuple[int, int]] = []
+    for n in sorted(set(row_nums)):
+        if out and n == out[-1][1] + 1:
+            out[-1] = (out[-1][0], n)
+        else:
+            out.append((n, n))
+    return out
+
+
+def read_rows(
+    sheets,
+    spreadsheet_id: str,
+    sheet_name: str,
+    row_nums: Iterable[int],
+    last_col: str = "AZ",
+    max_ranges: int = READ_MAX_RANGES,
+) -> Dict[int, List]:
+    """อ่านเฉพาะแถวที่ระบุ (formatted) → {row_num: cells}; แถวว่าง = []"""
+    spans = coalesce_rows(row_nums)
+    out: Dict[int, List] = {}
+    for k in range(0, len(spans), max(1, max_ranges)):
+        part = spans[k:k + max_ranges]
+        resp = sheets.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{sheet_name}!A{a}:{last_col}{b}" for a, b in part],
+        ).execute()
+        for (a, b), vr in zip(part, resp.get("valueRanges", [])):
+            vals = vr.get("values", [])
+            for n in range(a, b + 1):
+                out[n] = list(vals[n - a]) if n - a < len(vals) else []
+    return out
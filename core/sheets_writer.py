@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Size-aware writer for Sheets ``values.batchUpdate``.
+
+- แบ่ง ``data`` (list of {"range", "values"}) เป็น chunk ตามขนาด payload (bytes) และจำนวน range
+- ส่งแต่ละ chunk แบบขนาน (จำกัดจำนวน worker) + retry เฉพาะ chunk ที่ล้ม (429 / 5xx / network)
+- คืนรายงานต่อ chunk: ranges, bytes, attempts, latency_sec, result
+
+googleapiclient service ไม่ thread-safe → ถ้า workers > 1 ต้องส่ง ``sheets_factory``
+มาให้แต่ละ thread สร้าง client ของตัวเอง (ไม่ส่งมา = ทำทีละ chunk)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from core.sheets_io import col_letter
+from core.sheets_reader import first_row_of
+
+BATCH_MAX_BYTES   = int(os.getenv("BATCH_MAX_BYTES", "1500000"))   # ต่ำกว่าเพดาน ~2MB ที่ Google แนะนำ
+BATCH_MAX_RANGES  = int(os.getenv("BATCH_MAX_RANGES", "200"))
+BATCH_WORKERS     = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_RETRIES     = int(os.getenv("BATCH_RETRIES", "3"))
+BATCH_ROWS_PER_RANGE = int(os.getenv("BATCH_ROWS_PER_RANGE", "500"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _entry_bytes(entry: dict) -> int:
+    return len(json.dumps(entry, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def rows_to_value_ranges(
+    sheet_name: str,
+    first_row_1based: int,
+    rows: List[List],
+    num_cols: int,
+    rows_per_range: int = BATCH_ROWS_PER_RANGE,
+) -> List[dict]:
+    """แตกบล็อกแถวใหญ่ (เช่นเขียนทั้งชีตครั้งแรก) เป็นหลาย range ให้ chunker แบ่งได้"""
+    last_col = col_letter(max(1, num_cols))
+    out: List[dict] = []
+    step = max(1, rows_per_range)
+    for k in range(0, len(rows), step):
+        block = rows[k:k + step]
+        r1 = first_row_1based + k
+        r2 = r1 + len(block) - 1
+        out.append({"range": f"{sheet_name}!A{r1}:{last_col}{r2}", "values": block})
+    return out
+
+
+def row_cells_to_value_ranges(sheet_name: str, row_1based: int, cells: List, cols: Iterable[Optional[int]]) -> List[dict]:
+    """เฉพาะคอลัมน์ ``cols`` (index 0-based) ของแถวเดียว — คอลัมน์ติดกันรวมเป็น range เดียว"""
+    out: List[dict] = []
+    run: List[int] = []
+    for c in sorted({c for c in cols if c is not None}) + [None]:
+        if run and (c is None or c != run[-1] + 1):
+            vals = [cells[i] if i < len(cells) else "" for i in run]
+            a1 = f"{col_letter(run[0] + 1)}{row_1based}:{col_letter(run[-1] + 1)}{row_1based}"
+            out.append({"range": f"{sheet_name}!{a1}", "values": [vals]})
+            run = []
+        if c is not None:
+            run.append(c)
+    return out
+
+
+def chunk_value_ranges(
+    data: List[dict],
+    max_bytes: int = BATCH_MAX_BYTES,
+    max_ranges: int = BATCH_MAX_RANGES,
+) -> List[List[dict]]:
+    """แบ่งตามลำดับเดิม; range เดี่ยวที่ใหญ่เกิน max_bytes จะอยู่ใน chunk ของตัวเอง"""
+    chunks: List[List[dict]] = []
+    cur: List[dict] = []
+    cur_bytes = 0
+    for entry in data:
+        b = _entry_bytes(entry)
+        if cur and (cur_bytes + b > max_bytes or len(cur) >= max_ranges):
+            chunks.append(cur)
+            cur, cur_bytes = [], 0
+        cur.append(entry)
+        cur_bytes += b
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def merge_value_ranges(parts: Iterable[List[dict]]) -> List[dict]:
+    """รวม value ranges จากหลาย worker ตามลำดับ; range ซ้ำ → ค่าหลังสุดชนะ (อยู่ตำแหน่งแรกที่พบ)"""
+    merged: Dict[str, dict] = {}
+    for part in parts:
+        for entry in part:
+            merged[entry["range"]] = entry
+    return list(merged.values())
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, HttpError):
+        status = getattr(getattr(e, "resp", None), "status", None)
+        try:
+            return int(status) in RETRYABLE_STATUS
+        except (TypeError, ValueError):
+            return False
+    # socket timeout / connection reset / ssl
+    return isinstance(e, OSError)
+
+
+def batch_update_chunked(
+    sheets,
+    spreadsheet_id: str,
+    data: List[dict],
+    *,
+    sheets_factory: Optional[Callable[[], object]] = None,
+    max_bytes: int = BATCH_MAX_BYTES,
+    max_ranges: int = BATCH_MAX_RANGES,
+    workers: int = BATCH_WORKERS,
+    retries: int = BATCH_RETRIES,
+    value_input_option: str = "RAW",
+    log: Optional[Callable[[dict], None]] = None,
+) -> List[Dict]:
+    """
+    เขียน ``data`` ด้วย values.batchUpdate หลาย chunk
+
+    ทุก chunk จะถูกลองส่งจนครบก่อน แล้วค่อย raise error ตัวแรก (chunk ที่สำเร็จแล้วอยู่ในชีตแน่นอน)
+    Return: รายงานต่อ chunk (เรียงตาม chunk index)
+    """
+    if not data:
+        return []
+
+    chunks = chunk_value_ranges(data, max_bytes=max_bytes, max_ranges=max_ranges)
+    n_workers = max(1, min(workers, len(chunks))) if sheets_factory else 1
+
+    local = threading.local()
+
+    def _client():
+        if n_workers == 1:
+            return sheets
+        if not hasattr(local, "sheets"):
+            local.sheets = sheets_factory()
+        return local.sheets
+
+    def _send(i: int, chunk: List[dict]) -> Dict:
+        payload = {"valueInputOption": value_input_option, "data": chunk}
+        report = {
+            "event": "batch_chunk", "chunk": i, "ranges": len(chunk),
+            "bytes": sum(_entry_bytes(e) for e in chunk),
+        }
+        t0 = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                _client().spreadsheets().values().batchUpdate(
+                    spreadsheetId=spreadsheet_id, body=payload,
+                ).execute()
+                report.update(result="ok", error=None)
+                break
+            except Exception as e:
+                if attempt <= retries and _is_retryable(e):
+                    time.sleep(min(30.0, (2 ** (attempt - 1)) + random.random()))
+                    continue
+                report.update(result="error", error=e)
+                break
+        report["attempts"] = attempt
+        report["latency_sec"] = round(time.monotonic() - t0, 3)
+        if log:
+            log({k: (str(v) if k == "error" else v) for k, v in report.items()
+                 if not (k == "error" and v is None)})
+        return report
+
+    if n_workers == 1:
+        reports = [_send(i, c) for i, c in enumerate(chunks)]
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            reports = list(pool.map(lambda ic: _send(*ic), enumerate(chunks)))
+
+    failed = [r for r in reports if r["result"] != "ok"]
+    if failed:
+        raise failed[0]["error"]
+    for r in reports:
+        r.pop("error", None)
+    return reports
+
+
+def _row_count(data: Iterable[dict]) -> int:
+    return len({first_row_of(e["range"]) for e in data})
+
+
+FLUSH_EVERY_ROWS = int(os.getenv("FLUSH_EVERY_ROWS", "25"))
+FLUSH_EVERY_SEC  = float(os.getenv("FLUSH_EVERY_SEC", "60"))
+
+
+class WriteBehindBuffer:
+    """
+    Write-behind buffer สำหรับผล OCR รายแถว
+
+    - ``add()`` เก็บ {"range", "values"} ได้ทีละหลาย range (range ซ้ำ = ทับค่าเดิม)
+    - flush อัตโนมัติเมื่อครบ ``every_rows`` แถว (นับตามเลขแถวของ range) หรือค้างนานเกิน ``every_sec`` วินาที
+    - flush ล้ม → เก็บของเดิมไว้ (เขียนซ้ำได้ เพราะเป็นค่าเดิมทั้งชุด) แล้ว raise ต่อ
+    - ``on_flush(data)`` ถูกเรียกหลังเขียนสำเร็จ (เช่นอัปเดต local snapshot)
+    """
+
+    def __init__(self, sheets, spreadsheet_id: str, *,
+                 every_rows: int = FLUSH_EVERY_ROWS,
+                 every_sec: float = FLUSH_EVERY_SEC,
+                 on_flush: Optional[Callable[[List[dict]], None]] = None,
+                 **writer_kwargs):
+        self.sheets = sheets
+        self.spreadsheet_id = spreadsheet_id
+        self.every_rows = max(1, every_rows)
+        self.every_sec = every_sec
+        self.on_flush = on_flush
+        self.writer_kwargs = writer_kwargs
+        self.pending: Dict[str, dict] = {}
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.reports: List[Dict] = []
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return _row_count(self.pending.values())
+
+    def add(self, *entries: dict):
+        for entry in entries:
+            self.pending[entry["range"]] = entry
+        self.maybe_flush()
+
+    def maybe_flush(self) -> List[Dict]:
+        if not self.pending:
+            return []
+        due_rows = len(self) >= self.every_rows
+        due_time = (time.monotonic() - self._last_flush) >= self.every_sec
+        return self.flush() if (due_rows or due_time) else []
+
+    def flush(self) -> List[Dict]:
+        if not self.pending:
+            return []
+        data = list(self.pending.values())
+        reports = batch_update_chunked(self.sheets, self.spreadsheet_id, data, **self.writer_kwargs)
+        if self.on_flush:
+            self.on_flush(data)
+        self.pending.clear()
+        self.flushed_rows += _row_count(data)
+        self.flushes += 1
+        self.reports.extend(reports)
+        self._last_flush = time.monotonic()
+        return reports
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Local snapshot of the Working sheet (SQLite).
+
+ชีต Working ถูกใช้เป็น "ที่เผยแพร่ผล" ส่วนการเลือกแถว / กรองช่วงเวลา / สรุปรายวัน
+ทำบนสำเนาในเครื่อง (อยู่ได้ตลอดอายุ warm instance ของ Cloud Run):
+
+- ``refresh()``: อ่าน header (1 แถว) → ถ้า header / mapping เปลี่ยน หรือ snapshot เก่ากว่า
+  ``SNAPSHOT_MAX_AGE_SEC`` → โหลดทั้งแท็บใหม่; ไม่งั้นอ่านคอลัมน์ Timestamp + สถานะของแถวที่มีอยู่
+  มาเทียบก่อน (มีคนแก้สถานะเอง / ลบ / sort แถว → ไม่ตรง → โหลดทั้งแท็บใหม่) แล้วค่อยดึงแถวท้ายที่เพิ่มมา
+- ทุกครั้งที่สคริปต์เขียนชีตเอง ให้เรียก ``apply_value_ranges`` / ``apply_append``
+  เพื่ออัปเดตสำเนาให้ตรงกันโดยไม่ต้องอ่านชีตซ้ำ
+- คอลัมน์สำคัญเก็บแบบมีชนิด (epoch วินาที, วันที่ local, float km, duration เป็นวินาที)
+  พร้อม index สำหรับ query; ``SERIAL_READS=1`` → คอลัมน์ ts มาจากค่า serial ของชีต
+  (ไม่ต้องเดา D/M vs M/D) ส่วน cells ยังเป็นค่าที่แสดงผลเหมือนเดิม
+
+ค่าเริ่มต้นปิดอยู่ — เปิดใช้งาน: ตั้ง env ``SNAPSHOT_PATH`` (เช่น ``/tmp/working_snapshot.sqlite3``)
+ไฟล์จริงแยกต่อแท็บ (``snapshot_path``) → สลับไปมาระหว่างแท็บรายวันไม่ต้องล้าง / โหลดทั้งแท็บใหม่
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.rows import hms_to_sec, to_float
+from core.timeparse import ColumnParser
+from core.sheets_reader import SERIAL_READS, read_columns, read_columns_unformatted
+
+SNAPSHOT_PATH         = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_MAX_AGE_SEC  = int(os.getenv("SNAPSHOT_MAX_AGE_SEC", "1800"))
+LOCAL_TZ_OFFSET_HOURS = int(os.getenv("LOCAL_TZ_OFFSET_HOURS", "7"))
+_LOCAL_TZ = dt.timezone(dt.timedelta(hours=LOCAL_TZ_OFFSET_HOURS))
+
+# คอลัมน์ที่อ่านมาเทียบทุก incremental refresh (คนแก้สถานะ / ลบ / sort แถว → ค่าไม่ตรง)
+# ค่าอื่นที่คนแก้ (km, Employee ID ฯลฯ) ไม่ถูกตรวจ → ผู้ใช้ที่อ่านค่าเหล่านั้น (summary) ใช้ refresh(force=True)
+CHECK_FIELDS = ("ts", "out_status", "in_status")
+
+# field -> (default header, kind)   kind: ts | text | float | dur
+TYPED_FIELDS: Dict[str, Tuple[str, str]] = {
+    "ts":           ("Timestamp", "ts"),
+    "emp_id":       ("รหัสพนักงาน (Employee ID)", "text"),
+    "team":         ("เลือกทีมของตัวเอง (Select your team)", "text"),
+    "where_val":    ("ลักษณะสถานที่วิ่ง (Where did you run?)", "text"),
+    "man_km":       ("ระยะทาง หน่วยกิโลเมตร  (Distance in km unit)", "float"),
+    "out_status":   ("Out_Status", "text"),
+    "in_status":    ("In_Status", "text"),
+    "out_km":       ("Out_Distance_km", "float"),
+    "out_dur_sec":  ("Out_Duration_hms", "dur"),
+    "digi_km":      ("digi_distance_km", "float"),
+    "digi_dur_sec": ("digi_duration_hms", "dur"),
+    "mach_km":      ("mach_distance_km", "float"),
+    "mach_dur_sec": ("mach_duration_hms", "dur"),
+    "shot_date":    ("Shot_Date", "text"),
+}
+_SQL_TYPE = {"ts": "REAL", "text": "TEXT", "float": "REAL", "dur": "INTEGER"}
+
+_A1_ROWS_RE = re.compile(r"!\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d*))?$")
+_TS_FORMATS = (
+    "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+)
+
+
+# =============== value converters ===============
+def _ts_cascade(v) -> Optional[dt.datetime]:
+    """ลองทุก format (ใช้กับค่าที่ fast path ของ ColumnParser อ่านไม่ได้)"""
+    if isinstance(v, (int, float)):
+        return dt.datetime(1899, 12, 30, tzinfo=_LOCAL_TZ) + dt.timedelta(days=float(v))
+    s = str(v).strip()
+    if re.fullmatch(r"\d+(\.\d+)?", s):
+        return _ts_cascade(float(s))
+    s = re.sub(r"\.\d+$", "", s)
+    for f in _TS_FORMATS:
+        try:
+            return dt.datetime.strptime(s, f).replace(tzinfo=_LOCAL_TZ)
+        except ValueError:
+            pass
+    try:
+        d = dt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return d if d.tzinfo is not None else d.replace(tzinfo=_LOCAL_TZ)
+
+
+_TS_PARSER = ColumnParser(_ts_cascade, tz=_LOCAL_TZ)
+
+
+def parse_ts_epoch(v) -> Optional[float]:
+    """Timestamp cell → epoch seconds (เวลาไม่มี tz ถือเป็นเวลา local); อ่านไม่ได้ → None"""
+    d = _TS_PARSER(v)
+    return d.timestamp() if d is not None else None
+
+
+def local_day(epoch: Optional[float]) -> Optional[str]:
+    if epoch is None:
+        return None
+    return dt.datetime.fromtimestamp(epoch, _LOCAL_TZ).date().isoformat()
+
+
+_CONVERT = {
+    "ts": parse_ts_epoch,
+    "text": lambda v: (str(v).strip() if v is not None else ""),
+    "float": to_float,
+    "dur": hms_to_sec,
+}
+
+
+def _col_to_n(s: str) -> int:
+    n = 0
+    for ch in s:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+# =============== snapshot ===============
+class WorkingSnapshot:
+    """สำเนา Working sheet ใน SQLite; row_num = เลขแถวจริงในชีต (header = 1)"""
+
+    def __init__(self, sheets, spreadsheet_id: str, sheet_name: str, *,
+                 path: str = SNAPSHOT_PATH,
+                 columns: Optional[Dict[str, str]] = None,
+                 last_col: str = "AZ",
+                 max_age_sec: int = SNAPSHOT_MAX_AGE_SEC):
+        self.sheets = sheets
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.last_col = last_col
+        self.max_age_sec = max_age_sec
+        self.columns = {f: (columns or {}).get(f, name) for f, (name, _k) in TYPED_FIELDS.items()}
+        self.db = sqlite3.connect(path, timeout=30)
+        self._ensure_schema()
+        self.header: List[str] = json.loads(self._meta("header") or "[]")
+        self._slots: Dict[str, Optional[int]] = {}
+        self._reindex()
+
+    # ---------- schema / meta ----------
+    def _ensure_schema(self):
+        typed = ", ".join(f"{f} {_SQL_TYPE[k]}" for f, (_n, k) in TYPED_FIELDS.items())
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS rows (
+                row_num INTEGER PRIMARY KEY, cells TEXT NOT NULL, ts_day TEXT, {typed}
+            );
+            CREATE INDEX IF NOT EXISTS rows_ts      ON rows(ts);
+            CREATE INDEX IF NOT EXISTS rows_day_emp ON rows(ts_day, emp_id);
+            CREATE INDEX IF NOT EXISTS rows_status  ON rows(out_status, in_status);
+        """)
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, **kv):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+            [(k, str(v)) for k, v in kv.items()],
+        )
+
+    def _identity(self, header: List[str]) -> str:
+        blob = json.dumps([self.spreadsheet_id, self.sheet_name, header, self.columns], ensure_ascii=False)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def _reindex(self):
+        fold = {}
+        for i, h in enumerate(self.header):
+            fold.setdefault((h or "").lower().strip(), i)
+        self._slots = {f: fold.get((name or "").lower().strip()) for f, name in self.columns.items()}
+
+    @property
+    def max_row(self) -> int:
+        row = self.db.execute("SELECT MAX(row_num) FROM rows").fetchone()
+        return row[0] or 1
+
+    # ---------- read from sheet ----------
+    def _get(self, a1: str) -> Tuple[int, List[List[str]]]:
+        resp = self.sheets.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=a1
+        ).execute()
+        m = _A1_ROWS_RE.search(resp.get("range", "") or "")
+        start = int(m.group(2)) if m else None
+        return start, resp.get("values", [])
+
+    def refresh(self, force: bool = False) -> Dict:
+        """Sync กับชีต: full reload หรือ (ถ้าแถวเดิมยังตรงกับชีต) ดึงเฉพาะแถวที่เพิ่มท้ายตาราง"""
+        t0 = time.monotonic()
+        _s, head = self._get(f"{self.sheet_name}!A1:{self.last_col}1")
+        header = head[0] if head else []
+        age = time.time() - float(self._meta("refreshed_at") or 0)
+        if force:
+            reason = "forced"
+        elif self._meta("identity") != self._identity(header):
+            reason = "identity"
+        elif age > self.max_age_sec:
+            reason = "age"
+        else:
+            reason = None if self._in_sync() else "drift"
+
+        if reason:
+            start, values = self._get(f"{self.sheet_name}!A:{self.last_col}")
+            self.replace(values[0] if values else [], values[1:])
+            self._apply_ts_serials(2, len(values) - 1)
+            mode, fetched = "full", len(values)
+        else:
+            first = self.max_row + 1
+            start, values = self._get(f"{self.sheet_name}!A{first}:{self.last_col}")
+            start = start or first
+            if values:
+                with self.db:
+                    self._upsert((start + k, row) for k, row in enumerate(values))
+                self._apply_ts_serials(start, len(values))
+            mode, fetched = "incremental", len(values)
+        return {"event": "snapshot_refresh", "mode": mode, "reason": reason, "fetched_rows": fetched,
+                "rows": self.max_row - 1, "duration_sec": round(time.monotonic() - t0, 3)}
+
+    def _in_sync(self) -> bool:
+        """คอลัมน์ ``CHECK_FIELDS`` ของแถว 2..max_row ในชีตตรงกับสำเนาไหม (batchGet เดียว)"""
+        slots = {f: self._slots.get(f) for f in CHECK_FIELDS}
+        last = self.max_row
+        if last < 2 or all(i is None for i in slots.values()):
+            return True
+        live = read_columns(self.sheets, self.spreadsheet_id, self.sheet_name, slots, 2, last)
+        for k, cells in enumerate(self.values()[1:]):
+            for f, i in slots.items():
+                if i is None:
+                    continue
+                mine = cells[i] if i < len(cells) else ""
+                if str("" if mine is None else mine) != str(live[f][k]):
+                    return False
+        return True
+
+    def _apply_ts_serials(self, first_row: int, n: int):
+        """SERIAL_READS: แทนค่า ts ที่ parse จาก string ด้วยค่า serial ของแถวช่วงนี้"""
+        i_ts = self._slots.get("ts")
+        if not SERIAL_READS or i_ts is None or n <= 0:
+            return
+        col = read_columns_unformatted(self.sheets, self.spreadsheet_id, self.sheet_name,
+                                       {"ts": i_ts}, first_row, first_row + n - 1)["ts"]
+        batch = []
+        for k, v in enumerate(col):
+            if isinstance(v, (int, float)):
+                ep = parse_ts_epoch(v)
+                batch.append((ep, local_day(ep), first_row + k))
+        with self.db:
+            self.db.executemany("UPDATE rows SET ts = ?, ts_day = ? WHERE row_num = ?", batch)
+
+    # ---------- local updates ----------
+    def replace(self, header: List[str], rows: List[List[str]]):
+        """แทนที่ทั้งตาราง (เช่นหลังเขียน Working ครั้งแรก)"""
+        with self.db:
+            self.db.execute("DELETE FROM rows")
+            self._set_header(header)
+            i_ts = self._slots.get("ts")
+            if i_ts is not None:
+                _TS_PARSER.sniff(r[i_ts] for r in rows if i_ts < len(r))
+            self._upsert((k + 2, r) for k, r in enumerate(rows))
+            self._set_meta(refreshed_at=time.time())
+
+    def set_header(self, header: List[str]):
+        """header เปลี่ยน (เพิ่มคอลัมน์ผลลัพธ์) → คำนวณคอลัมน์มีชนิดใหม่ทั้งหมด"""
+        with self.db:
+            self._set_header(header)
+            rows = self.db.execute("SELECT row_num, cells FROM rows").fetchall()
+            self._upsert((n, json.loads(c)) for n, c in rows)
+
+    def _set_header(self, header: List[str]):
+        self.header = list(header)
+        self._reindex()
+        self._set_meta(header=json.dumps(self.header, ensure_ascii=False), identity=self._identity(self.header))
+
+    def apply_append(self, first_row: int, rows: List[List[str]]):
+        with self.db:
+            self._upsert((first_row + k, r) for k, r in enumerate(rows))
+
+    def apply_append_result(self, resp: dict, rows: List[List[str]]):
+        """อัปเดตสำเนาจากผลของ values.append (ใช้ updatedRange หาแถวแรกที่ถูกเขียน)"""
+        m = _A1_ROWS_RE.search(((resp or {}).get("updates") or {}).get("updatedRange", ""))
+        self.apply_append(int(m.group(2)) if m else self.max_row + 1, rows)
+
+    def apply_value_ranges(self, data: Iterable[dict]):
+        """อัปเดตสำเนาตาม payload ของ values.batchUpdate ที่เพิ่งเขียนไป"""
+        with self.db:
+            for entry in data:
+                if not entry["range"].startswith(f"{self.sheet_name}!"):
+                    continue
+                m = _A1_ROWS_RE.search(entry["range"])
+                if not m:
+                    continue
+                c0, r0 = _col_to_n(m.group(1)) - 1, int(m.group(2))
+                for k, vals in enumerate(entry["values"]):
+                    rn = r0 + k
+                    if rn == 1:
+                        self._set_header(list(vals))
+                        continue
+                    cur = self.get_row(rn) or []
+                    if len(cur) < c0 + len(vals):
+                        cur = cur + [""] * (c0 + len(vals) - len(cur))
+                    cur[c0:c0 + len(vals)] = ["" if v is None else v for v in vals]
+                    self._upsert([(rn, cur)])
+
+    def _upsert(self, numbered_rows: Iterable[Tuple[int, List]]):
+        fields = list(TYPED_FIELDS)
+        kinds = [TYPED_FIELDS[f][1] for f in fields]
+        slots = [self._slots.get(f) for f in fields]
+        sql = (f"INSERT OR REPLACE INTO rows(row_num, cells, ts_day, {', '.join(fields)}) "
+               f"VALUES ({', '.join('?' * (len(fields) + 3))})")
+        batch = []
+        for rn, row in numbered_rows:
+            typed = [
+                _CONVERT[k](row[i]) if (i is not None and i < len(row)) else (None if k != "text" else "")
+                for k, i in zip(kinds, slots)
+            ]
+            batch.append((rn, json.dumps(list(row), ensure_ascii=False), local_day(typed[0]), *typed))
+        self.db.executemany(sql, batch)
+
+    # ---------- queries ----------
+    def get_row(self, row_num: int) -> Optional[List[str]]:
+        row = self.db.execute("SELECT cells FROM rows WHERE row_num=?", (row_num,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def values(self) -> List[List[str]]:
+        """เหมือน values.get ของทั้งแท็บ: [header] + แถวข้อมูล (แถวที่ขาดหาย = [])"""
+        if not self.header:
+            return []
+        out: List[List[str]] = [list(self.header)]
+        for rn, cells in self.db.execute("SELECT row_num, cells FROM rows ORDER BY row_num"):
+            while len(out) < rn - 1:
+                out.append([])
+            out.append(json.loads(cells))
+        return out
+
+    def row_nums(self, where: str, params: tuple = ()) -> List[int]:
+        return [r[0] for r in self.db.execute(f"SELECT row_num FROM rows WHERE {where} ORDER BY row_num", params)]
+
+    def rows_for_day(self, day_iso: str) -> List[List[str]]:
+        """แถวทั้งหมดของวัน (ตามวันที่ local ของ Timestamp) เรียงตามเลขแถว"""
+        cur = self.db.execute("SELECT cells FROM rows WHERE ts_day = ? ORDER BY row_num", (day_iso,))
+        return [json.loads(c) for (c,) in cur]
+
+    def pending_row_nums(self) -> List[int]:
+        """แถวที่ยังไม่เคยตัดสินผล (Out_Status และ In_Status ว่างทั้งคู่)"""
+        return self.row_nums("COALESCE(out_status, '') = '' AND COALESCE(in_status, '') = ''")
+
+    def row_nums_in_window(self, start_epoch: float, end_epoch: float) -> List[int]:
+        return self.row_nums("ts >= ? AND ts <= ?", (start_epoch, end_epoch))
+
+    def rows_in_window(self, start_epoch: float, end_epoch: float) -> List[Tuple[int, List[str]]]:
+        """(row_num, cells) ของแถวที่ Timestamp อยู่ในช่วง เรียงตามเลขแถว"""
+        cur = self.db.execute("SELECT row_num, cells FROM rows WHERE ts >= ? AND ts <= ? ORDER BY row_num",
+                              (start_epoch, end_epoch))
+        return [(rn, json.loads(c)) for rn, c in cur]
+
+    def pending_row_nums_in_window(self, start_epoch: float, end_epoch: float) -> List[int]:
+        return self.row_nums(
+            "ts >= ? AND ts <= ? AND COALESCE(out_status, '') = '' AND COALESCE(in_status, '') = ''",
+            (start_epoch, end_epoch),
+        )
+
+    def row_nums_for_day(self, day_iso: str) -> List[int]:
+        return self.row_nums("ts_day = ?", (day_iso,))
+
+
+def snapshot_path(base: str, spreadsheet_id: str, sheet_name: str) -> str:
+    """ไฟล์ของแท็บหนึ่ง: ``<base>.<hash ของ spreadsheet + แท็บ><ext>``"""
+    root, ext = os.path.splitext(base)
+    digest = hashlib.sha1(f"{spreadsheet_id}\x00{sheet_name}".encode("utf-8")).hexdigest()[:12]
+    return f"{root}.{digest}{ext}"
+
+
+def open_snapshot(sheets, spreadsheet_id: str, sheet_name: str, **kw) -> Optional[WorkingSnapshot]:
+    """คืน None ถ้าปิด snapshot (SNAPSHOT_PATH ว่าง) หรือเปิดไฟล์ไม่ได้; หนึ่งไฟล์ต่อแท็บ"""
+    path = kw.pop("path", SNAPSHOT_PATH)
+    if not path:
+        return None
+    try:
+        return WorkingSnapshot(sheets, spreadsheet_id, sheet_name,
+                               path=snapshot_path(path, spreadsheet_id, sheet_name), **kw)
+    except sqlite3.Error:
+        return None
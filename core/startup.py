@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time budget ของ entry point (cold start บน Cloud Run = เวลา import + request แรก).
+
+แต่ละ entry point จด ``time.perf_counter()`` เป็นบรรทัดแรก แล้วเรียก ``report(entry, t0)`` ท้ายโมดูล
+→ เวลา import (ms), budget, และ dependency หนักตัวไหนถูกโหลดตั้งแต่ import (เก็บไว้ใน ``IMPORT_STATS``)
+ส่งเข้า logger ของ entry point ถ้ามี; ไม่มี → เงียบ ยกเว้นเกิน budget (print JSON 1 บรรทัด)
+(ควรเป็น lazy: Vision / PIL / googleapiclient.discovery / pyarrow / numpy โหลดเมื่อใช้จริงเท่านั้น)
+
+budget: env ``IMPORT_BUDGET_MS`` (0 = วัดอย่างเดียว) หรือรายตัว ``IMPORT_BUDGET_MS_<ENTRY>``
+
+วัดจาก process ใหม่ (ไม่ติด cache ของ process ที่ import ไปแล้ว):
+
+    python -m core.startup ocr_sheet recheck_ocr summary_daily_record
+
+exit code 1 ถ้ามีตัวไหนเกิน budget (ใช้เป็น gate ก่อน deploy ได้)
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+from typing import Callable, Dict, Optional
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "0"))
+
+HEAVY_MODULES = (
+    "google.cloud.vision",
+    "PIL.Image",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "pyarrow",
+    "numpy",
+)
+
+
+def budget_ms(entry: str) -> float:
+    return float(os.getenv(f"IMPORT_BUDGET_MS_{entry.upper()}", IMPORT_BUDGET_MS))
+
+
+def report(entry: str, t0: float, log: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """เวลาตั้งแต่ ``t0`` ถึงตอนนี้ + dependency หนักที่ถูกโหลดแล้ว → ``log`` (ไม่มี: print เฉพาะตอนเกิน budget) และคืน dict"""
+    ms = (time.perf_counter() - t0) * 1000.0
+    budget = budget_ms(entry)
+    info = {
+        "event": "import",
+        "entry": entry,
+        "import_ms": round(ms, 1),
+        "budget_ms": budget,
+        "over_budget": bool(budget) and ms > budget,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+    if log is not None:
+        log(info)
+    elif info["over_budget"]:
+        print(json.dumps(info), flush=True)
+    return info
+
+
+def measure(entry: str) -> Dict:
+    """import ``entry`` ใน interpreter ใหม่ แล้วคืน report ของมัน (บรรทัด event=import)"""
+    code = (
+        "import time, json; t0 = time.perf_counter(); "
+        f"import {entry}; from core import startup; "
+        f"print(json.dumps(startup.report({entry!r}, t0, log=lambda i: None)))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv) -> int:
+    entries = argv or ["ocr_sheet", "recheck_ocr", "summary_daily_record"]
+    over = 0
+    for entry in entries:
+        info = measure(entry)
+        over += info["over_budget"]
+        print(json.dumps(info))
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Status rule engine (Out_Status / In_Status) — ใช้ร่วมกันระหว่าง ocr_sheet, recheck_ocr และ rejudge.
+
+กฎตัดสินเป็นตาราง ``STATUS_RULES`` (ไล่ตามลำดับ กฎแรกที่ fact ครบทุกตัวชนะ; ไม่เข้ากฎใด → "OK"):
+
+    small + over → "All Condition Insufficient"
+    small        → "Distance Insufficient"
+    over         → "Time Over"
+
+fact ของแต่ละประเภท (เกณฑ์จาก ``Limits``: DIST_MIN_KM / TIME_OVER_HMS):
+- Outdoor: small = Out_Distance_km < เกณฑ์, over = Out_Duration_hms > เกณฑ์
+  (ใช้เฉพาะเมื่อภาพหลักอ่านได้ = "OK"; "Miss box" / "NG" ไม่โดนทับ)
+- Indoor : ขาด digi_duration_hms / mach_distance_km / mach_duration_hms → "NG"
+  small = mach_distance_km < เกณฑ์, over = digi_duration_hms และ mach_duration_hms > เกณฑ์ ทั้งคู่
+
+``REJUDGEABLE``: สถานะที่มาจากตารางนี้ → คำนวณใหม่จากค่าที่เก็บในชีตได้โดยไม่ต้อง OCR ซ้ำ
+(NG / Miss box / Quarantined / Superseded มาจากการอ่านภาพ → คงเดิม)
+"""
+
+from typing import Dict, Optional, Tuple
+
+STATUS_OK          = "OK"
+STATUS_NG          = "NG"
+STATUS_COND_INSUFF = "All Condition Insufficient"
+STATUS_DIST_INSUFF = "Distance Insufficient"
+STATUS_TIME_OVER   = "Time Over"
+
+STATUS_RULES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    (STATUS_COND_INSUFF, ("small", "over")),
+    (STATUS_DIST_INSUFF, ("small",)),
+    (STATUS_TIME_OVER,   ("over",)),
+)
+
+REJUDGEABLE = frozenset([STATUS_OK] + [status for status, _ in STATUS_RULES])
+
+
+class Limits:
+    __slots__ = ("dist_min_km", "time_over_sec")
+
+    def __init__(self, dist_min_km: float, time_over_sec: int):
+        self.dist_min_km = dist_min_km
+        self.time_over_sec = time_over_sec
+
+    def small(self, km: Optional[float]) -> bool:
+        return km is not None and km < self.dist_min_km
+
+    def over(self, sec: Optional[int]) -> bool:
+        return sec is not None and sec > self.time_over_sec
+
+
+def judge(facts: Dict[str, bool]) -> str:
+    for status, needs in STATUS_RULES:
+        if all(facts.get(f) for f in needs):
+            return status
+    return STATUS_OK
+
+
+def judge_outdoor(dist_km: Optional[float], dur_sec: Optional[int], limits: Limits) -> str:
+    """สถานะ Outdoor ของแถวที่อ่านภาพหลักได้ ("OK" ก่อนเทียบเกณฑ์)"""
+    return judge({"small": limits.small(dist_km), "over": limits.over(dur_sec)})
+
+
+def judge_indoor(digi_sec: Optional[int], mach_km: Optional[float], mach_sec: Optional[int],
+                 limits: Limits) -> str:
+    """สถานะ Indoor จากค่าที่อ่านได้ (None = อ่านไม่ได้)"""
+    if digi_sec is None or mach_km is None or mach_sec is None:
+        return STATUS_NG
+    return judge({"small": limits.small(mach_km),
+                  "over": limits.over(digi_sec) and limits.over(mach_sec)})
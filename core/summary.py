@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+"""
+Daily summary rows (แท็บ YYYY-MM-DD) — ใช้ร่วมกันระหว่าง summary_daily_record และ ocr_sheet.
+
+- ``build_summary_row``: แถว Working (Row ตาม ``WORK_FIELDS``) → แถวสรุป 16 คอลัมน์ตาม ``OUT_HEADER``
+- ``build_summary_rows``: เหมือน ``build_summary_row`` ทีละหลายแถว; มี numpy → คำนวณ flag แบบ vectorized
+- ``latest_per_employee``: streaming reducer — แถวล่าสุดต่อ Employee ID (Timestamp parse ครั้งเดียว) เรียงตามเวลา
+- ``superseded_positions`` / ``split_superseded``: กฎ "ล่าสุดชนะ" เดียวกันฝั่ง OCR → แถวที่ถูกส่งใหม่ทับแล้ว
+  ไม่มีผลต่อสรุป → OCR ทีหลัง (``OCR_SUPERSEDED=defer``) หรือไม่ OCR เลย (``skip``, สถานะ ``STATUS_SUPERSEDED``)
+- ``input_fingerprint``: hash ของ cell ที่ใช้สรุปของวันหนึ่ง → summarize_day ข้ามวันที่ input ไม่เปลี่ยน
+- ``upsert_day_summaries``: incremental — แถวที่เพิ่งตัดสินผล → upsert เฉพาะ (วัน, Employee ID) ที่เปลี่ยน
+  ลงแท็บของวันนั้นโดยตรง (แท็บคือ store; ไม่ต้องคำนวณทั้งวันใหม่)
+
+เปิด incremental จาก ocr_sheet: env ``SUMMARY_INCREMENTAL=1``
+summarize_day ยังเป็นตัว rebuild เต็มวัน (เรียงแถวใหม่ทั้งแท็บ) เหมือนเดิม
+"""
+
+import os
+import re
+import json
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, date, timedelta
+
+from core.rows import resolve_schema, hms_to_sec
+from core.timeparse import ColumnParser
+from core.sheets_reader import read_columns
+
+SUMMARY_INCREMENTAL = os.getenv("SUMMARY_INCREMENTAL", "0") == "1"
+# แถวเก่าของ (พนักงาน, วัน) ที่มีแถวใหม่กว่าแล้ว: "off" = OCR ตามลำดับแถวเดิม | "defer" = OCR แถวล่าสุดก่อน | "skip" = ไม่ OCR
+OCR_SUPERSEDED    = os.getenv("OCR_SUPERSEDED", "off").strip().lower()
+STATUS_SUPERSEDED = os.getenv("STATUS_SUPERSEDED", "Superseded")
+# คอลัมน์สรุปแบบ columnar ด้วย NumPy (optional): "auto" = ใช้เมื่อติดตั้ง numpy และแถว >= MIN_ROWS; "0" = ปิด
+SUMMARY_VECTORIZE          = os.getenv("SUMMARY_VECTORIZE", "auto").strip().lower()
+SUMMARY_VECTORIZE_MIN_ROWS = int(os.getenv("SUMMARY_VECTORIZE_MIN_ROWS", "256"))
+
+# fingerprint ของ input ต่อวัน (เก็บใน developerMetadata ของแท็บผลลัพธ์)
+FINGERPRINT_KEY = "summary_fingerprint"
+_FINGERPRINT_VERSION = "1"   # เปลี่ยนเมื่อกฎการสรุปเปลี่ยน → ทุกแท็บถูกเขียนใหม่ในรอบถัดไป
+
+# =============== COLUMN NAMES (TH / EN) ===============
+# Base (from Working)
+COL_TS    = "Timestamp"  # e.g. '9/17/2025 9:28:21'
+COL_TEAM  = "เลือกทีมของตัวเอง (Select your team)"
+COL_EID   = "รหัสพนักงาน (Employee ID)"
+COL_MAN   = "ระยะทาง หน่วยกิโลเมตร  (Distance in km unit)"
+COL_WHERE = "ลักษณะสถานที่วิ่ง (Where did you run?)"
+
+# Images (pass-through)
+COL_IMG_OUT     = "รูปถ่ายแสดงระยะทาง Outdoor และเวลาจากอุปกรณ์สมาร์ทวอทช์ หรือแอปพลิเคชันจากมือถือ  (Photo showing distance and time from a smartwatch or mobile application)"
+COL_SELFIE_OUT  = "รูปถ่ายตัวเองระหว่างร่วมกิจกรรมแบบ Outdoor (Selfie)"
+COL_IMG_IN_DIGI = "รูปถ่ายแสดงระยะทาง Indoor และเวลาจากอุปกรณ์สมาร์ทวอทช์ หรือแอปพลิเคชันจากมือถือ  (Photo showing distance and time from a smartwatch or mobile application)"
+COL_IMG_IN_MACH = "รูปถ่ายระยะทางจากเครื่องออกกำลังกาย (Photo of the distance display from the exercise machine.)"
+COL_SELFIE_IN   = "รูปถ่ายตัวเองระหว่างร่วมกิจกรรมแบบ Indoor (Selfie)"
+
+# Inputs for merge (from Working)
+OUT_STATUS = "Out_Status"
+IN_STATUS  = "In_Status"
+
+OUT_DIST   = "Out_Distance_km"
+MACH_DIST  = "mach_distance_km"
+
+OUT_DUR    = "Out_Duration_hms"
+DIGI_DUR   = "digi_duration_hms"
+MACH_DUR   = "mach_duration_hms"
+
+# Shot date parsed from OCR (M/D/YYYY), e.g. '3/17/2025'
+COL_SHOT_DATE = "Shot_Date"
+
+# Output column names (Summary sheet)
+OUT_STATUS_COL    = "Value condition"                      # (merged status)
+OUT_DISTANCE_COL  = "Distance"
+OUT_DURATION_COL  = "Duration"
+OUT_CHECK_COL     = "Check distance with input distance"   # ("OK"/"Different"/"N/A")
+OUT_CHECK_DATE    = "Check Date"                           # ("OK"/"NG"/"N/A")
+OUT_SUMMARY       = "Summary"                              # ("OK"/"NG")
+
+OUT_HEADER = [
+    COL_TS, COL_TEAM, COL_EID, COL_MAN, COL_WHERE,
+    COL_IMG_OUT, COL_SELFIE_OUT, COL_IMG_IN_DIGI, COL_IMG_IN_MACH, COL_SELFIE_IN,
+    OUT_DISTANCE_COL, OUT_DURATION_COL, OUT_STATUS_COL, OUT_CHECK_COL,
+    OUT_CHECK_DATE, OUT_SUMMARY
+]
+
+# Working columns by field name (core/rows.py resolves them once per header)
+WORK_FIELDS = {
+    "ts": COL_TS, "team": COL_TEAM, "eid": COL_EID, "man": COL_MAN, "where": COL_WHERE,
+    "out_sta": OUT_STATUS, "in_sta": IN_STATUS, "out_dist": OUT_DIST, "mach_dist": MACH_DIST,
+    "out_dur": OUT_DUR, "digi_dur": DIGI_DUR, "mach_dur": MACH_DUR,
+    "img_out": COL_IMG_OUT, "selfie_out": COL_SELFIE_OUT, "img_in_digi": COL_IMG_IN_DIGI,
+    "img_in_mach": COL_IMG_IN_MACH, "selfie_in": COL_SELFIE_IN, "shot_date": COL_SHOT_DATE,
+}
+REQUIRED_FIELDS = ("ts", "team", "eid", "man", "where", "out_sta", "in_sta",
+                   "out_dist", "mach_dist", "out_dur", "digi_dur", "mach_dur")
+
+
+# =============== GENERIC HELPERS ===============
+# Put US-style first to match your actual data patterns,
+# then Thai-style, then ISO.
+_DATE_FORMATS = [
+    "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
+]
+
+def parse_date_only(v) -> Optional[date]:
+    """Return date from various formats (also supports Google serial date)."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        # Google serial date
+        try:
+            base = datetime(1899, 12, 30)
+            return (base + timedelta(days=float(v))).date()
+        except Exception:
+            return None
+    s = str(v).strip()
+    # Trim milliseconds if present
+    s2 = re.sub(r"\.\d+$", "", s)
+    for f in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, f).date()
+        except ValueError:
+            pass
+        if s2 != s:
+            try:
+                return datetime.strptime(s2, f).date()
+            except ValueError:
+                pass
+    # Tolerant: pull M/D/Y anywhere at head; ignore trailing time/noise
+    m = re.search(r"(?<!\d)(\d{1,2})/(\d{1,2})/(\d{2,4})", s)
+    if m:
+        mm, dd, yy = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if yy < 100: yy += 2000
+        if yy > 2400: yy -= 543  # BE -> CE
+        try:
+            return date(yy, mm, dd)
+        except Exception:
+            return None
+    return None
+
+def parse_datetime(v) -> Optional[datetime]:
+    """Return datetime; supports Google serial date."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        try:
+            base = datetime(1899, 12, 30)
+            return base + timedelta(days=float(v))
+        except Exception:
+            return None
+    s = str(v).strip()
+    s2 = re.sub(r"\.\d+$", "", s)
+    for f in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, f)
+        except ValueError:
+            pass
+        if s2 != s:
+            try:
+                return datetime.strptime(s2, f)
+            except ValueError:
+                pass
+    # ISO-ish
+    m = re.search(r"(?<!\d)(20\d{2})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2})(?::(\d{2}))?", s)
+    if m:
+        y, mo, dd = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        hh, mm = int(m.group(4)), int(m.group(5))
+        ss = int(m.group(6) or "0")
+        try:
+            return datetime(y, mo, dd, hh, mm, ss)
+        except Exception:
+            return None
+    return None
+
+# Column parsers: fast path + cache ต่อ cell; ค่าที่ไม่เข้า fast path → parse_datetime
+TS_PARSER   = ColumnParser(parse_datetime)
+SHOT_PARSER = ColumnParser(parse_datetime, fmt="mdy")   # Shot_Date เขียนโดย OCR เป็น M/D/YYYY เสมอ
+
+def date_of(parser: ColumnParser, v) -> Optional[date]:
+    d = parser(v)
+    return d.date() if d is not None else parse_date_only(v)
+
+def first_non_empty(*vals: str) -> str:
+    for v in vals:
+        if v is None:
+            continue
+        s = str(v).strip()
+        if s != "":
+            return s
+    return ""
+
+def min_duration_hms(a: Optional[str], b: Optional[str]) -> str:
+    """Pick the smaller HH:MM:SS; return '' if both missing/invalid."""
+    def to_sec(hms: Optional[str]) -> Optional[int]:
+        if not hms:
+            return None
+        try:
+            h, m, s = hms.strip().split(":")
+            return int(h)*3600 + int(m)*60 + int(s)
+        except Exception:
+            return None
+    sa, sb = to_sec(a), to_sec(b)
+    if sa is None and sb is None:
+        return ""
+    if sa is None:
+        return b or ""
+    if sb is None:
+        return a or ""
+    return a if sa <= sb else b
+
+
+# =============== SUMMARY ROWS ===============
+def build_summary_row(r, ts_raw=None) -> List[str]:
+    """Row (schema ตาม WORK_FIELDS) → แถวสรุป; ``ts_raw`` = ค่า Timestamp แบบ serial (SERIAL_READS)"""
+    ts     = r.get("ts")
+    team   = r.get("team")
+    eid    = r.get("eid")
+    man    = r.get("man")
+    wherev = r.get("where")
+
+    # images
+    img_out     = r.get("img_out")
+    selfie_out  = r.get("selfie_out")
+    img_in_digi = r.get("img_in_digi")
+    img_in_mach = r.get("img_in_mach")
+    selfie_in   = r.get("selfie_in")
+
+    # Value condition (merged status)
+    value_condition = first_non_empty(r.get("out_sta"), r.get("in_sta"))
+
+    # Distance (merged)
+    dist_src = "out_dist" if r.get("out_dist").strip() else "mach_dist"
+    distance = r.get(dist_src).strip()
+
+    # Duration (by where)
+    where_lc = wherev.strip().lower()
+    if "indoor" in where_lc or "ในร่ม" in where_lc:
+        duration = min_duration_hms(r.get("digi_dur"), r.get("mach_dur"))
+    else:
+        duration = r.get("out_dur")
+
+    # Check distance with input distance
+    dist_num = r.num(dist_src)
+    man_num  = r.num("man")
+    if (dist_num is None) or (man_num is None):
+        check_distance = "N/A"
+    else:
+        check_distance = "OK" if dist_num == man_num else "Different"
+
+    # Check Date
+    ts_date_only = date_of(TS_PARSER, ts if ts_raw is None else ts_raw)  # expects '9/17/2025 9:28:21' etc.
+    shot_raw_stripped = r.get("shot_date").strip()
+    if not shot_raw_stripped:
+        check_date = "N/A"  # ว่าง = N/A
+    else:
+        shot_date_only = date_of(SHOT_PARSER, shot_raw_stripped)  # expects '3/17/2025'
+        if (ts_date_only is not None) and (shot_date_only is not None) and (ts_date_only == shot_date_only):
+            check_date = "OK"
+        elif (ts_date_only is not None) and (shot_date_only is not None):
+            check_date = "Different"   # <-- เปลี่ยนจากเดิมที่เป็น "NG"
+        else:
+            check_date = "N/A"
+
+    # Summary
+    summary = "OK" if (value_condition == "OK" and check_distance == "OK" and check_date == "OK") else "NG"
+
+    return [
+        ts, team, eid, man, wherev,
+        img_out, selfie_out, img_in_digi, img_in_mach, selfie_in,
+        distance, duration, value_condition, check_distance,
+        check_date, summary
+    ]
+
+
+_NP = None
+
+def _numpy():
+    """numpy ถ้าติดตั้งไว้ (import ครั้งแรกที่ใช้); ไม่มี → None"""
+    global _NP
+    if _NP is None:
+        try:
+            import numpy
+            _NP = numpy
+        except ImportError:
+            _NP = False
+    return _NP or None
+
+
+def _ordinal(memo: Dict[object, int], parser: ColumnParser, v) -> int:
+    """วันที่ของ cell เป็น ordinal (-1 = อ่านไม่ได้); memo ต่อค่า cell"""
+    got = memo.get(v)
+    if got is None:
+        d = date_of(parser, v)
+        got = memo[v] = d.toordinal() if d is not None else -1
+    return got
+
+
+def build_summary_rows(rows: List, ts_raws: Optional[List] = None) -> List[List[str]]:
+    """
+    หลายแถวพร้อมกัน (ผลเท่ากับ ``build_summary_row`` ทีละแถว; ``ts_raws[k]`` None = ใช้ Timestamp ในแถว)
+    มี numpy + แถวมากพอ → ไล่แถวครั้งเดียวเพื่อดึงค่าเป็นคอลัมน์ (km เป็น float, เวลาเป็นวินาที,
+    วันที่เป็น ordinal) แล้วคำนวณ Duration / Check distance / Check Date / Summary แบบ vectorized
+    """
+    np = _numpy() if SUMMARY_VECTORIZE != "0" and len(rows) >= SUMMARY_VECTORIZE_MIN_ROWS else None
+    if np is None:
+        return [build_summary_row(r, ts_raws[k] if ts_raws is not None else None) for k, r in enumerate(rows)]
+
+    n = len(rows)
+    base, value_cond, distance, out_dur, digi_dur, mach_dur = [], [], [], [], [], []
+    dist_num = np.full(n, np.nan)
+    man_num  = np.full(n, np.nan)
+    digi_sec = np.zeros(n, dtype=np.int64)
+    mach_sec = np.zeros(n, dtype=np.int64)
+    ok_a     = np.zeros(n, dtype=bool)
+    ok_b     = np.zeros(n, dtype=bool)
+    indoor   = np.zeros(n, dtype=bool)
+    ts_day   = np.full(n, -1, dtype=np.int64)
+    shot_day = np.full(n, -1, dtype=np.int64)
+    has_shot = np.zeros(n, dtype=bool)
+    ts_days: Dict[object, int] = {}     # ค่า cell → ordinal (แต่ละค่าที่ต่างกัน parse ครั้งเดียว)
+    shot_days: Dict[object, int] = {}
+    for k, r in enumerate(rows):
+        ts, wherev = r.get("ts"), r.get("where")
+        base.append([ts, r.get("team"), r.get("eid"), r.get("man"), wherev,
+                     r.get("img_out"), r.get("selfie_out"), r.get("img_in_digi"),
+                     r.get("img_in_mach"), r.get("selfie_in")])
+        value_cond.append(first_non_empty(r.get("out_sta"), r.get("in_sta")))
+        dist_src = "out_dist" if r.get("out_dist").strip() else "mach_dist"
+        distance.append(r.get(dist_src).strip())
+        v = r.num(dist_src)
+        if v is not None:
+            dist_num[k] = v
+        v = r.num("man")
+        if v is not None:
+            man_num[k] = v
+        where_lc = wherev.strip().lower()
+        indoor[k] = "indoor" in where_lc or "ในร่ม" in where_lc
+        out_dur.append(r.get("out_dur"))
+        a, b = r.get("digi_dur"), r.get("mach_dur")
+        digi_dur.append(a)
+        mach_dur.append(b)
+        sa, sb = hms_to_sec(a) if a else None, hms_to_sec(b) if b else None
+        if sa is not None:
+            digi_sec[k], ok_a[k] = sa, True
+        if sb is not None:
+            mach_sec[k], ok_b[k] = sb, True
+        raw = ts_raws[k] if ts_raws is not None else None
+        ts_day[k] = _ordinal(ts_days, TS_PARSER, ts if raw is None else raw)
+        shot = r.get("shot_date").strip()
+        if shot:
+            has_shot[k] = True
+            shot_day[k] = _ordinal(shot_days, SHOT_PARSER, shot)
+
+    # Duration: Indoor → min(digi, mach) (ค่าที่อ่านไม่ได้ถูกข้าม), Outdoor → Out_Duration_hms
+    pick_a = ok_a & (~ok_b | (digi_sec <= mach_sec))
+    pick_b = ok_b & ~pick_a
+
+    # Check distance with input distance
+    check_distance = np.where(np.isnan(dist_num) | np.isnan(man_num), "N/A",
+                              np.where(dist_num == man_num, "OK", "Different"))
+    # Check Date (ว่าง / อ่านไม่ได้ = N/A)
+    both_days = has_shot & (ts_day >= 0) & (shot_day >= 0)
+    check_date = np.where(both_days, np.where(ts_day == shot_day, "OK", "Different"), "N/A")
+    # Summary
+    summary = np.where((np.array(value_cond, dtype=object) == "OK")
+                       & (check_distance == "OK") & (check_date == "OK"), "OK", "NG")
+
+    out: List[List[str]] = []
+    for k, (cd, cdate, sm) in enumerate(zip(check_distance.tolist(), check_date.tolist(), summary.tolist())):
+        if indoor[k]:
+            duration = digi_dur[k] if pick_a[k] else (mach_dur[k] if pick_b[k] else "")
+        else:
+            duration = out_dur[k]
+        out.append(base[k] + [distance[k], duration, value_cond[k], cd, cdate, sm])
+    return out
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _key_of(d: Optional[datetime]) -> float:
+    """datetime → วินาทีนับจาก 1970 (naive); None → 0 (= 1970-01-01 เหมือนเดิม)"""
+    if d is None:
+        return 0.0
+    return (d.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+def ts_key(v) -> float:
+    """Timestamp → ตัวเลขสำหรับเทียบ / เรียง (parse ครั้งเดียว)"""
+    return _key_of(TS_PARSER(v))
+
+
+def latest_per_employee(rows: Iterable, descending: bool = False) -> List[Tuple[float, object]]:
+    """
+    Streaming reducer: ไล่แถว (Row ตาม WORK_FIELDS) รอบเดียว เก็บเฉพาะแถวล่าสุดต่อ Employee ID
+    Timestamp ของแต่ละแถว parse ครั้งเดียวเป็น key ตัวเลข → คืน [(key, row)] เรียงตามเวลา
+    (เวลาเท่ากัน: แถวแรกชนะ และคงลำดับที่พนักงานปรากฏครั้งแรก — เหมือน max() + sort เดิม)
+    คอลัมน์สรุปคำนวณภายหลังเฉพาะแถวที่รอด (``build_summary_row``)
+    """
+    best: Dict[str, Tuple[float, object]] = {}
+    for r in rows:
+        emp = r.get("eid").strip()
+        if not emp:
+            continue
+        k = ts_key(r.get("ts"))
+        cur = best.get(emp)
+        if cur is None or k > cur[0]:
+            best[emp] = (k, r)
+    out = list(best.values())
+    out.sort(key=lambda kr: kr[0], reverse=descending)
+    return out
+
+
+def superseded_positions(pairs: Iterable[Tuple[str, object]]) -> Set[int]:
+    """
+    (Employee ID, Timestamp) ของแต่ละแถว → ตำแหน่งของแถวที่ไม่ใช่แถวล่าสุดของ (พนักงาน, วันที่ของ Timestamp)
+    กฎเดียวกับ ``latest_per_employee`` (เวลาเท่ากัน: แถวแรกชนะ) → แถวเหล่านี้ไม่มีวันถูกเลือกลงแท็บสรุป
+    ไม่มี Employee ID / วันที่อ่านไม่ได้ → ไม่นับว่าถูกแทน
+    """
+    best: Dict[Tuple[str, date], Tuple[float, int]] = {}
+    out: Set[int] = set()
+    for k, (emp, ts) in enumerate(pairs):
+        emp = ("" if emp is None else str(emp)).strip()
+        d = date_of(TS_PARSER, ts) if emp else None
+        if d is None:
+            continue
+        key = ts_key(ts)
+        cur = best.get((emp, d))
+        if cur is None:
+            best[(emp, d)] = (key, k)
+        elif key > cur[0]:
+            out.add(cur[1])
+            best[(emp, d)] = (key, k)
+        else:
+            out.add(k)
+    return out
+
+
+def split_superseded(items: List, is_superseded: Callable[[object], bool],
+                     mode: str = OCR_SUPERSEDED) -> Tuple[List, List]:
+    """
+    items (ตามลำดับเดิม) → (ลำดับที่ OCR, แถวที่ไม่ OCR)
+    defer: แถวล่าสุดก่อน แล้วแถวที่ถูกแทนต่อท้าย (ถูกตัดด้วย max_rows / time budget ก่อน)
+    skip : แถวที่ถูกแทนไม่ OCR — ผู้เรียกเขียน ``STATUS_SUPERSEDED`` ให้
+    """
+    if mode not in ("defer", "skip"):
+        return list(items), []
+    latest, old = [], []
+    for it in items:
+        (old if is_superseded(it) else latest).append(it)
+    return (latest, old) if mode == "skip" else (latest + old, [])
+
+
+def input_fingerprint(schema, day_rows: Iterable[List], unformatted: Optional[Dict[str, List]] = None,
+                      extra: Iterable = ()) -> str:
+    """sha256 ของคอลัมน์ใน WORK_FIELDS ของทุกแถวของวัน (+ ค่า serial, กฎ/เวอร์ชัน, ``extra``)"""
+    cols = [schema.col(f) for f in WORK_FIELDS] if schema is not None else []
+    h = hashlib.sha256()
+    h.update(json.dumps([_FINGERPRINT_VERSION, OUT_HEADER, list(extra)], ensure_ascii=False).encode())
+    for r in day_rows:
+        # str(): ค่าที่ OCR เพิ่งเขียน (float ใน snapshot) กับค่าที่อ่านจากชีต ("3.1") ต้องได้ hash เดียวกัน
+        cells = [("" if r[i] is None else str(r[i])) if (i is not None and i < len(r)) else "" for i in cols]
+        h.update(json.dumps(cells, ensure_ascii=False).encode())
+        h.update(b"\n")
+    for f in sorted(unformatted or {}):
+        h.update(json.dumps([f, unformatted[f]], ensure_ascii=False, default=str).encode())
+    return h.hexdigest()
+
+
+# =============== INCREMENTAL UPSERT ===============
+def upsert_day_summaries(sheets, spreadsheet_id: str, header: List[str],
+                         rows: Iterable[List]) -> Dict[str, int]:
+    """
+    แถว Working ที่เพิ่งตัดสินผล (cells ตาม ``header``) → upsert แถวสรุปของ (วัน, Employee ID)
+
+    - อ่านเฉพาะคอลัมน์ Timestamp + Employee ID ของแท็บวันนั้น (batchGet เดียวต่อวัน)
+    - พนักงานที่มีแถวอยู่แล้ว: เขียนทับแถวนั้นเมื่อ Timestamp ใหม่ >= เดิม (ล่าสุดชนะ เหมือน summarize_day)
+    - พนักงานใหม่: ต่อท้ายแท็บ (ลำดับอาจไม่เรียงเวลา จนกว่า summarize_day จะ rebuild)
+    - แท็บที่ยังไม่มี: สร้างใน batchUpdate เดียว; ค่าทั้งหมดเขียนใน values.batchUpdate เดียว
+    """
+    schema = resolve_schema(header, WORK_FIELDS)
+    if schema.missing(*REQUIRED_FIELDS):
+        raise ValueError(f"Missing columns in Working: {schema.missing(*REQUIRED_FIELDS)}")
+
+    # (วัน, พนักงาน) → แถวล่าสุดในชุดนี้ (key ตัวเลข); สร้างแถวสรุปเฉพาะแถวที่รอด
+    best: Dict[str, Dict[str, Tuple[float, object]]] = {}
+    for cells in rows:
+        r = schema.wrap(list(cells))
+        emp = r.get("eid").strip()
+        ts = r.get("ts")
+        d = TS_PARSER(ts)
+        day = d.date() if d is not None else parse_date_only(ts)
+        if not emp or day is None:
+            continue
+        k = _key_of(d)
+        cur = best.setdefault(day.isoformat(), {}).get(emp)
+        if cur is None or k >= cur[0]:
+            best[day.isoformat()][emp] = (k, r)
+    by_day = {day: {emp: (k, build_summary_row(r)) for emp, (k, r) in latest.items()}
+              for day, latest in best.items()}
+    stats = {"days": len(by_day), "updated": 0, "appended": 0, "skipped": 0}
+    if not by_day:
+        return stats
+
+    meta = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+    new_tabs = [t for t in sorted(by_day) if t not in titles]
+    data: List[Dict] = []
+    for tab, latest in sorted(by_day.items()):
+        existing = ({"ts": [], "eid": []} if tab in new_tabs else
+                    read_columns(sheets, spreadsheet_id, tab, {"ts": 0, "eid": 2}, first_row=1))
+        n_rows = len(existing["eid"])   # รวม header
+        if n_rows == 0:
+            data.append({"range": f"{tab}!A1", "values": [OUT_HEADER]})
+            n_rows = 1
+        where: Dict[str, int] = {}
+        for k in range(1, n_rows):
+            emp = str(existing["eid"][k] or "").strip()
+            if emp and emp not in where:
+                where[emp] = k
+        for emp, (key, row) in latest.items():
+            k = where.get(emp)
+            if k is None:
+                n_rows += 1
+                data.append({"range": f"{tab}!A{n_rows}", "values": [row]})
+                stats["appended"] += 1
+            elif key >= ts_key(existing["ts"][k]):
+                data.append({"range": f"{tab}!A{k + 1}", "values": [row]})
+                stats["updated"] += 1
+            else:
+                stats["skipped"] += 1   # ในแท็บมีแถวที่ใหม่กว่าอยู่แล้ว
+
+    if new_tabs:
+        sheets.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": t}}} for t in new_tabs]},
+        ).execute()
+    if data:
+        sheets.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"valueInputOption": "RAW", "data": data},
+        ).execute()
+    return stats
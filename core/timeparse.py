@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Column-level timestamp parser.
+
+เดิมทุกค่าถูกลอง ``strptime`` ทีละ format (พึ่ง exception) และถูก parse ซ้ำใน sort key:
+
+- ``sniff(values)`` ดูตัวอย่างจากคอลัมน์ แล้วเลือก fast path เดียว
+  (``mdy`` / ``dmy`` = ``9/17/2025 9:28:21``, ``iso`` = ``2025-09-17 09:28:21``)
+- fast path = regex ที่ compile ไว้ + สร้าง datetime ตรง ๆ (ไม่มี strptime / exception ในกรณีปกติ)
+- ค่าที่ไม่เข้า fast path (outlier) → ``fallback`` เดิมของแต่ละโมดูล
+- ผลลัพธ์ cache ต่อ cell string (ค่าเดิมใน sort key / หลายรอบใน warm instance ไม่ต้อง parse ซ้ำ)
+
+ค่าตัวเลข (serial จาก ``UNFORMATTED_VALUE`` / ``SERIAL_NUMBER``) แปลงตรง ๆ ไม่ต้องเดา format
+
+D/M vs M/D: ``mdy`` (ค่า default) ลองเดือนก่อนแล้วค่อยสลับ เหมือน cascade เดิม;
+ถ้าตัวอย่างในคอลัมน์มีค่าหน้าสุด > 12 (เช่น ``17/9/2025``) → ``dmy`` ทั้งคอลัมน์
+"""
+
+import re
+import datetime as dt
+from typing import Callable, Dict, Iterable, Optional
+
+_SLASH_RE = re.compile(r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?(?:\.\d+)?\s*$")
+_ISO_RE   = re.compile(r"^\s*(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?(?:\.\d+)?\s*$")
+
+SNIFF_SAMPLE = 200
+CACHE_MAX = 50000
+
+_SERIAL_EPOCH = dt.datetime(1899, 12, 30)
+
+
+def serial_to_datetime(v, tz: Optional[dt.tzinfo] = None) -> dt.datetime:
+    """Google Sheets serial (วันนับจาก 1899-12-30, เศษ = เวลา) → datetime (ปัดเป็นวินาที)"""
+    days = float(v)
+    whole = int(days)
+    return _SERIAL_EPOCH.replace(tzinfo=tz) + dt.timedelta(days=whole, seconds=round((days - whole) * 86400))
+
+
+def sniff(values: Iterable, sample: int = SNIFF_SAMPLE) -> Optional[str]:
+    """เดา format ของคอลัมน์จากค่าตัวอย่าง: "mdy" | "dmy" | "iso" | None (ไม่รู้จัก)"""
+    slash = iso = 0
+    first_gt12 = second_gt12 = False
+    n = 0
+    for v in values:
+        if not isinstance(v, str) or not v.strip():
+            continue
+        n += 1
+        m = _SLASH_RE.match(v)
+        if m:
+            slash += 1
+            first_gt12 |= int(m.group(1)) > 12
+            second_gt12 |= int(m.group(2)) > 12
+        elif _ISO_RE.match(v):
+            iso += 1
+        if n >= sample:
+            break
+    if not (slash or iso):
+        return None
+    if iso > slash:
+        return "iso"
+    return "dmy" if (first_gt12 and not second_gt12) else "mdy"
+
+
+class ColumnParser:
+    """
+    parse ค่าในคอลัมน์เดียวเป็น datetime (naive; ใส่ ``tz`` ให้ถ้ากำหนด)
+
+    ``fallback(v)`` ใช้กับค่าที่ fast path อ่านไม่ได้ ต้องคืน datetime หรือ None (ห้าม raise)
+    """
+
+    def __init__(self, fallback: Callable[[object], Optional[dt.datetime]],
+                 tz: Optional[dt.tzinfo] = None, fmt: Optional[str] = None):
+        self.fallback = fallback
+        self.tz = tz
+        self.fmt = fmt or "mdy"
+        self.cache: Dict[object, Optional[dt.datetime]] = {}
+        self.fast_hits = 0
+        self.fallbacks = 0
+
+    def sniff(self, values: Iterable) -> str:
+        fmt = sniff(values)
+        if fmt and fmt != self.fmt:
+            self.fmt = fmt
+            self.cache.clear()
+        return self.fmt
+
+    def __call__(self, v) -> Optional[dt.datetime]:
+        if v is None or v == "":
+            return None
+        try:
+            return self.cache[v]
+        except (KeyError, TypeError):
+            pass
+        if isinstance(v, str):
+            d = self._fast(v)
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            d = serial_to_datetime(v, self.tz)
+        else:
+            d = None
+        if d is None:
+            self.fallbacks += 1
+            d = self.fallback(v)
+        else:
+            self.fast_hits += 1
+        if len(self.cache) >= CACHE_MAX:
+            self.cache.clear()
+        try:
+            self.cache[v] = d
+        except TypeError:
+            pass
+        return d
+
+    def _fast(self, s: str) -> Optional[dt.datetime]:
+        m = (_ISO_RE if self.fmt == "iso" else _SLASH_RE).match(s)
+        if not m:
+            return None
+        a, b, c = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        hh, mm, ss = int(m.group(4) or 0), int(m.group(5) or 0), int(m.group(6) or 0)
+        if self.fmt == "iso":
+            orders = ((a, b, c),)
+        elif self.fmt == "dmy":
+            orders = ((c, b, a), (c, a, b))
+        else:
+            orders = ((c, a, b), (c, b, a))
+        for y, mo, d in orders:
+            try:
+                return dt.datetime(y, mo, d, hh, mm, ss, tzinfo=self.tz)
+            except ValueError:
+                continue
+        return None
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Sorted timestamp index สำหรับเลือกแถวตามช่วงเวลา.
+
+parse Timestamp ของทุกแถวครั้งเดียว (epoch วินาที) แล้วเก็บเป็นลำดับที่เรียงแล้ว
+→ ``window(start, end)`` ใช้ bisect: O(log n + k) แทนการ parse ทุกแถวใหม่ทุกครั้งที่กรอง
+แถวที่ parse ไม่ได้จะไม่อยู่ใน index (เหมือนเดิมที่ถือว่าไม่อยู่ในช่วง)
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterable, List, Optional
+
+
+class TimestampIndex:
+    def __init__(self, parse: Callable[[str], Optional[float]]):
+        self.parse = parse
+        self._keys: List[float] = []   # epoch เรียงจากน้อยไปมาก
+        self._pos: List[int] = []      # ตำแหน่งแถว (0-based) คู่กับ _keys
+        self.size = 0
+        self.unparsed = 0
+
+    @classmethod
+    def build(cls, cells: Iterable[str], parse: Callable[[str], Optional[float]]) -> "TimestampIndex":
+        index = cls(parse)
+        index.add(cells, start=0)
+        return index
+
+    def add(self, cells: Iterable[str], start: int):
+        """เพิ่มแถวต่อท้าย (เช่นหลัง append) โดยไม่ parse แถวเดิมซ้ำ"""
+        pairs = []
+        n = 0
+        for k, cell in enumerate(cells):
+            n += 1
+            t = self.parse(cell)
+            if t is None:
+                self.unparsed += 1
+            else:
+                pairs.append((t, start + k))
+        self.size += n
+        pairs.sort()
+        if not self._keys or not pairs or pairs[0][0] >= self._keys[-1]:
+            self._keys.extend(t for t, _ in pairs)
+            self._pos.extend(p for _, p in pairs)
+            return
+        merged = sorted(list(zip(self._keys, self._pos)) + pairs)
+        self._keys = [t for t, _ in merged]
+        self._pos = [p for _, p in merged]
+
+    def window(self, start_epoch: float, end_epoch: float) -> List[int]:
+        """ตำแหน่งแถวที่ start <= ts <= end (เรียงตามลำดับแถวเดิม)"""
+        lo = bisect_left(self._keys, start_epoch)
+        hi = bisect_right(self._keys, end_epoch)
+        return sorted(self._pos[lo:hi])
@@ -4,37 +4,63 @@ Backfill + Recheck OCR เฉพาะช่วงเวลา (copy -> ocr)
 - ซิงก์เฉพาะแถวในช่วงเวลาที่กำหนดจาก RAW -> WORK (ถ้าหายไป)
 - Detect เฉพาะแถวในช่วงเวลา และเฉพาะแถวที่ยัง "ไม่มี Out_Status และ In_Status"
 - ใช้ logic เดียวกับสคริปต์หลักล่าสุด (main):
-  • OCR wrapper กันพัง (non-image/รูปพัง/Vision error)
+  • OCR wrapper กันพัง (non-image/รูปพัง/Vision error) — core/drive_ocr.py
   • Parser เวลา/ระยะ (กัน km/h, รูปแบบแปลก, packed digits, มีคะแนนใกล้ label, pace injection)
+    — core/ocr_parse.py (โมดูลเดียวกับ main)
   • Outdoor/Indoor + All Condition Insufficient / Distance Insufficient / Time Over
   • เขียน Shot_Date จาก OCR เหมือน main
+  • แถวที่ค่า Where ไม่รู้จัก → Quarantined + บันทึกแท็บ "Quarantine" แล้วข้าม (เหมือน main)
+  • OCR_SUPERSEDED=defer|skip (เหมือน main): แถวล่าสุดของ (พนักงาน, วัน) ในแถวเป้าหมายก่อน
+    → max_rows / time budget ตัดแถวที่ถูกส่งใหม่ทับแล้วก่อน; skip = ไม่ OCR, ตั้งสถานะ "Superseded"
+    (แถวใหม่กว่าที่มีสถานะแล้วไม่นับ → แถวที่ลบสถานะออกเองได้ OCR ใหม่)
 
 Entry point: backfill_window_http (Cloud Run / Functions Framework)
+  พารามิเตอร์ (query string หรือ JSON body): from, to (default = เมื่อวานทั้งวัน),
+  max_rows, max_images, time_budget_sec, dry_run=1 (ดูแผน: จำนวนแถว / รูป / bytes โดยไม่เขียน),
+  job=<job_id> (ทำต่อจากรอบที่หยุดเพราะหมด time budget; บันทึกความคืบหน้าในแท็บ "Backfill Jobs")
 """
 
+import time
+_T0 = time.perf_counter()   # import-time budget (core/startup.py)
+
 import os
-import io
 import re
-import time
+import threading
 import datetime as dt
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
 from flask import Request, make_response
-import google.auth
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from googleapiclient.errors import HttpError
-from google.cloud import vision
-from PIL import Image, UnidentifiedImageError  # สำหรับตรวจไฟล์รูป
+
+from core import sheets_io, startup
+from core.sheets_io import SHEETS_SCOPE, DRIVE_RO_SCOPE, ensure_col, pad_row, get_cell
+from core.drive_ocr import ocr_image_bytes_safe, file_ids_from_cell, file_size, download_bytes_and_meta
+from core.ocr_parse import parse_duration_km_date_smart, sec_from_timestr, thr_hms_to_sec, where_category
+from core.rows import resolve_schema
+from core.ts_index import TimestampIndex
+from core.timeparse import ColumnParser
+from core.sheets_reader import SERIAL_READS, first_row_of, read_columns, read_rows
+from core.quarantine import STATUS_QUARANTINED, record_quarantine
+from core.status_rules import Limits, judge_indoor, judge_outdoor
+from core.reconcile import IMAGE_KEY_FIELDS, KEY_FIELDS, make_keyer, reconcile, row_key
+from core import partitions
+from core.jobs import find_open_job, lease_active, lease_renewer, load_job, new_job, record_run, save_job
+from core.sheets_writer import batch_update_chunked, merge_value_ranges, row_cells_to_value_ranges
+from core.snapshot import open_snapshot
+from core.summary import OCR_SUPERSEDED, STATUS_SUPERSEDED, superseded_positions, split_superseded
 
 # -------- Window (แก้ได้ตามต้องการ หรือ map มาจาก env) --------
 try:
     _tz = dt.timezone(dt.timedelta(hours=int(os.getenv("LOCAL_TZ_OFFSET_HOURS", "7"))))
 except Exception:
     _tz = dt.timezone(dt.timedelta(hours=7))
-_yesterday = (dt.datetime.now(_tz) - dt.timedelta(days=1)).date()
-DEFAULT_FROM = dt.datetime(_yesterday.year, _yesterday.month, _yesterday.day, 0, 0, 0, tzinfo=_tz).isoformat(timespec="seconds")
-DEFAULT_TO   = dt.datetime(_yesterday.year, _yesterday.month, _yesterday.day, 23, 59, 59, tzinfo=_tz).isoformat(timespec="seconds")
+
+def default_window(now: Optional[dt.datetime] = None) -> Tuple[str, str]:
+    """ช่วงเวลา default = ทั้งวันของ "เมื่อวาน" (คำนวณต่อ request — warm instance ไม่ค้างวันเก่า)"""
+    y = ((now or dt.datetime.now(_tz)).astimezone(_tz) - dt.timedelta(days=1)).date()
+    return (dt.datetime(y.year, y.month, y.day, 0, 0, 0, tzinfo=_tz).isoformat(timespec="seconds"),
+            dt.datetime(y.year, y.month, y.day, 23, 59, 59, tzinfo=_tz).isoformat(timespec="seconds"))
 
 # ---------------- คอนฟิก (ต้องตรงกับ main) ----------------
 SPREADSHEET_ID   = os.getenv("SPREADSHEET_ID", "1-ht6PyQtynMG-dMpSGM4I3sVr7HBhb8y33xwl_QZvVA")
@@ -50,9 +76,7 @@ INDOOR_DIGI_COL  = os.getenv("INDOOR_DIGI_COL", "รูปถ่ายแสด
 INDOOR_MACH_COL  = os.getenv("INDOOR_MACH_COL", "รูปถ่ายระยะทางจากเครื่องออกกำลังกาย (Photo of the distance display from the exercise machine.)")
 
 # Where?
-WHERE_COL_NAME   = os.getenv("WHERE_COL_NAME", "ลักษณะสถานที่วิ่ง (Where did you run?)")
-OUTDOOR_KEYS     = ["กลางแจ้ง", "นอกบ้าน", "outdoor"]
-INDOOR_KEYS      = ["ในร่ม", "indoor"]
+WHERE_COL_NAME   = os.getenv("WHERE_COL_NAME", "ลักษณะสถานที่วิ่ง (Where did you run?)")   # keys: core/ocr_parse.py
 
 # Outdoor results
 STATUS_COL = os.getenv("STATUS_COL", "Out_Status")
@@ -73,1017 +97,85 @@ PHOTO_DATE_COL = os.getenv("PHOTO_DATE_COL", "Shot_Date")
 RAW_RANGE  = os.getenv("RAW_RANGE",  f"{SHEET_NAME_RAW}!A:AZ")
 WORK_RANGE = os.getenv("WORK_RANGE", f"{SHEET_NAME_WORK}!A:AZ")
 
+# backfill reads: "full" = อ่านทั้งแท็บ RAW/WORK, "index" = อ่าน header + คอลัมน์ Timestamp/สถานะก่อน
+# แล้ว batchGet เฉพาะแถวเป้าหมาย (แถว WORK ที่ต้อง OCR + แถว RAW ที่ต้อง append)
+BACKFILL_READ_MODE = os.getenv("BACKFILL_READ_MODE", "full").strip().lower()
+
+# backfill แบบขนาน: แถวเป้าหมายแบ่งเป็น shard (ช่วงเวลาย่อย) ละ BACKFILL_SHARD_ROWS แถว
+# ให้ BACKFILL_WORKERS thread ทำ OCR พร้อมกัน แล้วรวมผลเขียนครั้งเดียว (1 = ทำทีละแถวแบบเดิม)
+BACKFILL_WORKERS    = int(os.getenv("BACKFILL_WORKERS", "4"))
+BACKFILL_SHARD_ROWS = int(os.getenv("BACKFILL_SHARD_ROWS", "25"))
+
+# resumable jobs (core/jobs.py): time budget ต่อ invocation (0 = ไม่จำกัด; ตั้งให้ต่ำกว่า request timeout)
+# และ auto-resume job ที่ยังไม่เสร็จของช่วงเวลาเดียวกัน
+BACKFILL_TIME_BUDGET_SEC = float(os.getenv("BACKFILL_TIME_BUDGET_SEC", "0"))
+BACKFILL_AUTO_RESUME     = os.getenv("BACKFILL_AUTO_RESUME", "1") == "1"
+
 # Timestamp column (ต้องมีใน RAW/WORK)
 TIMESTAMP_COL_NAME     = os.getenv("TIMESTAMP_COL_NAME", "Timestamp")
+EMP_ID_COL_NAME        = os.getenv("EMP_ID_COL_NAME", "รหัสพนักงาน (Employee ID)")
 LOCAL_TZ_OFFSET_HOURS  = int(os.getenv("LOCAL_TZ_OFFSET_HOURS", "7"))
 
 # thresholds & labels (ให้ตรงกับ main)
 TIME_OVER_HMS        = os.getenv("TIME_OVER_HMS", "02:00:00")
 DIST_MIN_KM          = float(os.getenv("DIST_MIN_KM", "2.0"))  # < 2.00 km
-STATUS_COND_INSUFF   = "All Condition Insufficient"
-STATUS_DIST_INSUFF   = "Distance Insufficient"
-
-# ---------------- Google clients ----------------
-def _build_services():
-    creds, _ = google.auth.default(scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive.readonly",
-    ])
-    sheets = build("sheets", "v4", credentials=creds, cache_discovery=False)
-    drive  = build("drive",  "v3", credentials=creds, cache_discovery=False)
-    return sheets, drive
-
-# ---------------- Sheets helpers ----------------
-def _get_values(sheets, a1: str):
-    return sheets.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID, range=a1
-    ).execute().get("values", [])
 
-def _update_values(sheets, a1: str, values):
-    return sheets.spreadsheets().values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=a1,
-        valueInputOption="RAW",
-        body={"values": values},
-    ).execute()
-
-def _append_values(sheets, a1: str, values):
-    return sheets.spreadsheets().values().append(
-        spreadsheetId=SPREADSHEET_ID,
-        range=a1,
-        valueInputOption="RAW",
-        insertDataOption="INSERT_ROWS",
-        body={"values": values},
-    ).execute()
-
-def _list_sheet_titles(sheets):
-    meta = sheets.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-    return [sh["properties"]["title"] for sh in meta.get("sheets", [])]
-
-def _ensure_sheet_exists(sheets, title: str):
-    if title in _list_sheet_titles(sheets):
-        return
-    sheets.spreadsheets().batchUpdate(
-        spreadsheetId=SPREADSHEET_ID,
-        body={"requests": [{"addSheet": {"properties": {"title": title}}}]},
-    ).execute()
-
-def _idx(header, name: str) -> Optional[int]:
-    name = (name or "").lower().strip()
-    for i, h in enumerate(header):
-        if (h or "").lower().strip() == name:
-            return i
-    return None
-
-def _ensure_col(header, rows, name: str) -> int:
-    i = _idx(header, name)
-    if i is None:
-        header.append(name)
-        i = len(header) - 1
-        for r in rows:
-            r.append("")
-    return i
-
-def _pad_row(row, target_len: int):
-    if len(row) < target_len:
-        return row + [""] * (target_len - len(row))
-    return row[:target_len]
-
-def _pad_all_rows(rows: List[List[str]], target_len: int):
-    for j in range(len(rows)):
-        if len(rows[j]) < target_len:
-            rows[j] = rows[j] + [""] * (target_len - len(rows[j]))
-        elif len(rows[j]) > target_len:
-            rows[j] = rows[j][:target_len]
-
-def _col_letter(n: int) -> str:
-    s = []
-    while n > 0:
-        n, r = divmod(n - 1, 26)
-        s.append(chr(65 + r))
-    return "".join(reversed(s))
-
-def _range_for_row(sheet_name: str, row_1based: int, num_cols: int) -> str:
-    last_col = _col_letter(num_cols)
-    return f"{sheet_name}!A{row_1based}:{last_col}{row_1based}"
-
-def get_cell(row: List[str], idx: Optional[int]) -> str:
-    """อ่าน cell แบบปลอดภัย – ถ้า idx None หรือเลยความยาว ให้คืน "" """
-    if idx is None:
-        return ""
-    return row[idx] if idx < len(row) else ""
-
-# ---------------- Drive + OCR (เหมือน main) ----------------
-ALLOWED_IMAGE_MIMES = {
-    "image/jpeg", "image/png", "image/webp", "image/gif",
-    "image/tiff", "image/bmp"
+# local snapshot ของ Working (core/snapshot.py) — ชื่อคอลัมน์ตาม env ของสคริปต์นี้
+SNAPSHOT_COLUMNS = {
+    "ts": TIMESTAMP_COL_NAME, "emp_id": EMP_ID_COL_NAME, "where_val": WHERE_COL_NAME,
+    "out_status": STATUS_COL, "out_km": DIST_COL, "out_dur_sec": DUR_COL,
+    "in_status": IN_STATUS_COL, "digi_km": DIGI_DIST_COL, "digi_dur_sec": DIGI_DUR_COL,
+    "mach_km": MACH_DIST_COL, "mach_dur_sec": MACH_DUR_COL, "shot_date": PHOTO_DATE_COL,
 }
-ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".tif", ".tiff", ".bmp"}
-
-def looks_like_image_by_meta(filename: str, content_type: Optional[str]) -> bool:
-    fn = (filename or "").lower()
-    if content_type and content_type.startswith("image/"):
-        return True
-    if content_type in ALLOWED_IMAGE_MIMES:
-        return True
-    return any(fn.endswith(ext) for ext in ALLOWED_EXTS)
-
-def bytes_is_valid_image(data: bytes) -> bool:
-    try:
-        with Image.open(io.BytesIO(data)) as im:
-            im.verify()
-        return True
-    except (UnidentifiedImageError, OSError, ValueError):
-        return False
-
-def _file_ids_from_cell(cell: str) -> List[str]:
-    links = re.split(r"[, \n]+", (cell or "").strip())
-    ids: List[str] = []
-    for url in links:
-        if not url:
-            continue
-        m = re.search(r"/d/([A-Za-z0-9_-]+)", url) or re.search(r"[?&]id=([A-Za-z0-9_-]+)", url)
-        if m:
-            ids.append(m.group(1))
-    return ids
-
-def _download_bytes_and_meta(drive, file_id: str) -> tuple[bytes, str, str]:
-    meta = drive.files().get(fileId=file_id, fields="name,mimeType").execute()
-    filename = meta.get("name") or ""
-    mime = meta.get("mimeType") or ""
-    req = drive.files().get_media(fileId=file_id)
-    buf = io.BytesIO()
-    dl = MediaIoBaseDownload(buf, req)
-    done = False
-    while not done:
-        _, done = dl.next_chunk()
-    return buf.getvalue(), filename, mime
-
-def ocr_image_bytes_safe(data: bytes, filename: str, content_type: Optional[str]) -> Tuple[str, str, Optional[str]]:
-    """
-    Return: (status, reason, text)
-      - status: "OK" | "NG"
-      - reason: non-image / corrupt-bad-image / vision-error / vision-exception
-      - text:   OCR text (ถ้าสำเร็จ)
-    """
-    if not looks_like_image_by_meta(filename, content_type):
-        return "NG", "non-image", None
-    if not bytes_is_valid_image(data):
-        return "NG", "corrupt/bad image data", None
-
-    client = vision.ImageAnnotatorClient()
-    image = vision.Image(content=data)
-    try:
-        resp = client.text_detection(image=image)
-        if resp.error.message:
-            return "NG", f"vision-error: {resp.error.message}", None
-        text = (resp.full_text_annotation.text or "").strip() if resp.full_text_annotation else ""
-        return ("OK", "", text) if text else ("OK", "", "")
-    except Exception as e:
-        return "NG", f"vision-exception: {e.__class__.__name__}", None
-
-# ---------------- Smart parsers (เหมือน main) ----------------
-DIST_LABEL  = re.compile(r"^\s*distance\s*$", re.I)
-TIME_LABEL  = re.compile(r"^\s*elapsed\s*time\s*$", re.I)
-PACE_LABEL  = re.compile(r"^\s*(avg(?:\.|erage)?\s*)?pace\s*$", re.I)
-
-KM_RE       = re.compile(r"\b(\d+(?:[.,]\d+)?)\s*(?:k\s*m|km\.?|kilometers?\.?|Kilometers?\.?|กม\.?|กม|กิโลเมตร\.?)\b", re.I)
-TIME_ANY_RE = re.compile(
-    r"\b(?:(\d{1,3}):)?(\d{1,2}):(\d{2})(?:[.,]\d{1,3})?\b(?!\s*(?:AM|PM)\b)"
-    r"|"
-    r"\b(\d{1,2}:\d{2}(?:[.,]\d{1,3})?)\b(?!\s*(?:AM|PM)\b)",
-    re.I
-)
-PACE_RE     = re.compile(
-    r"(\d{1,2})[:'’](\d{2})\s*(?:(?:min|mins|minute|minutes|นาที|น\.)\s*)?/\s*(?:k\s*m|km|kilometers?|kilometres?|กิโลเมตร|กม\.?|กม)\b",
-    re.I
-)
-DECIMAL_RE   = re.compile(r"\b(\d+[.,]\d+)\b")
-TWO_DEC_RE   = re.compile(r"\b(\d+[.,]\d{2})\b")
-
-KEYWORDS = {
-    "distance": ["distance", "dist", "Distance", "ระยะทาง", "ระยะ", "Kilometers", "kilometers", "Kilometres", "kilometres", "กิโลเมตร", "กม.", "Distance (km)", "Distance [km]"],
-    "time":     ["elapsed time", "Elapsed time", "duration", "Duration", "time", "Time", "เวลาที่ใช้", "เวลา", "Workout Time", "Workout time", "Moving Time", "h:m:s", "H:M:S", "เวลาออกกำลังกาย", "Running Time"],
-    "pace":     ["avg pace", "average pace", "Avg. pace", "pace", "Pace", "เพซ"],
-}
-
-def _norm_lines(text: str) -> List[str]:
-    return [
-        ln.strip().replace("’", ":").replace("′", ":")
-        for ln in (text or "").splitlines()
-        if ln and ln.strip()
-    ]
-
-def _label_idxs(lines: List[str], regex: re.Pattern, keys: List[str]) -> List[int]:
-    idxs = []
-    for i, l in enumerate(lines):
-        s = l.lower().strip()
-        if (regex.search(l) or any(k.lower() in s for k in keys)) and not KM_RE.search(s):
-            idxs.append(i)
-    return idxs
-
-def _normalize_to_hhmmss(raw: str) -> Optional[str]:
-    if not raw:
-        return None
-    s = raw.strip().replace(",", ".")
-    m = re.fullmatch(r"(\d{1,2}):(\d{2}):(\d{2})(?:\.\d{1,3})?", s)
-    if m:
-        h, mm, ss = map(int, m.groups())
-        return f"{h:02d}:{mm:02d}:{ss:02d}"
-    m = re.fullmatch(r"(\d{1,2}):(\d{2})(?:\.\d{1,3})?", s)
-    if m:
-        mm, ss = map(int, m.groups())
-        return f"00:{mm:02d}:{ss:02d}"
-    return None
-
-def _find_time(lines: List[str]) -> Optional[str]:
-    # เวอร์ชันเต็ม (รวม ms-first + spoken + mixed + scoring) — เหมือน main
-    HHMMSS_RE = re.compile(r"\b(\d{1,3}):(\d{2}):(\d{2})(?:\.\d{1,3})?\b")
-    MMSS_RE   = re.compile(r"\b(\d{1,2}):(\d{2})(?:\.\d{1,3})?\b(?!\s*(?:AM|PM)\b)", re.I)
-    MIXED_HHMMSS_RE = re.compile(
-        r"(?<![0-9A-Za-z])(?P<h>\d{1,2})\s*(?P<sep1>[:.])\s*(?P<m>\d{2})\s*(?P<sep2>[:.])\s*(?P<s>\d{2})(?!\.\d)"
-    )
-    FRACT_HHMMSS_RE = re.compile(r"\b(\d{1,2}):(\d{2}):(\d{2})[.,](\d{1,3})\b")
-    FRACT_MMSS_RE   = re.compile(r"\b(\d{1,2}):(\d{2})[.,](\d{1,3})\b(?!\s*(?:AM|PM)\b)", re.I)
-
-    DATE_SLASH_RE = re.compile(r"(?<!\d)\d{1,2}/\d{1,2}/\d{2,4}(?!\d)")
-    DATE_ISO_RE   = re.compile(r"(?<!\d)20\d{2}-\d{2}-\d{2}(?!\d)")
-
-    H_UNITS = r"(?:h|hr|hrs|hour|hours|ชั่วโมง|ชม\.?|ช\.ม\.?)"
-    M_UNITS = r"(?:m|min|mins|minute|minutes|นาที|น\.?)"
-    S_UNITS = r"(?:s|sec|secs|second|seconds|วินาที|วิ\.?|วิ)"
-    HM_SPOKEN_RE = re.compile(
-        rf"(?<!\d)(\d{{1,3}})\s*{H_UNITS}\s*(\d{{1,2}})\s*{M_UNITS}(?:\s*(\d{{1,2}})\s*{S_UNITS})?(?!\w)",
-        re.I
-    )
-    MS_SPOKEN_RE = re.compile(
-        rf"(?<!\d)(\d{{1,2}})\s*{M_UNITS}\s*(\d{{1,2}})\s*{S_UNITS}(?!\w)",
-        re.I
-    )
-
-    PACE_QUOTES   = ("'", "’", "′", "“", "”", '"')
-    NOISY_TOKENS  = ("pace", "bpm", "kcal", "steps", "avg hr", "average hr", "avg heart rate")
-    label_idxs = _label_idxs(lines, TIME_LABEL, KEYWORDS["time"])
-
-    def _is_datey_line(s: str) -> bool:
-        low = (s or "").lower()
-        return bool(DATE_SLASH_RE.search(s) or DATE_ISO_RE.search(s) or " be" in low or "พ.ศ" in low)
-
-    def _is_noisy_line(s: str) -> bool:
-        low = (s or "").lower()
-        return any(t in low for t in NOISY_TOKENS)
-
-    def _is_pace_like_around(s: str, start: int, end: int) -> bool:
-        if s[max(0, start-1):start] in PACE_QUOTES or s[end:end+1] in PACE_QUOTES:
-            return True
-        if s[max(0, start-4):start].lower() == "pace":
-            return True
-        if s[end:end+4].lower() == "pace":
-            return True
-        return False
-
-    # Phase 0: เวลาที่มี .ms ก่อน
-    fract_cands: List[Tuple[str, int, int]] = []
-    for j, s in enumerate(lines):
-        if _is_datey_line(s):
-            continue
-        for m in FRACT_HHMMSS_RE.finditer(s):
-            if _is_pace_like_around(s, m.start(), m.end()):
-                continue
-            h, mm, ss = map(int, m.groups()[:3])
-            if 0 <= h <= 1000 and 0 <= mm <= 59 and 0 <= ss <= 59:
-                fract_cands.append((f"{h:02d}:{mm:02d}:{ss:02d}", 4, j))
-        for m in FRACT_MMSS_RE.finditer(s):
-            if _is_pace_like_around(s, m.start(), m.end()):
-                continue
-            mm, ss = map(int, m.groups()[:2])
-            if 0 <= mm <= 59 and 0 <= ss <= 59:
-                fract_cands.append((f"00:{mm:02d}:{ss:02d}", 4, j))
-    if fract_cands:
-        def score_ms(hms: str, _kind: int, j: int) -> float:
-            sc = 200.0
-            if label_idxs:
-                if any(abs(j - i) <= 2 for i in label_idxs):
-                    sc += 120.0
-                else:
-                    dist = min(abs(j - i) for i in label_idxs)
-                    sc += max(0.0, 60.0 - dist * 12.0)
-            if j <= 2: sc -= 50.0
-            if _is_noisy_line(lines[j]): sc -= 25.0
-            return sc
-        best = max(fract_cands, key=lambda t: score_ms(*t))
-        return best[0]
-
-    # Phase 1: candidate ปกติ
-    cands: List[Tuple[str, int, int]] = []
-    for j, s in enumerate(lines):
-        if _is_datey_line(s):
-            continue
-        for m in HM_SPOKEN_RE.finditer(s):
-            h = int(m.group(1)); mm = int(m.group(2)); ss = int(m.group(3)) if m.group(3) else 0
-            if 0 <= h <= 1000 and 0 <= mm <= 59 and 0 <= ss <= 59:
-                cands.append((f"{h:02d}:{mm:02d}:{ss:02d}", 3, j))
-        for m in MS_SPOKEN_RE.finditer(s):
-            if _is_pace_like_around(s, m.start(), m.end()):
-                continue
-            mm = int(m.group(1)); ss = int(m.group(2))
-            if 0 <= mm <= 59 and 0 <= ss <= 59:
-                cands.append((f"00:{mm:02d}:{ss:02d}", 3, j))
-        for m in HHMMSS_RE.finditer(s):
-            if _is_pace_like_around(s, m.start(), m.end()):
-                continue
-            h, mm, ss = map(int, m.groups()[:3])
-            if 0 <= h <= 1000 and 0 <= mm <= 59 and 0 <= ss <= 59:
-                cands.append((f"{h:02d}:{mm:02d}:{ss:02d}", 3, j))
-        for m in MIXED_HHMMSS_RE.finditer(s):
-            token = s[m.start():m.end()]
-            if ":." in token:
-                continue
-            if _is_pace_like_around(s, m.start(), m.end()):
-                continue
-            h = int(m.group("h")); mm = int(m.group("m")); ss = int(m.group("s"))
-            if 0 <= h <= 1000 and 0 <= mm <= 59 and 0 <= ss <= 59:
-                cands.append((f"{h:02d}:{mm:02d}:{ss:02d}", 3, j))
-    if not cands:
-        for j, s in enumerate(lines):
-            if _is_datey_line(s):
-                continue
-            for m in MMSS_RE.finditer(s):
-                if _is_pace_like_around(s, m.start(), m.end()):
-                    continue
-                mm, ss = map(int, m.groups()[:2])
-                if 0 <= mm <= 59 and 0 <= ss <= 59:
-                    cands.append((f"00:{mm:02d}:{ss:02d}", 2, j))
-    if not cands:
-        return None
-
-    def score(hms: str, kind: int, j: int) -> float:
-        sc = 120.0 if kind == 3 else 60.0
-        if label_idxs:
-            if any(abs(j - i) <= 2 for i in label_idxs):
-                sc += 120.0
-            else:
-                dist = min(abs(j - i) for i in label_idxs)
-                sc += max(0.0, 60.0 - dist * 12.0)
-        if j <= 2: sc -= 50.0
-        if _is_noisy_line(lines[j]): sc -= 25.0
-        return sc
-
-    best = max(cands, key=lambda t: score(*t))
-    return best[0]
-
-def _find_pace_sec(lines: List[str]) -> Optional[int]:
-    idxs = _label_idxs(lines, PACE_LABEL, KEYWORDS["pace"])
-    for i in idxs:
-        for j in range(1, 5):
-            if i + j < len(lines):
-                m = PACE_RE.search(lines[i + j])
-                if m:
-                    return int(m.group(1)) * 60 + int(m.group(2))
-    m = PACE_RE.search(" ".join(lines))
-    if m:
-        return int(m.group(1)) * 60 + int(m.group(2))
-    return None
-
-def _sec_from_timestr(t: Optional[str]) -> Optional[int]:
-    if not t:
-        return None
-    h, mm, ss = map(int, t.split(":"))
-    return h * 3600 + mm * 60 + ss
-
-def _km_ok(v: float) -> bool:
-    return 0.1 <= v <= 80.0
-
-def parse_duration_and_km_smart(text: str) -> Tuple[Optional[str], Optional[float]]:
-    lines = _norm_lines(text)
-
-    time_hms = _find_time(lines)
-    pace_sec = _find_pace_sec(lines)
-    time_sec = _sec_from_timestr(time_hms) if time_hms else None
-
-    if not time_hms:
-        MIXED_HHMMSS_RE = re.compile(
-            r"(?<![0-9A-Za-z])(?P<h>\d{1,2})\s*(?P<sep1>[:.])\s*(?P<m>\d{2})\s*(?P<sep2>[:.])\s*(?P<s>\d{2})(?!\.\d)"
-        )
-        for ln in lines:
-            for m in MIXED_HHMMSS_RE.finditer(ln):
-                sep1, sep2 = m.group("sep1"), m.group("sep2")
-                if sep1 == ":" and sep2 == ".":
-                    continue
-                h = int(m.group("h")); mm_ = int(m.group("m")); ss_ = int(m.group("s"))
-                if 0 <= h <= 1000 and 0 <= mm_ <= 59 and 0 <= ss_ <= 59:
-                    time_hms = f"{h:02d}:{mm_:02d}:{ss_:02d}"
-                    time_sec = _sec_from_timestr(time_hms)
-                    break
-            if time_hms:
-                break
-
-    if not time_hms:
-        PACKED_TIME56_RE = re.compile(r"(?<![0-9A-Za-z.,:])(\d{5,6})(?![0-9A-Za-z.,:])")
-        for ln in lines:
-            for m in PACKED_TIME56_RE.finditer(ln):
-                s = m.group(1)
-                if len(s) == 6:
-                    hh, mm_, ss_ = int(s[:2]), int(s[2:4]), int(s[4:6])
-                else:
-                    hh, mm_, ss_ = int(s[0]), int(s[1:3]), int(s[3:5])
-                if 0 <= hh <= 1000 and 0 <= mm_ <= 59 and 0 <= ss_ <= 59:
-                    time_hms = f"{hh:02d}:{mm_:02d}:{ss_:02d}"
-                    time_sec = _sec_from_timestr(time_hms)
-                    break
-            if time_hms:
-                break
-
-    if not time_hms:
-        PACKED_TIME78_RE = re.compile(r"(?<![0-9A-Za-z.,:])(\d{7,8})(?![0-9A-Za-z.,:])")
-        for ln in lines:
-            for m in PACKED_TIME78_RE.finditer(ln):
-                s = m.group(1)
-                if len(s) == 8:
-                    hh, mm_, ss_ = int(s[:2]), int(s[2:4]), int(s[4:6])
-                else:
-                    hh, mm_, ss_ = int(s[0]), int(s[1:3]), int(s[3:5])
-                if 0 <= hh <= 1000 and 0 <= mm_ <= 59 and 0 <= ss_ <= 59:
-                    time_hms = f"{hh:02d}:{mm_:02d}:{ss_:02d}"
-                    time_sec = _sec_from_timestr(time_hms)
-                    break
-            if time_hms:
-                break
-
-    # กัน speed เช่น km/h, กม/ชม, km/hr
-    SPEED_AFTER_RE = r"(?:/\s*(?:h|hr|hour|ชม\.?|ชั่วโมง)\b)"
-    unit_token_re = re.compile(
-        rf"\b(?:k\s*m|km\.?|kilometers?|kilometres?|กิโลเมตร|กม\.?|กม)\b(?!\s*{SPEED_AFTER_RE})",
-        re.I
-    )
-    dist_label_idxs = _label_idxs(lines, DIST_LABEL, KEYWORDS["distance"])
-    anchor_lines = set(dist_label_idxs)
-    for i, ln in enumerate(lines):
-        if unit_token_re.search(ln):
-            anchor_lines.add(i)
-
-    candidates: List[Tuple[float, int]] = []
-
-    KM_RE_NO_SPEED = re.compile(
-        rf"\b(\d+(?:[.,]\d+)?)\s*(?:k\s*m|km\.?|kilometers?\.?|kilometres?\.?|กิโลเมตร|กม\.?|กม)\b(?!\s*{SPEED_AFTER_RE})",
-        re.I
-    )
-    for i, ln in enumerate(lines):
-        for m in KM_RE_NO_SPEED.finditer(ln):
-            try:
-                val = float(m.group(1).replace(",", "."))
-                candidates.append((val, i))
-            except Exception:
-                pass
-
-    SPEED_UNIT_AFTER = re.compile(
-        rf"^\s*(?:k\s*m|km\.?|kilometers?|kilometres?|กิโลเมตร|กม\.?|กม)\b\s*{SPEED_AFTER_RE}",
-        re.I
-    )
-    def _is_speed_value_after(line: str, end_idx: int) -> bool:
-        return bool(SPEED_UNIT_AFTER.search(line[end_idx:]))
-
-    for i in sorted(anchor_lines):
-        for j in (i - 1, i, i + 1):
-            if 0 <= j < len(lines):
-                ln = lines[j]
-                for m in DECIMAL_RE.finditer(ln):
-                    try:
-                        if _is_speed_value_after(ln, m.end()):
-                            continue
-                        v = float(m.group(1).replace(",", "."))
-                        if 0.1 <= v <= 100.0:
-                            candidates.append((v, j))
-                    except Exception:
-                        pass
-
-    SPACED_TWO_DEC_RE = re.compile(r"\b(\d+)\s*[.,]\s*(\d{2})\b")
-    two_decimals_all: List[Tuple[float, int, str, Optional[Tuple[int,int]]]] = []
-
-    for i, ln in enumerate(lines):
-        seen_normals = set()
-        for m in TWO_DEC_RE.finditer(ln):
-            tok = m.group(0).replace(",", ".")
-            if tok in seen_normals:
-                continue
-            if _is_speed_value_after(ln, m.end()):
-                continue
-            try:
-                v = float(tok)
-            except Exception:
-                continue
-            if 0.1 <= v <= 90.0:
-                seen_normals.add(tok)
-                mm_ss: Optional[Tuple[int,int]] = None
-                if "." in tok:
-                    mm_str, ss_str = tok.split(".", 1)
-                    if mm_str.isdigit() and ss_str.isdigit():
-                        mm, ss = int(mm_str), int(ss_str)
-                        if 0 <= mm <= 59 and 0 <= ss <= 59:
-                            mm_ss = (mm, ss)
-                two_decimals_all.append((v, i, tok, mm_ss))
-        for m in SPACED_TWO_DEC_RE.finditer(ln):
-            if _is_speed_value_after(ln, m.end()):
-                continue
-            mm_str, ss_str = m.group(1), m.group(2)
-            tok = f"{mm_str}.{ss_str}"
-            if tok in seen_normals:
-                continue
-            try:
-                v = float(tok)
-            except Exception:
-                continue
-            if 0.1 <= v <= 90.0:
-                seen_normals.add(tok)
-                mm, ss = int(mm_str), int(ss_str)
-                mm_ss: Optional[Tuple[int,int]] = None
-                if 0 <= mm <= 59 and 0 <= ss <= 59:
-                    mm_ss = (mm, ss)
-                two_decimals_all.append((v, i, tok, mm_ss))
-
-    # injection: มี pace + time → เลือก km ที่ใกล้ time/pace
-    if pace_sec and time_sec and pace_sec > 0 and two_decimals_all:
-        expect = time_sec / pace_sec
-        best = None
-        best_err = float("inf")
-        for v, i, _tok, mmss in two_decimals_all:
-            if mmss is not None:
-                continue
-            if not (0.2 <= v <= 80.0):
-                continue
-            err = abs(v - expect)
-            if err < best_err:
-                best_err = err
-                best = (v, i)
-        if best is not None:
-            candidates.append(best)
-
-    if not candidates:
-        if len(two_decimals_all) >= 2:
-            two_decimals_all_sorted = sorted(two_decimals_all, key=lambda x: x[0])
-            v_small, i_small, _tok_small, _mmss_small = two_decimals_all_sorted[0]
-            v_big,   i_big,   tok_big,   mmss_big    = two_decimals_all_sorted[-1]
-            candidates.append((v_small, i_small))
-            if not time_hms and mmss_big is not None:
-                mm, ss = mmss_big
-                time_hms = f"00:{mm:02d}:{ss:02d}"
-                time_sec = _sec_from_timestr(time_hms)
-        elif len(two_decimals_all) == 1:
-            v1, i1, _tok1, _mmss1 = two_decimals_all[0]
-            candidates.append((v1, i1))
-
-    if not candidates:
-        NUM34_RE = re.compile(r"(?<![0-9A-Za-z.,:])(\d{3,4})(?![0-9A-Za-z.,:])")
-        for i, ln in enumerate(lines):
-            nums = [m.group(1) for m in NUM34_RE.finditer(ln)]
-            if len(nums) == 3:
-                mid = nums[1]
-                if mid.isdigit() and (3 <= len(mid) <= 4):
-                    v = int(mid) / 100.0
-                    if _km_ok(v):
-                        candidates.append((v, i))
-                        break
-
-    PACKED_TIME3OR4_RE = re.compile(r"(?<![0-9A-Za-z.,:])(?P<n>\d{3,4})(?![0-9A-Za-z.,:])")
-    PACKED_INT_3_RE    = re.compile(r"\b\d{3}\b")
-    PACKED_INT_4_RE    = re.compile(r"\b\d{4}\b")
-
-    def _time_from_3or4_digits(n: int) -> Optional[str]:
-        if 100 <= n <= 999:
-            m, ss = divmod(n, 100)
-            if 0 <= m <= 59 and 0 <= ss <= 59:
-                return f"00:{m:02d}:{ss:02d}"
-        elif 1000 <= n <= 9999:
-            mm, ss = divmod(n, 100)
-            if 0 <= mm <= 59 and 0 <= ss <= 59:
-                return f"00:{mm:02d}:{ss:02d}"
-        return None
-
-    maybe_time_hms = None
-    n_lines = len(lines)
-    have_regular_km = bool(candidates)
-
-    if not time_hms and have_regular_km:
-        best_sec = -1
-        for i, ln in enumerate(lines):
-            for m in PACKED_TIME3OR4_RE.finditer(ln):
-                n_ = int(m.group("n"))
-                hhmm = _time_from_3or4_digits(n_)
-                if hhmm:
-                    s = _sec_from_timestr(hhmm)
-                    if s is not None and s > best_sec:
-                        best_sec = s
-                        maybe_time_hms = hhmm
-
-    packed_km: List[Tuple[float, int]] = []
-    have_regular_time = bool(time_hms or maybe_time_hms)
-    if have_regular_time and not candidates:
-        for i in sorted(anchor_lines):
-            for j in (i - 1, i, i + 1):
-                if 0 <= j < n_lines:
-                    ln = lines[j]
-                    if DECIMAL_RE.search(ln):
-                        continue
-                    for m in PACKED_INT_3_RE.finditer(ln):
-                        v = int(m.group(0)) / 100.0
-                        if _km_ok(v):
-                            packed_km.append((v, j))
-                    for m in PACKED_INT_4_RE.finditer(ln):
-                        v = int(m.group(0)) / 100.0
-                        if _km_ok(v):
-                            packed_km.append((v, j))
-
-    if (time_hms is None) and (maybe_time_hms is not None):
-        time_hms = maybe_time_hms
-        time_sec = _sec_from_timestr(time_hms)
-    elif (time_hms is not None) and (not candidates) and packed_km:
-        candidates.extend(packed_km)
-
-    if (time_hms is None) and (not candidates):
-        PACKED_34_CLEAN = re.compile(r"(?<![0-9A-Za-z.,:])(?P<n>\d{3,4})(?![%0-9A-Za-z.,:])")
-        tokens = []
-        for j, ln in enumerate(lines):
-            for m in PACKED_34_CLEAN.finditer(ln):
-                tokens.append((int(m.group('n')), j, m.start(), m.end()))
-        uniq_vals = sorted(set(n for n,_,_,_ in tokens))
-        if len(uniq_vals) == 2:
-            small, big = uniq_vals[0], uniq_vals[1]
-            t_big = _time_from_3or4_digits(big)
-            if t_big:
-                time_hms = t_big
-                time_sec = _sec_from_timestr(time_hms)
-            km_small = small / 100.0
-            if _km_ok(km_small):
-                candidates.append((km_small, -1))
-        else:
-            time_label_idxs = _label_idxs(lines, TIME_LABEL, KEYWORDS["time"])
-            def _near_any(j: int, idxs, win: int) -> bool:
-                return bool(idxs) and any(abs(j - i) <= win for i in idxs)
-            time_bag = []
-            dist_bag = []
-            for n, j, s, e in tokens:
-                t = _time_from_3or4_digits(n)
-                if t and _near_any(j, time_label_idxs, 2):
-                    d = min(abs(j - i) for i in time_label_idxs) if time_label_idxs else 99
-                    time_bag.append((200 - d*60, t, j, (s, e)))
-                if _near_any(j, list(anchor_lines), 1):
-                    km = n / 100.0
-                    if _km_ok(km) and not DECIMAL_RE.search(lines[j]):
-                        d = min(abs(j - i) for i in anchor_lines) if anchor_lines else 99
-                        dist_bag.append((200 - d*80, km, j, (s, e)))
-            used = set()
-            if time_bag:
-                time_bag.sort(reverse=True)
-                _sc, best_hms, tj, tsp = time_bag[0]
-                time_hms = best_hms
-                time_sec = _sec_from_timestr(time_hms)
-                used.add((tj, tsp[0], tsp[1]))
-            if dist_bag:
-                dist_bag.sort(reverse=True)
-                for _sc, km, dj, dsp in dist_bag:
-                    key = (dj, dsp[0], dsp[1])
-                    if key not in used:
-                        candidates.append((km, dj))
-                        break
-
-    if not candidates:
-        if time_hms:
-            return time_hms, None
-        return None, None
-
-    def score_of(val: float, idx: int) -> float:
-        if pace_sec and time_sec and pace_sec > 0:
-            expect = time_sec / pace_sec
-            if expect > 0:
-                rel_err = abs(val - expect) / expect
-                sc = 1000.0 * (1.0 - min(rel_err, 1.0))
-                if dist_label_idxs:
-                    dist = min(abs(idx - li) for li in dist_label_idxs)
-                    sc += max(0.0, 20.0 - dist * 5.0)
-                if 2.0 <= val <= 50.0:
-                    sc += 2.0
-                return sc
-        sc = 0.0
-        if dist_label_idxs:
-            dist = min(abs(idx - li) for li in dist_label_idxs)
-            sc += max(0.0, 100.0 - dist * 25.0)
-        if 2.0 <= val <= 50.0:
-            sc += 5.0
-        return sc
-
-    seen = set()
-    uniq: List[Tuple[float, int]] = []
-    for val, idx in candidates:
-        key = (round(val, 3), idx)
-        if key not in seen:
-            seen.add(key)
-            uniq.append((val, idx))
-    candidates = uniq
-
-    best_val, best_score = None, -1e9
-    for val, idx in candidates:
-        sc = score_of(val, idx)
-        if sc > best_score:
-            best_score, best_val = sc, val
-    return time_hms, best_val
-
-# ===== Smart Date Parser (returns M/D/YYYY) =====
-from datetime import datetime, date, timedelta
-
-_MONTHS = {
-    # EN
-    "january":1,"jan":1,"february":2,"feb":2,"march":3,"mar":3,"april":4,"apr":4,
-    "may":5,"june":6,"jun":6,"july":7,"jul":7,"august":8,"aug":8,"september":9,"sep":9,"sept":9,
-    "october":10,"oct":10,"november":11,"nov":11,"december":12,"dec":12,
-    # TH (เต็ม/ย่อ)
-    "มกราคม":1,"ม.ค.":1,"กุมภาพันธ์":2,"ก.พ.":2,"มีนาคม":3,"มี.ค.":3,"เมษายน":4,"เม.ย.":4,
-    "พฤษภาคม":5,"พ.ค.":5,"มิถุนายน":6,"มิ.ย.":6,"กรกฎาคม":7,"ก.ค.":7,"สิงหาคม":8,"ส.ค.":8,
-    "กันยายน":9,"ก.ย.":9,"ตุลาคม":10,"ต.ค.":10,"พฤศจิกายน":11,"พ.ย.":11,"ธันวาคม":12,"ธ.ค.":12,
+# Working columns by field name (core/rows.py resolves them once per header)
+WORK_FIELDS = {
+    "ts": TIMESTAMP_COL_NAME, "emp_id": EMP_ID_COL_NAME, "where": WHERE_COL_NAME,
+    "img": IMAGE_COL_NAME, "selfie": SELFIE_COL_NAME, "digi": INDOOR_DIGI_COL, "mach": INDOOR_MACH_COL,
+    "status": STATUS_COL, "dist": DIST_COL, "dur": DUR_COL,
+    "in_status": IN_STATUS_COL, "digi_dist": DIGI_DIST_COL, "digi_dur": DIGI_DUR_COL,
+    "mach_dist": MACH_DIST_COL, "mach_dur": MACH_DUR_COL, "photo_date": PHOTO_DATE_COL,
 }
-_ORD = ("st","nd","rd","th")
-
-_WEEKDAYS_TH = {"อา","จ","อ","พ","พฤ","ศ","ส","อาทิตย์","จันทร์","อังคาร","พุธ","พฤหัส","ศุกร์","เสาร์"}
-_WEEKDAYS_EN = {"mon","monday","tue","tues","tuesday","wed","wednesday","thu","thur","thurs","thursday",
-                "fri","friday","sat","saturday","sun","sunday"}
-
-_TIME_RE = re.compile(r"^\d{1,2}:\d{2}(?::\d{2})?$", re.I)
-
-def _strip_ordinal(s: str) -> str:
-    t = s.lower().strip().rstrip(",.")
-    for suf in _ORD:
-        if t.endswith(suf) and t[:-len(suf)].isdigit():
-            return t[:-len(suf)]
-    return t
-
-def _as_int(x) -> int|None:
-    try: return int(str(x))
-    except: return None
-
-def _year_fix(y: int) -> int:
-    # รองรับ 2 หลัก & พ.ศ.
-    if y < 100:         # 25 -> 2025, 99 -> 2099
-        return 2000 + y
-    if y > 2400:        # พ.ศ. -> ค.ศ.
-        return y - 543
-    return y
 
-def _format_mdy_no_pad(d: date) -> str:
-    return f"{d.month}/{d.day}/{d.year}"
-
-def _now_th_date() -> date:
-    return (datetime.utcnow() + timedelta(hours=7)).date()
-
-def _fmt(y, m, d):
-    try:
-        return f"{m}/{d}/{y}" if date(y, m, d) else None
-    except Exception:
-        return None
-
-def _normalize(s: str) -> str:
-    # แปลง "_" เป็นช่องว่าง, ลบตัวล่องหน, ลดสัญลักษณ์กวน, lower ทั้งก้อน
-    return (s.replace("_", " ")
-             .replace("\u200b", "")
-             .replace("\u200f", "")
-             .replace("·", " ").replace("•", " ").replace("@", " ")
-             .replace(" ", " ").replace(" ", " ").lower())
+# ---------------- Google clients (core/sheets_io.py) ----------------
+def _build_services():
+    creds = sheets_io.credentials(SHEETS_SCOPE, DRIVE_RO_SCOPE)
+    return sheets_io.build_client("sheets", "v4", creds), sheets_io.build_client("drive", "v3", creds)
 
-def _tokenize(blob: str):
-    # ใส่ @/bullet เป็น token ด้วย
-    return re.findall(r"[A-Za-zก-๙\.]+|\d{1,4}|[@,•·/:\-]|BE|พ\.ศ\.", blob, re.I)
+def _build_sheets_client():
+    """Sheets client แยกต่อ thread (ใช้กับ batch writer แบบขนาน)"""
+    return sheets_io.sheets_client()
 
-def _is_weekday(t: str) -> bool:
-    tt = t.lower().strip().rstrip(".")
-    return (tt in _WEEKDAYS_TH) or (tt in _WEEKDAYS_EN)
+def _build_drive_client():
+    """Drive client แยกต่อ thread (ใช้กับ OCR แบบขนานใน backfill)"""
+    return sheets_io.drive_client()
 
-def _resolve_day_month(a: int, b: int, prefer_dayfirst: bool) -> tuple[int,int] | None:
-    if not (1 <= a <= 31 and 1 <= b <= 31):
-        return None
-    if a > 12 and b <= 12:  # 21/9 -> D/M
-        return (a, b)
-    if a <= 12 and b > 12:  # 9/21 -> M/D
-        return (b, a)
-    return (a, b) if prefer_dayfirst else (b, a)
+# ---------------- Sheets helpers (ผูก SPREADSHEET_ID) ----------------
+def _get_values(sheets, a1: str):
+    return sheets_io.get_values(sheets, SPREADSHEET_ID, a1)
 
-def _pick_year_after_month_tokens(tok: list[str], i_month: int, after_day_idx: int|None) -> tuple[Optional[int], bool]:
-    """
-    หาเฉพาะ 'ปี 4 หลัก' หรือ 'พ.ศ./BE + ปี 4 หลัก'
-    ข้าม , . @ · • / ชื่อวัน เวลา และ AM/PM
-    return (year_fixed, explicit_year?)
-    """
-    n = len(tok)
-    j = (after_day_idx + 1) if after_day_idx is not None else (i_month + 1)
-    steps = 0
-    while j < n and steps < 5:
-        t = tok[j]
-        tl = t.lower().strip().rstrip(".")
-        if t in {",", ".", "@", "•", "·", "/"} or (tl in _WEEKDAYS_EN) or (t in _WEEKDAYS_TH):
-            j += 1; steps += 1; continue
-        if _TIME_RE.match(t) or tl in {"am", "pm"}:
-            j += 1; steps += 1; continue
-        if re.fullmatch(r"\d{4}", t):
-            return _year_fix(int(t)), True
-        if tl in {"พ.ศ.", "be"} and j + 1 < n and re.fullmatch(r"\d{4}", tok[j+1]):
-            return _year_fix(int(tok[j+1])), True
-        break
-    return None, False
-
-TODAY_LIKE_RE = re.compile(
-    r"\b(?:t\W*o\W*d\W*a\W*y|morning|afternoon|evening|tonight|night)\b",
-    re.I
-)
-
-def _parse_smart_date_from_text(text: str, default_year: int|None=None) -> str|None:
-    """
-    คืนค่า 'M/D/YYYY' หรือ None
-    ครอบคลุม:
-      • today/วันนี้ (ทน \W*) + morning/afternoon/evening/tonight/night
-      • BE/พ.ศ. ยอมรับ 'B E' (มีช่องว่าง) และ '_' คั่น
-      • สองส่วน M/D หรือ D/M → เติมปีอัตโนมัติ
-      • เดือน EN/TH (เต็ม/ย่อ), ปีต้อง 4 หลัก
-      • ISO YYYY-MM-DD
-      • มี scoring ให้ตัวที่ครบ/น่าเชื่อถือชนะ
-    """
-    if not text or not text.strip():
-        return None
+def _update_values(sheets, a1: str, values):
+    return sheets_io.update_values(sheets, SPREADSHEET_ID, a1, values)
 
-    prefer_dayfirst = True  # บริบทไทย
-
-    # ---- 0) Normalize + Today ----
-    norm = _normalize(text)
-    if TODAY_LIKE_RE.search(norm) or ("วันนี้" in norm) or ("วันนี" in norm):
-        return _format_mdy_no_pad(_now_th_date())
-
-    lines = [ln.strip() for ln in norm.splitlines() if ln.strip()]
-    blob  = " ".join(lines)
-
-    EN_FULL = {"january","february","march","april","may","june","july","august","september","october","november","december"}
-    TH_FULL = {"มกราคม","กุมภาพันธ์","มีนาคม","เมษายน","พฤษภาคม","มิถุนายน","กรกฎาคม","สิงหาคม","กันยายน","ตุลาคม","พฤศจิกายน","ธันวาคม"}
-    cands = []
-
-    def _add(y, m, d, flags):
-        out = _fmt(y, m, d)
-        if not out:
-            return
-        for it in cands:
-            if it["y"]==y and it["m"]==m and it["d"]==d:
-                it["flags"].update(flags)
-                return
-        cands.append({"y":y, "m":m, "d":d, "flags":set(flags)})
-
-    # 1) YYYY sep MM sep DD
-    m = re.search(r"(?<!\d)(20\d{2})\s*([\/\-.])\s*(\d{1,2})\s*\2\s*(\d{1,2})(?:\b|[^0-9])", blob)
-    if m:
-        y, mo, dd = int(m.group(1)), int(m.group(3)), int(m.group(4))
-        _add(y, mo, dd, {"has_year","year_four","month_numeric","numeric_sep","pattern_y_m_d"})
-
-    # 2) D/M/Y or M/D/Y (+ BE/พ.ศ.)
-    m = re.search(r"(?<!\d)(\d{1,2})\s*([\/\-.])\s*(\d{1,2})\s*\2\s*(\d{2,4})\s*(?:b\s*e|พ\.ศ\.)?\b", blob, re.I)
-    if m:
-        a, b, yraw = int(m.group(1)), int(m.group(3)), int(m.group(4))
-        y = _year_fix(yraw)
-        dm = _resolve_day_month(a, b, prefer_dayfirst)
-        if dm:
-            dd, mo = dm
-            flags = {"has_year","month_numeric","numeric_sep","pattern_dmy_or_mdy"}
-            flags.add("year_two" if yraw<100 else "year_four")
-            _add(y, mo, dd, flags)
-
-    # 2.5) two-part M/D หรือ D/M (ไม่มีปี)
-    m = re.search(r"(?<!\d)(\d{1,2})\s*/\s*(\d{1,2})(?!\s*[\/\-.]\s*\d)", blob)
-    if m:
-        a, b = int(m.group(1)), int(m.group(2))
-        dm = _resolve_day_month(a, b, prefer_dayfirst)
-        if dm:
-            dd, mo = dm
-            yy = default_year or _now_th_date().year
-            _add(yy, mo, dd, {"two_part","inferred_year","month_numeric","numeric_sep"})
-
-    # 3) Month name (EN/TH)
-    tok = _tokenize(blob)
-    n = len(tok)
-    for i in range(n):
-        w = tok[i]; wl = w.lower().strip(); wl2 = wl.rstrip(".")
-        if wl not in _MONTHS and wl2 not in _MONTHS:
-            continue
-        mm = _MONTHS[wl] if wl in _MONTHS else _MONTHS[wl2]
-        month_full = (wl in EN_FULL or wl in TH_FULL or wl2 in TH_FULL)
-
-        # A) Day Month [Year]
-        dd = None
-        if i-1 >= 0:
-            t1 = tok[i-1]
-            t1s = _strip_ordinal(t1)
-            if _as_int(t1s) is not None:
-                dd = _as_int(t1s)
-            elif t1 in {",","."} and i-2 >= 0 and _as_int(_strip_ordinal(tok[i-2])) is not None:
-                dd = _as_int(_strip_ordinal(tok[i-2]))
-            elif (t1.lower().strip().rstrip(".") in _WEEKDAYS_EN or t1 in _WEEKDAYS_TH) and i-2 >= 0 and _as_int(_strip_ordinal(tok[i-2])) is not None:
-                dd = _as_int(_strip_ordinal(tok[i-2]))
-        if dd is not None and 1 <= dd <= 31:
-            y_found, explicit = _pick_year_after_month_tokens(tok, i, None)
-            if not y_found:
-                y_found = default_year or _now_th_date().year
-            flags = {"from_monthname"}
-            flags.add("month_name_full" if month_full else "month_name_abbr")
-            if explicit: flags.add("has_year")
-            else:        flags.add("inferred_year")
-            _add(y_found, mm, dd, flags)
-
-        # B) Month Day [Year]
-        day_idx = None; dd2 = None
-        if i+1 < n:
-            tday = _strip_ordinal(tok[i+1])
-            if _as_int(tday) is not None:
-                dd2 = _as_int(tday); day_idx = i+1
-            elif tok[i+1] in {",","."} and i+2 < n:
-                tday2 = _strip_ordinal(tok[i+2])
-                if _as_int(tday2) is not None:
-                    dd2 = _as_int(tday2); day_idx = i+2
-        if dd2 is not None and 1 <= dd2 <= 31:
-            y_found, explicit = _pick_year_after_month_tokens(tok, i, day_idx)
-            if not y_found:
-                y_found = default_year or _now_th_date().year
-            flags = {"from_monthname"}
-            flags.add("month_name_full" if month_full else "month_name_abbr")
-            if explicit: flags.add("has_year")
-            else:        flags.add("inferred_year")
-            _add(y_found, mm, dd2, flags)
-
-    # 4) ISO
-    m = re.search(r"(?<!\d)(20\d{2})-(\d{2})-(\d{2})(?:[ T]\d{2}:\d{2}(?::\d{2})?)?", blob)
-    if m:
-        y, mo, dd = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        _add(y, mo, dd, {"has_year","year_four","iso","month_numeric"})
-
-    if not cands:
-        return None
+def _append_values(sheets, a1: str, values):
+    return sheets_io.append_values(sheets, SPREADSHEET_ID, a1, values)
 
-    # Scoring
-    def _score(it):
-        flags = it["flags"]
-        sc = 0.0
-        if "has_year" in flags:       sc += 100
-        if "year_four" in flags:      sc += 25
-        if "year_two" in flags:       sc -= 10
-        if "inferred_year" in flags:  sc -= 35
-
-        if "month_name_full" in flags: sc += 70
-        if "month_name_abbr" in flags: sc += 50
-        if "from_monthname" in flags:  sc += 10
-        if "month_numeric" in flags:   sc += 20
-
-        if "iso" in flags:             sc += 80
-        if "numeric_sep" in flags:     sc += 10
-        if "two_part" in flags:        sc += 15
-
-        if "pattern_y_m_d" in flags:        sc += 15
-        if "pattern_dmy_or_mdy" in flags:   sc += 10
-        return sc
-
-    best = max(cands, key=_score)
-    return f"{best['m']}/{best['d']}/{best['y']}"
-
-def parse_duration_km_date_smart(text: str, default_year: int|None=None):
-    dur, dist = parse_duration_and_km_smart(text)
-    date_str = _parse_smart_date_from_text(text, default_year=default_year)
-    return dur, dist, date_str
-
-# ---------------- Helpers: run-type & thresholds ----------------
-def _where_category(s: str) -> Optional[str]:
-    s = (s or "").strip().lower()
-    if any(k in s for k in OUTDOOR_KEYS):
-        return "outdoor"
-    if any(k in s for k in INDOOR_KEYS):
-        return "indoor"
-    return None
-
-def thr_hms_to_sec(hms: str) -> int:
-    h, m, s = map(int, hms.split(":"))
-    return h*3600 + m*60 + s
-
-def _to_float(x) -> Optional[float]:
-    try:
-        if x is None or x == "":
-            return None
-        if isinstance(x, (int, float)):
-            return float(x)
-        s = str(x).strip().replace(",", ".")
-        return float(s)
-    except Exception:
-        return None
+def _list_sheet_titles(sheets):
+    return sheets_io.sheet_titles(sheets, SPREADSHEET_ID)
 
-def is_small_distance_km(dist) -> bool:
-    v = _to_float(dist)
-    return (v is not None) and (v < DIST_MIN_KM)
+def _ensure_sheet_exists(sheets, title: str):
+    sheets_io.ensure_sheet(sheets, SPREADSHEET_ID, title)
 
 # ---------------- Window helpers ----------------
+_SERIAL_RE    = re.compile(r"\d+(\.\d+)?")
+_DATE_ONLY_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
 def _parse_iso(ts: str) -> dt.datetime:
     if ts is None:
         raise ValueError("empty timestamp")
     s = str(ts).strip()
 
     # Google Sheets serial number
-    if re.fullmatch(r"\d+(\.\d+)?", s):
+    if _SERIAL_RE.fullmatch(s):
         base = dt.datetime(1899, 12, 30, tzinfo=dt.timezone(dt.timedelta(hours=LOCAL_TZ_OFFSET_HOURS)))
         serial = float(s)
         days = int(serial)
@@ -1119,132 +211,294 @@ def _parse_iso(ts: str) -> dt.datetime:
 
     raise ValueError(f"unrecognized timestamp format: {s}")
 
-def _row_in_window(row_ts: str, start: dt.datetime, end: dt.datetime) -> bool:
+def _parse_iso_or_none(ts) -> Optional[dt.datetime]:
     try:
-        t = _parse_iso(row_ts)
-        return (t >= start) and (t <= end)
+        return _parse_iso(ts)
     except Exception:
-        return False
+        return None
+
+# Timestamp ของแถว: fast path ตาม format ของคอลัมน์ + cache ต่อ cell; ค่าแปลก ๆ → _parse_iso
+_TS_PARSER = ColumnParser(_parse_iso_or_none, tz=dt.timezone(dt.timedelta(hours=LOCAL_TZ_OFFSET_HOURS)))
+
+def _ts_epoch(row_ts: str) -> Optional[float]:
+    """Timestamp cell → epoch วินาที (สำหรับ TimestampIndex); อ่านไม่ได้ → None"""
+    d = _TS_PARSER(row_ts)
+    return d.timestamp() if d is not None else None
+
+def _read_raw(sheets) -> List[List[str]]:
+    """RAW ทั้งแท็บ (index mode: header อย่างเดียว — แถวอ่านทีหลังเฉพาะคอลัมน์ / แถวที่ต้องใช้)"""
+    return _get_values(sheets, f"{SHEET_NAME_RAW}!A1:AZ1" if BACKFILL_READ_MODE == "index" else RAW_RANGE)
 
 # ---------------- Core backfill + detect ----------------
-def run_backfill_window(start_iso: str, end_iso: str) -> dict:
+def run_backfill_window(
+    start_iso: str,
+    end_iso: str,
+    *,
+    max_rows: Optional[int] = None,
+    max_images: Optional[int] = None,
+    time_budget_sec: Optional[float] = None,
+    dry_run: bool = False,
+    work_sheet: Optional[str] = None,
+    raw_vals: Optional[List[List[str]]] = None,
+    heartbeat: Optional[Callable[[], None]] = None,
+) -> dict:
+    """
+    work_sheet: แท็บ Working (None = work_sheet หรือแท็บรายวันเมื่อ WORK_PARTITION=day)
+    raw_vals: RAW ที่อ่านไว้แล้ว (ทั้งแท็บ; index mode = header อย่างเดียว) — None = อ่านเอง
+    heartbeat: เรียกก่อนเริ่มแต่ละแถว (เช่นต่อ lease ของ job — core/jobs.py lease_renewer)
+    limits (None = ไม่จำกัด):
+      - max_rows: จำนวนแถวเป้าหมายสูงสุดที่ OCR ในรอบนี้ (ตามลำดับแถว)
+      - max_images / time_budget_sec: ตรวจก่อนเริ่มแต่ละแถว → เกินแล้วหยุด
+    แถวที่ยังไม่ได้ทำยังไม่มีสถานะ → รอบถัดไปหยิบต่อเอง
+    dry_run: ไม่ append / ไม่เขียน → คืนจำนวนแถว / รูป / bytes (ขนาดไฟล์จาก Drive metadata) ที่จะทำ
+    """
+    if work_sheet is None:
+        if partitions.enabled():
+            return _run_partitioned(start_iso, end_iso, max_rows=max_rows, max_images=max_images,
+                                    time_budget_sec=time_budget_sec, dry_run=dry_run, heartbeat=heartbeat)
+        work_sheet = SHEET_NAME_WORK
+    work_range = WORK_RANGE if work_sheet == SHEET_NAME_WORK else f"{work_sheet}!A:AZ"
+
     t0 = time.monotonic()
     sheets, drive = _build_services()
+    # index mode: อ่าน header + คอลัมน์ Timestamp/สถานะก่อน แล้วดึงเฉพาะแถวเป้าหมาย (batchGet)
+    index_mode = BACKFILL_READ_MODE == "index"
 
     # RAW
-    raw_vals = _get_values(sheets, RAW_RANGE)
+    if raw_vals is None:
+        raw_vals = _read_raw(sheets)
     if not raw_vals:
         return {"result": "success", "detail": "no raw", "duration_sec": round(time.monotonic()-t0, 3)}
-    raw_header, raw_rows = raw_vals[0], raw_vals[1:]
-
-    # WORK ensure exists
-    _ensure_sheet_exists(sheets, SHEET_NAME_WORK)
-    work_vals = _get_values(sheets, WORK_RANGE)
+    raw_header, raw_rows = raw_vals[0], (None if index_mode else raw_vals[1:])
+
+    # WORK ensure exists — dry_run: ไม่สร้างแท็บ / ไม่เขียน header (ยังไม่มีแท็บ → วางแผนจาก RAW กับ WORK ว่าง)
+    if dry_run:
+        work_exists = work_sheet in _list_sheet_titles(sheets)
+    else:
+        _ensure_sheet_exists(sheets, work_sheet)
+        work_exists = True
+    # WORK จาก local snapshot (index ตาม timestamp/สถานะ); ปิด snapshot → อ่านทั้งแท็บ (index mode: แค่ header)
+    snap = open_snapshot(sheets, SPREADSHEET_ID, work_sheet, columns=SNAPSHOT_COLUMNS) if work_exists else None
+    if snap is not None:
+        snap.refresh()
+
+    def _load_work():
+        if not work_exists:
+            return []
+        if snap is not None:
+            return [list(snap.header)] if (index_mode and snap.header) else snap.values()
+        return _get_values(sheets, f"{work_sheet}!A1:AZ1" if index_mode else work_range)
+
+    work_vals = _load_work()
     if not work_vals:
         # create header only
         work_header = list(raw_header)
         for col in [STATUS_COL, DIST_COL, DUR_COL, IN_STATUS_COL, DIGI_DIST_COL, DIGI_DUR_COL, MACH_DIST_COL, MACH_DUR_COL, PHOTO_DATE_COL]:
-            _ensure_col(work_header, [], col)
-        _update_values(sheets, f"{SHEET_NAME_WORK}!A1", [work_header])
-        work_vals = _get_values(sheets, WORK_RANGE)
+            ensure_col(work_header, [], col)
+        if dry_run:
+            work_vals = [work_header]
+        else:
+            _update_values(sheets, f"{work_sheet}!A1", [work_header])
+            if snap is not None:
+                snap.replace(work_header, [])
+            work_vals = _load_work()
 
     work_header, work_rows = work_vals[0], work_vals[1:]
-    _pad_all_rows(work_rows, len(work_header))
 
-    # ensure result cols in header & rows
+    # ensure result cols in header (แถวถูก pad ตามความกว้าง header ตอนห่อเป็น Row)
     header_before = list(work_header)
     for col in [STATUS_COL, DIST_COL, DUR_COL, IN_STATUS_COL, DIGI_DIST_COL, DIGI_DUR_COL, MACH_DIST_COL, MACH_DUR_COL, PHOTO_DATE_COL]:
-        _ensure_col(work_header, work_rows, col)
-    if work_header != header_before:
-        _update_values(sheets, f"{SHEET_NAME_WORK}!A1", [work_header])
-        work_vals = _get_values(sheets, WORK_RANGE)
-        work_header, work_rows = work_vals[0], work_vals[1:]
-        _pad_all_rows(work_rows, len(work_header))
-
-    # indexes
-    idx_ts_raw   = _idx(raw_header,  TIMESTAMP_COL_NAME)
-    idx_ts_work  = _idx(work_header, TIMESTAMP_COL_NAME)
-    if idx_ts_raw is None or idx_ts_work is None:
+        ensure_col(work_header, [], col)
+    if work_header != header_before and not dry_run:
+        _update_values(sheets, f"{work_sheet}!A1", [work_header])
+        if snap is not None:
+            snap.set_header(work_header)
+    schema = resolve_schema(work_header, WORK_FIELDS)
+    work_rows = schema.wrap_all(work_rows)
+
+    # indexes (schema cache ตาม header → ตรวจคอลัมน์บังคับครั้งเดียวต่อ header)
+    raw_schema = resolve_schema(raw_header, WORK_FIELDS)
+    if raw_schema.missing("ts") or schema.missing("ts"):
         raise RuntimeError(f"Missing '{TIMESTAMP_COL_NAME}' in RAW or WORK.")
-
-    idx_img    = _idx(work_header, IMAGE_COL_NAME)
-    idx_selfie = _idx(work_header, SELFIE_COL_NAME)
-    idx_where  = _idx(work_header, WHERE_COL_NAME)
-    idx_digi   = _idx(work_header, INDOOR_DIGI_COL)
-    idx_mach   = _idx(work_header, INDOOR_MACH_COL)
-    if any(v is None for v in [idx_img, idx_where, idx_digi, idx_mach]):
+    if schema.missing("img", "where", "digi", "mach"):
         raise RuntimeError("Missing required image/where columns in Working sheet.")
 
-    idx_sta   = _idx(work_header, STATUS_COL)
-    idx_dist  = _idx(work_header, DIST_COL)
-    idx_dur   = _idx(work_header, DUR_COL)
-    idx_insta = _idx(work_header, IN_STATUS_COL)
-    idx_ddist = _idx(work_header, DIGI_DIST_COL)
-    idx_ddur  = _idx(work_header, DIGI_DUR_COL)
-    idx_mdist = _idx(work_header, MACH_DIST_COL)
-    idx_mdur  = _idx(work_header, MACH_DUR_COL)
-    idx_photo_date = _idx(work_header, PHOTO_DATE_COL)
+    idx_ts_work = schema.col("ts")
+    idx_sta     = schema.col("status")
+    idx_insta   = schema.col("in_status")
+
+    # indexes of the columns the OCR pass reads / writes
+    idx_img    = schema.col("img")
+    idx_selfie = schema.col("selfie")
+    idx_where  = schema.col("where")
+    idx_digi   = schema.col("digi")
+    idx_mach   = schema.col("mach")
+
+    idx_dist  = schema.col("dist")
+    idx_dur   = schema.col("dur")
+    idx_ddist = schema.col("digi_dist")
+    idx_ddur  = schema.col("digi_dur")
+    idx_mdist = schema.col("mach_dist")
+    idx_mdur  = schema.col("mach_dur")
+    idx_photo_date = schema.col("photo_date")
 
     # window
     start_dt = _parse_iso(start_iso)
     end_dt   = _parse_iso(end_iso)
+    start_ep, end_ep = start_dt.timestamp(), end_dt.timestamp()
 
-    # RAW rows in window
-    raw_in_window = []
-    for r in raw_rows:
-        ts = get_cell(r, idx_ts_raw)
-        if _row_in_window(ts, start_dt, end_dt):
-            raw_in_window.append(r)
-
-    # existing keys in WORK (by timestamp only)
-    def key_of_row(header: List[str], row: List[str]) -> str:
-        return get_cell(row, _idx(header, TIMESTAMP_COL_NAME))
-
-    work_keys_in_window = set()
-    for r in work_rows:
-        ts = get_cell(r, idx_ts_work)
-        if _row_in_window(ts, start_dt, end_dt):
-            work_keys_in_window.add(key_of_row(work_header, r))
+    def read_cols(sheet_name: str, rows: Optional[List], cols: Dict[str, Optional[int]]) -> Dict[str, List]:
+        """คอลัมน์ของทุกแถว: จากแถวที่อ่านมาแล้ว หรืออ่านเฉพาะคอลัมน์ (index mode / SERIAL_READS)"""
+        if rows is not None and not SERIAL_READS:
+            out = {k: [get_cell(r, i) for r in rows] for k, i in cols.items()}
+        else:
+            last = len(rows) + 1 if rows is not None else None
+            out = read_columns(sheets, SPREADSHEET_ID, sheet_name, cols, 2, last, unformatted=SERIAL_READS)
+        n = max(map(len, out.values()), default=0)
+        return {k: (v if cols[k] is not None else [""] * n) for k, v in out.items()}
+
+    def keys_of(cols: Dict[str, List], positions: List[int]) -> List:
+        """key (Timestamp, Employee ID, file IDs ของรูป) ของแถวที่ตำแหน่ง positions (core/reconcile.py)"""
+        return [row_key(cols["ts"][k], cols["emp_id"][k], [cols[f][k] for f in IMAGE_KEY_FIELDS], _ts_epoch)
+                for k in positions]
+
+    # RAW rows in window (parse Timestamp ครั้งเดียว แล้วเลือกช่วงด้วย bisect)
+    raw_cols = read_cols(SHEET_NAME_RAW, raw_rows, {f: raw_schema.col(f) for f in KEY_FIELDS})
+    _TS_PARSER.sniff(raw_cols["ts"])
+    raw_pos = TimestampIndex.build(raw_cols["ts"], _ts_epoch).window(start_ep, end_ep)
+    raw_keys = keys_of(raw_cols, raw_pos)
+
+    # WORK: keys ในช่วง + แถวเป้าหมาย (ในช่วง AND Out_Status=="" AND In_Status=="" — NG ถือว่ามีสถานะแล้ว)
+    if snap is not None:
+        # snapshot มี index ใน SQLite อยู่แล้ว
+        work_key = make_keyer(schema, _ts_epoch)
+        work_keys = [work_key(cells) for _, cells in snap.rows_in_window(start_ep, end_ep)]
+        target_nums = snap.pending_row_nums_in_window(start_ep, end_ep)
+    else:
+        cols = read_cols(work_sheet, None if (index_mode and work_exists) else work_rows,
+                         {**{f: schema.col(f) for f in KEY_FIELDS}, "status": idx_sta, "in_status": idx_insta})
+        work_pos = TimestampIndex.build(cols["ts"], _ts_epoch).window(start_ep, end_ep)
+        work_keys = keys_of(cols, work_pos)
+        target_nums = [k + 2 for k in work_pos
+                       if not str(cols["status"][k]).strip() and not str(cols["in_status"][k]).strip()]
+
+    # RAW ↔ WORK ในช่วง: hash index ของ key → แถวที่ขาด (คัดลอก) / ซ้ำ / ไม่มีใน RAW แล้ว (รายงาน)
+    rec = reconcile(raw_keys, work_keys, raw_pos=raw_pos)
+
+    if not index_mode:
+        targets = [work_rows[n - 2] for n in target_nums]
+    elif snap is not None:
+        targets = [schema.wrap(snap.get_row(n) or [], n) for n in target_nums]
+    else:
+        fetched = read_rows(sheets, SPREADSHEET_ID, work_sheet, target_nums)
+        targets = [schema.wrap(fetched[n], n) for n in target_nums]
 
     # append missing rows
-    to_append = []
-    for r in raw_in_window:
-        key = key_of_row(raw_header, r)
-        if key not in work_keys_in_window:
-            to_append.append(_pad_row(list(r), len(work_header)))
+    missing_pos = rec.missing
+    if index_mode:
+        fetched = read_rows(sheets, SPREADSHEET_ID, SHEET_NAME_RAW, [k + 2 for k in missing_pos])
+        to_append = [pad_row(fetched[k + 2], len(work_header)) for k in missing_pos]
+    else:
+        to_append = [pad_row(list(raw_rows[k]), len(work_header)) for k in missing_pos]
+
+    def latest_first(rows: List) -> Tuple[List, List]:
+        """OCR_SUPERSEDED: (ลำดับที่ OCR, แถวที่ไม่ OCR) — เทียบเฉพาะในแถวเป้าหมายของรอบนี้"""
+        if OCR_SUPERSEDED not in ("defer", "skip"):
+            return rows, []
+        sup = superseded_positions((r.get("emp_id"), r.get(idx_ts_work)) for r in rows)
+        order, skipped = split_superseded(list(range(len(rows))), sup.__contains__)
+        return [rows[k] for k in order], [rows[k] for k in skipped]
+
+    def file_ids_of(r) -> Tuple[List[str], List[str]]:
+        """รูปที่แถวนี้ต้อง OCR: (แน่นอน, เฉพาะตอน fallback ไป selfie)"""
+        cat = where_category(r.get(idx_where).strip())
+        if cat == "outdoor":
+            return file_ids_from_cell(r.get(idx_img)), file_ids_from_cell(r.get(idx_selfie))
+        if cat == "indoor":
+            return file_ids_from_cell(r.get(idx_digi)) + file_ids_from_cell(r.get(idx_mach)), []
+        return [], []   # Quarantined → ไม่ OCR
+
+    # เขียนกลับเฉพาะคอลัมน์ผล / สถานะ — แถวอาจมาจาก snapshot (เก่าได้ถึง SNAPSHOT_MAX_AGE_SEC)
+    # → ไม่ทับค่าที่คนแก้ในชีตระหว่างนั้น (Employee ID, ลิงก์รูป, Team, km ที่กรอกเอง ฯลฯ)
+    result_cols = (idx_sta, idx_dist, idx_dur, idx_insta, idx_ddist, idx_ddur, idx_mdist, idx_mdur, idx_photo_date)
+
+    def result_ranges(r) -> List[dict]:
+        return row_cells_to_value_ranges(work_sheet, r.row_num, r.cells, result_cols)
+
+    if dry_run:
+        planned, skipped = latest_first(targets + [schema.wrap(list(r)) for r in to_append])
+        if max_rows is not None:
+            planned = planned[:max_rows]
+        rows = images = fallback_images = 0
+        file_ids: List[str] = []
+        for r in planned:
+            if max_images is not None and images >= max_images:
+                break
+            main_ids, extra_ids = file_ids_of(r)
+            rows += 1
+            images += len(main_ids)
+            fallback_images += len(extra_ids)
+            file_ids.extend(main_ids)
+        sizes = [file_size(drive, fid) for fid in dict.fromkeys(file_ids)]
+        return {
+            "result": "success",
+            "dry_run": True,
+            "window": {"from": start_iso, "to": end_iso},
+            "append_rows": len(to_append),
+            "reconcile": rec.summary(),
+            "pending_rows": len(targets) + len(to_append),
+            "superseded_rows": len(skipped),
+            "planned_rows": rows,
+            "planned_images": images,
+            "fallback_images": fallback_images,
+            "estimated_bytes": sum(x for x in sizes if x is not None),
+            "unknown_size_images": sum(1 for x in sizes if x is None),
+            "duration_sec": round(time.monotonic() - t0, 3),
+        }
 
     if to_append:
-        _append_values(sheets, WORK_RANGE, to_append)
-        work_vals = _get_values(sheets, WORK_RANGE)
-        work_header, work_rows = work_vals[0], work_vals[1:]
-        _pad_all_rows(work_rows, len(work_header))
-        # re-index after append
-        idx_ts_work  = _idx(work_header, TIMESTAMP_COL_NAME)
-        idx_img      = _idx(work_header, IMAGE_COL_NAME)
-        idx_selfie   = _idx(work_header, SELFIE_COL_NAME)
-        idx_where    = _idx(work_header, WHERE_COL_NAME)
-        idx_digi     = _idx(work_header, INDOOR_DIGI_COL)
-        idx_mach     = _idx(work_header, INDOOR_MACH_COL)
-        idx_sta      = _idx(work_header, STATUS_COL)
-        idx_dist     = _idx(work_header, DIST_COL)
-        idx_dur      = _idx(work_header, DUR_COL)
-        idx_insta    = _idx(work_header, IN_STATUS_COL)
-        idx_ddist    = _idx(work_header, DIGI_DIST_COL)
-        idx_ddur     = _idx(work_header, DIGI_DUR_COL)
-        idx_mdist    = _idx(work_header, MACH_DIST_COL)
-        idx_mdur     = _idx(work_header, MACH_DUR_COL)
-        idx_photo_date = _idx(work_header, PHOTO_DATE_COL)
-
-    # targets: in-window AND Out_Status=="" AND In_Status=="" (ถือว่า NG เป็นสถานะแล้ว)
-    targets = []
-    for i, r in enumerate(work_rows):
-        ts = get_cell(r, idx_ts_work)
-        if not _row_in_window(ts, start_dt, end_dt):
-            continue
-        out_empty = not (get_cell(r, idx_sta).strip())
-        in_empty  = not (get_cell(r, idx_insta).strip())
-        if out_empty and in_empty:
-            targets.append(i)
+        appended = _append_values(sheets, work_range, to_append)
+        if snap is not None:
+            snap.apply_append_result(appended, to_append)
+        first = first_row_of(((appended or {}).get("updates") or {}).get("updatedRange", ""))
+        if first is None:
+            raise RuntimeError("append response has no updatedRange")
+        # แถวใหม่อยู่ในช่วงและยังไม่มีสถานะ → เป็นเป้าหมายเลย (ไม่ต้องอ่าน WORK ใหม่)
+        targets.extend(schema.wrap(list(r), first + k) for k, r in enumerate(to_append))
+
+    # แถวที่ถูกส่งใหม่ทับแล้ว: ไว้ท้ายคิว (defer) หรือเขียนสถานะแทน OCR (skip)
+    targets, superseded = latest_first(targets)
+    superseded_updates = []
+    for r in superseded:
+        r[idx_sta] = STATUS_SUPERSEDED
+        superseded_updates.extend(result_ranges(r))
+
+    # limits
+    if max_rows is not None:
+        targets, deferred = targets[:max_rows], targets[max_rows:]
+    else:
+        deferred = []
+    state = {"images": 0, "stopped": None}
+    lock = threading.Lock()
+    tls = threading.local()
+
+    def drive_client():
+        """Drive client ของ thread นี้ (googleapiclient ไม่ thread-safe; thread หลักใช้ตัวเดิม)"""
+        d = getattr(tls, "drive", None)
+        if d is None:
+            d = tls.drive = drive if threading.current_thread() is threading.main_thread() else _build_drive_client()
+        return d
+
+    def should_stop() -> bool:
+        if heartbeat is not None:
+            heartbeat()
+        with lock:
+            if state["stopped"] is None:
+                if max_images is not None and state["images"] >= max_images:
+                    state["stopped"] = "max_images"
+                elif time_budget_sec is not None and time.monotonic() - t0 >= time_budget_sec:
+                    state["stopped"] = "time_budget"
+            return state["stopped"] is not None
 
     # OCR + parse แบบเดียวกับ main
     def ocr_and_parse_safe(cell_text: str) -> Tuple[Optional[str], Optional[float], Optional[str], Optional[str]]:
@@ -1252,13 +506,15 @@ def run_backfill_window(start_iso: str, end_iso: str) -> dict:
         return: (duration_hms, distance_km, shot_date_mdy, ng_reason)
         - ถ้า non-image/วิดีโอ/รูปพัง/Vision error → ng_reason ไม่ว่าง
         """
-        file_ids = _file_ids_from_cell(cell_text)
+        file_ids = file_ids_from_cell(cell_text)
         if not file_ids:
             return None, None, None, None
 
         pieces: List[str] = []
         for fid in file_ids:
-            content, filename, mime = _download_bytes_and_meta(drive, fid)
+            with lock:
+                state["images"] += 1
+            content, filename, mime = download_bytes_and_meta(drive_client(), fid)
             status, reason, text = ocr_image_bytes_safe(content, filename, mime)
             if status == "NG":
                 return None, None, None, reason or "non-image"
@@ -1276,26 +532,32 @@ def run_backfill_window(start_iso: str, end_iso: str) -> dict:
     def success(d, k) -> bool:
         return (d is not None) and (k is not None)
 
-    # comparator ปลอดภัยแบบ main
-    def _is_time_over_safe(hms: Optional[str]) -> bool:
-        if not hms:
-            return False
-        t = _sec_from_timestr(hms)
-        return (t is not None) and (t > thr_hms_to_sec(TIME_OVER_HMS))
+    # เกณฑ์ตัดสินสถานะ (core/status_rules.py)
+    limits = Limits(DIST_MIN_KM, thr_hms_to_sec(TIME_OVER_HMS))
+
+    def _dur_sec(hms: Optional[str]) -> Optional[int]:
+        return sec_from_timestr(hms) if hms else None
 
-    batch_updates = []
+    run_ts = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
-    for i in targets:
-        r = work_rows[i]
-        where_val = get_cell(r, idx_where).strip()
-        cat = _where_category(where_val)
+    def process_row(r) -> Tuple[List[dict], Optional[list]]:
+        """OCR + ตัดสินสถานะของแถวเดียว → (value ranges ที่ต้องเขียน, แถว Quarantine)"""
+        where_val = r.get(idx_where).strip()
+        cat = where_category(where_val)
         if cat is None:
-            raise RuntimeError(f"Unknown value in '{WHERE_COL_NAME}' at working row {i+2}: {where_val!r}")
+            # poison row → กักไว้แล้วข้าม (ไม่ให้ทั้งหน้าต่างเวลาล้ม)
+            reason = f"Unknown value in '{WHERE_COL_NAME}'"
+            r[idx_sta] = STATUS_QUARANTINED
+            return result_ranges(r), [
+                run_ts, "recheck_ocr", work_sheet, r.row_num,
+                r.get(idx_ts_work), r.get("emp_id"),
+                reason, where_val,
+            ]
 
         changed = False
 
         if cat == "outdoor":
-            out_dur, out_dist, shot_date, ng_reason = ocr_and_parse_safe(get_cell(r, idx_img))
+            out_dur, out_dist, shot_date, ng_reason = ocr_and_parse_safe(r.get(idx_img))
 
             if ng_reason:  # ช่องหลัก non-image/วิดีโอ/รูปพัง → NG
                 r[idx_dur]  = ""
@@ -1315,7 +577,7 @@ def run_backfill_window(start_iso: str, end_iso: str) -> dict:
                     changed = True
                 else:
                     if idx_selfie is not None:
-                        s_dur, s_dist, s_date, ng2 = ocr_and_parse_safe(get_cell(r, idx_selfie))
+                        s_dur, s_dist, s_date, ng2 = ocr_and_parse_safe(r.get(idx_selfie))
                         if ng2:
                             r[idx_dur]  = ""
                             r[idx_dist] = ""
@@ -1342,22 +604,17 @@ def run_backfill_window(start_iso: str, end_iso: str) -> dict:
                         changed = True
 
             # precedence overrides เหมือน main (ทำเฉพาะเมื่อเริ่มต้นเป็น OK)
-            initial_status = (get_cell(r, idx_sta) or "").strip()
+            initial_status = r.get(idx_sta).strip()
             if initial_status == "OK":
-                new_status = None
-                if is_small_distance_km(get_cell(r, idx_dist)) and _is_time_over_safe(get_cell(r, idx_dur)):
-                    new_status = STATUS_COND_INSUFF
-                elif is_small_distance_km(get_cell(r, idx_dist)):
-                    new_status = STATUS_DIST_INSUFF
-                elif _is_time_over_safe(get_cell(r, idx_dur)):
-                    new_status = "Time Over"
-                if new_status and new_status != initial_status:
+                # ระยะน้อย / เวลาเกิน → All Condition Insufficient / Distance Insufficient / Time Over
+                new_status = judge_outdoor(r.num(idx_dist), r.sec(idx_dur), limits)
+                if new_status != initial_status:
                     r[idx_sta] = new_status
                     changed = True
 
         else:  # indoor
-            digi_dur,  digi_dist, digi_date,  ng_digi  = ocr_and_parse_safe(get_cell(r, idx_digi))
-            mach_dur,  mach_dist, mach_date,  ng_mach  = ocr_and_parse_safe(get_cell(r, idx_mach))
+            digi_dur,  digi_dist, digi_date,  ng_digi  = ocr_and_parse_safe(r.get(idx_digi))
+            mach_dur,  mach_dist, mach_date,  ng_mach  = ocr_and_parse_safe(r.get(idx_mach))
 
             r[idx_ddur]  = digi_dur or ""
             r[idx_ddist] = digi_dist if (digi_dist is not None) else ""
@@ -1370,49 +627,240 @@ def run_backfill_window(start_iso: str, end_iso: str) -> dict:
             if ng_digi or ng_mach:
                 r[idx_insta] = "NG"
             else:
-                has_digi_dur  = bool(digi_dur)
-                has_mach_dur  = bool(mach_dur)
-                has_mach_dist = (mach_dist is not None)
-
-                if not (has_digi_dur and has_mach_dur and has_mach_dist):
-                    r[idx_insta] = "NG"
-                else:
-                    small_by_machine_only = is_small_distance_km(mach_dist)
-                    over_both  = _is_time_over_safe(digi_dur) and _is_time_over_safe(mach_dur)
-
-                    if small_by_machine_only and over_both:
-                        r[idx_insta] = STATUS_COND_INSUFF
-                    elif small_by_machine_only:
-                        r[idx_insta] = STATUS_DIST_INSUFF
-                    elif over_both:
-                        r[idx_insta] = "Time Over"
-                    else:
-                        r[idx_insta] = "OK"
+                # ขาดช่องใดช่องหนึ่ง → NG; ครบ → ตามตาราง STATUS_RULES
+                r[idx_insta] = judge_indoor(_dur_sec(digi_dur), mach_dist, _dur_sec(mach_dur), limits)
 
         if changed:
-            batch_updates.append({
-                "range": _range_for_row(SHEET_NAME_WORK, i + 2, len(work_header)),
-                "values": [_pad_row(r, len(work_header))]
-            })
+            return result_ranges(r), None
+        return [], None
 
-    if batch_updates:
-        sheets.spreadsheets().values().batchUpdate(
-            spreadsheetId=SPREADSHEET_ID,
-            body={"valueInputOption": "RAW", "data": batch_updates},
-        ).execute()
+    def run_shard(shard: List) -> Tuple[List[dict], List[list], int]:
+        updates, entries, done = [], [], 0
+        for r in shard:
+            if should_stop():
+                break
+            ranges, entry = process_row(r)
+            done += 1
+            updates.extend(ranges)
+            if entry is not None:
+                entries.append(entry)
+        return updates, entries, done
+
+    # shards: แถวเป้าหมาย (ตามลำดับแถว ≈ ลำดับเวลาที่ส่งฟอร์ม) แบ่งเป็นช่วงย่อยละ BACKFILL_SHARD_ROWS แถว → worker หยิบทีละ shard
+    # ผลรวมตามลำดับ shard แล้วเขียนครั้งเดียว (range ซ้ำ → ค่าล่าสุดชนะ)
+    step = max(1, BACKFILL_SHARD_ROWS)
+    shards = [targets[k:k + step] for k in range(0, len(targets), step)]
+    workers = max(1, min(BACKFILL_WORKERS, len(shards)))
+    if workers == 1:
+        results = [run_shard(sh) for sh in shards]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_shard, shards))
+    batch_updates = merge_value_ranges([superseded_updates] + [u for u, _, _ in results])
+    quarantine_entries = [e for _, es, _ in results for e in es]
+    processed = sum(n for _, _, n in results)
+    stopped = state["stopped"]
+    # Timestamp ที่น้อยที่สุดของแถวเป้าหมายที่ยังไม่ได้ทำ → จุดเริ่มของรอบถัดไป
+    # (แถวที่เก่ากว่านั้นมีสถานะแล้วทั้งหมด; ลำดับแถวในชีตไม่จำเป็นต้องเรียงตามเวลา)
+    left = [r for sh, (_, _, n) in zip(shards, results) for r in sh[n:]] + deferred
+    left_eps = [_ts_epoch(r.get(idx_ts_work)) for r in left]
+    resume_ep = None if (not left or None in left_eps) else min(left_eps)
+
+    chunk_reports = batch_update_chunked(
+        sheets, SPREADSHEET_ID, batch_updates, sheets_factory=_build_sheets_client,
+    )
+    if snap is not None:
+        snap.apply_value_ranges(batch_updates)
+    record_quarantine(sheets, SPREADSHEET_ID, quarantine_entries)
 
     return {
         "result": "success",
         "window": {"from": start_iso, "to": end_iso},
-        "updated_rows": len(batch_updates),
+        "updated_rows": len({first_row_of(e["range"]) for e in batch_updates}),
+        "quarantined": len(quarantine_entries),
+        "superseded": len(superseded),
+        "reconcile": rec.summary(),
+        "images": state["images"],
+        "workers": workers,
+        "processed_rows": processed,
+        "remaining_rows": len(targets) - processed + len(deferred),
+        "stopped": stopped or ("max_rows" if deferred else None),
+        "resume_from": (dt.datetime.fromtimestamp(resume_ep, _tz).isoformat(timespec="seconds")
+                        if resume_ep is not None else None),
+        "write_chunks": [
+            {k: c[k] for k in ("chunk", "ranges", "bytes", "attempts", "latency_sec")}
+            for c in chunk_reports
+        ],
         "duration_sec": round(time.monotonic() - t0, 3),
     }
 
 # ---------------- HTTP entry ----------------
+def _backfill_params(request: Optional[Request]) -> dict:
+    """
+    พารามิเตอร์จาก query string และ/หรือ JSON body (JSON ชนะ):
+      from / to (ISO หรือ YYYY-MM-DD; default = เมื่อวานทั้งวัน), max_rows, max_images,
+      time_budget_sec (default = env BACKFILL_TIME_BUDGET_SEC), dry_run,
+      job (continuation token จากผลรอบก่อน)
+    ค่าไม่ถูกต้อง → ValueError
+    """
+    params: dict = {}
+    if request is not None:
+        params.update(request.args.to_dict() if request.args else {})
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            params.update(body)
+
+    def _bound(key: str, end_of_day: bool) -> Optional[str]:
+        v = params.get(key)
+        if v in (None, ""):
+            return None
+        s = str(v).strip()
+        if _DATE_ONLY_RE.fullmatch(s):
+            s += "T23:59:59" if end_of_day else "T00:00:00"
+        try:
+            return _parse_iso(s).isoformat(timespec="seconds")
+        except ValueError:
+            raise ValueError(f"invalid '{key}': {v!r}")
+
+    def _limit(key: str, kind):
+        v = params.get(key)
+        if v in (None, ""):
+            return None
+        try:
+            n = kind(v)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid '{key}': {v!r}")
+        if n <= 0:
+            raise ValueError(f"'{key}' must be > 0")
+        return n
+
+    d_from, d_to = default_window()
+    start_iso = _bound("from", False) or d_from
+    end_iso = _bound("to", True) or d_to
+    if _parse_iso(start_iso) > _parse_iso(end_iso):
+        raise ValueError("'from' must be <= 'to'")
+    dry = params.get("dry_run", False)
+    budget = _limit("time_budget_sec", float)
+    return {
+        "start_iso": start_iso,
+        "end_iso": end_iso,
+        "max_rows": _limit("max_rows", int),
+        "max_images": _limit("max_images", int),
+        "time_budget_sec": budget if budget is not None else (BACKFILL_TIME_BUDGET_SEC or None),
+        "dry_run": dry if isinstance(dry, bool) else str(dry).strip().lower() in ("1", "true", "yes"),
+        "job_id": str(params.get("job") or "").strip() or None,
+    }
+
+def _run_partitioned(start_iso: str, end_iso: str, *, max_rows: Optional[int], max_images: Optional[int],
+                     time_budget_sec: Optional[float], dry_run: bool,
+                     heartbeat: Optional[Callable[[], None]] = None) -> dict:
+    """
+    WORK_PARTITION=day: แบ่งช่วงเป็นรายวัน → run_backfill_window กับแท็บของแต่ละวัน (limits ใช้ร่วมกัน) แล้วรวมผล
+    RAW อ่านครั้งเดียวแล้วส่งต่อทุกวัน (แต่ละวันเลือกแถวในช่วงของตัวเองด้วย Timestamp index; เลขแถว RAW ไม่เปลี่ยน)
+    """
+    t0 = time.monotonic()
+    raw_vals = _read_raw(_build_sheets_client())
+    start_dt, end_dt = _parse_iso(start_iso), _parse_iso(end_iso)
+    parts: List[dict] = []
+    rows_done = images_done = 0
+    stopped = resume_at = None
+    for day in partitions.days_in_window(start_dt, end_dt, _tz):
+        d = dt.date.fromisoformat(day)
+        lo = max(start_dt, dt.datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=_tz))
+        hi = min(end_dt, dt.datetime(d.year, d.month, d.day, 23, 59, 59, tzinfo=_tz))
+        rows_left = None if max_rows is None else max_rows - rows_done
+        images_left = None if max_images is None else max_images - images_done
+        time_left = None if time_budget_sec is None else time_budget_sec - (time.monotonic() - t0)
+        if rows_left is not None and rows_left <= 0:
+            stopped = "max_rows"
+        elif images_left is not None and images_left <= 0:
+            stopped = "max_images"
+        elif time_left is not None and time_left <= 0:
+            stopped = "time_budget"
+        if stopped:
+            resume_at = lo.isoformat(timespec="seconds")   # วันนี้ยังไม่ได้เริ่ม
+            break
+        part = run_backfill_window(
+            lo.isoformat(timespec="seconds"), hi.isoformat(timespec="seconds"),
+            max_rows=rows_left, max_images=images_left, time_budget_sec=time_left, dry_run=dry_run,
+            work_sheet=partitions.partition_tab(SHEET_NAME_WORK, day), raw_vals=raw_vals, heartbeat=heartbeat,
+        )
+        part["day"] = day
+        parts.append(part)
+        rows_done += part.get("planned_rows" if dry_run else "processed_rows", 0)
+        images_done += part.get("planned_images" if dry_run else "images", 0)
+        if part.get("stopped"):
+            stopped = part["stopped"]
+            break
+
+    out: dict = {"result": "success", "window": {"from": start_iso, "to": end_iso}}
+    for part in parts:
+        for k, v in part.items():
+            if isinstance(v, int) and not isinstance(v, bool) and k != "workers":
+                out[k] = out.get(k, 0) + v
+    if dry_run:
+        out["dry_run"] = True
+    else:
+        out["stopped"] = stopped
+        # วันแรกที่ยังค้าง → จุดเริ่มของรอบถัดไป (วันหลังจากนั้นยังไม่ได้แตะ)
+        out["resume_from"] = next((p["resume_from"] for p in parts if p.get("resume_from")), resume_at)
+    out["partitions"] = [{k: v for k, v in p.items() if k not in ("write_chunks", "window")} for p in parts]
+    out["duration_sec"] = round(time.monotonic() - t0, 3)
+    return out
+
+def run_backfill_job(params: dict, job_id: Optional[str] = None) -> Tuple[dict, int]:
+    """
+    run_backfill_window แบบมี job record (core/jobs.py):
+    - ``job_id`` (continuation token) → ทำต่อจาก cursor ของ job นั้น (ใช้ช่วงเวลาของ job)
+    - ไม่ส่ง → auto-resume job ที่ยังไม่เสร็จของช่วงเดียวกัน (BACKFILL_AUTO_RESUME) หรือเริ่ม job ใหม่
+    หมด time budget / limit → job = paused + cursor; ผลลัพธ์มี ``job`` ไว้เรียกต่อ
+    ระหว่างทำงานต่อ lease ทุก ~1/3 ของ BACKFILL_JOB_LEASE_SEC (run ยาวไม่ถูก invocation อื่นแย่ง job)
+    """
+    sheets = _build_sheets_client()
+    if job_id:
+        job = load_job(sheets, SPREADSHEET_ID, job_id)
+        if job is None:
+            return {"result": "error", "reason": f"unknown job '{job_id}'"}, 404
+    elif BACKFILL_AUTO_RESUME:
+        job = find_open_job(sheets, SPREADSHEET_ID, params["start_iso"], params["end_iso"])
+    else:
+        job = None
+
+    if job is not None and job["status"] == "done":
+        return {"result": "success", "detail": "job already done", "job": _job_view(job)}, 200
+    if job is not None and lease_active(job):
+        return {"result": "error", "reason": "job is running in another invocation", "job": _job_view(job)}, 409
+    if job is None:
+        job = new_job(params["start_iso"], params["end_iso"])
+    job["status"] = "running"
+    save_job(sheets, SPREADSHEET_ID, job)
+
+    limits = {k: params[k] for k in ("max_rows", "max_images", "time_budget_sec")}
+    try:
+        summary = run_backfill_window(job["cursor"] or job["from"], job["to"], **limits,
+                                      heartbeat=lease_renewer(_build_sheets_client, SPREADSHEET_ID, job))
+    except Exception as e:
+        job["status"], job["detail"] = "error", str(e)[:500]
+        save_job(sheets, SPREADSHEET_ID, job)
+        raise
+    save_job(sheets, SPREADSHEET_ID, record_run(job, summary))
+    summary["job"] = _job_view(job)
+    return summary, 200
+
+def _job_view(job: dict) -> dict:
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
 def backfill_window_http(request: Request):
     try:
-        summary = run_backfill_window(DEFAULT_FROM, DEFAULT_TO)
-        return make_response((summary, 200))
+        params = _backfill_params(request)
+    except ValueError as e:
+        return make_response(({"result": "error", "reason": str(e)}, 400))
+    try:
+        job_id = params.pop("job_id")
+        if params["dry_run"]:
+            return make_response((run_backfill_window(**params), 200))
+        summary, code = run_backfill_job(params, job_id)
+        return make_response((summary, code))
     except HttpError as e:
         try:
             detail = e.content.decode() if hasattr(e, "content") else str(e)
@@ -1421,3 +869,6 @@ def backfill_window_http(request: Request):
         return make_response(({"result": "error", "reason": detail}, 500))
     except Exception as e:
         return make_response(({"result": "error", "reason": str(e)}, 500))
+
+
+IMPORT_STATS = startup.report("recheck_ocr", _T0)
@@ -3,7 +3,10 @@
 Daily Summary (by date) from Working sheet.
 
 Steps:
-1) Filter rows by SUMMARY_DATE (from column "Timestamp").
+1) Filter rows by the requested date(s) (from column "Timestamp").
+   Dates: request param date=YYYY-MM-DD[,...] or from=...&to=... (inclusive);
+   default SUMMARY_DATE. Working is read once and rows are bucketed by local date
+   in a single pass, so a week costs one read instead of seven.
 2) Build output columns:
    base: Timestamp, เลือกทีมของตัวเอง (Select your team),
          รหัสพนักงาน (Employee ID), ระยะทาง หน่วยกิโลเมตร  (Distance in km unit),
@@ -21,20 +24,42 @@ Steps:
                         -> "NG"  otherwise
      - Summary        : "OK" iff [Value condition, Check distance with input distance, Check Date] are all "OK"; else "NG"
 3) Group by Employee ID and pick the row with the latest Timestamp.
-4) Sort by Timestamp ascending (configurable) and write into a sheet named YYYY-MM-DD.
+4) Sort by Timestamp ascending (configurable) and write into a sheet named YYYY-MM-DD
+   (all requested days in one values.batchUpdate).
 
-Entry point: summarize_day(request)
+Rows are read from the local Working snapshot (core/snapshot.py) when SNAPSHOT_PATH is set:
+the snapshot is always fully reloaded first (hand edits to km / Employee ID / Where / Shot_Date
+are not covered by the incremental drift check, and the day fingerprints must see them), and
+the day filter is an indexed query.
+
+EXPORT_DIR set → the same rows are also written as local files partitioned by date
+(CSV / JSONL / Parquet, core/export.py) for dashboards that should not hit the Sheets API.
+
+Entry points: summarize_day(request), publish_leaderboard(request) (core/leaderboard.py;
+LEADERBOARD_AFTER_SUMMARY=1 → summarize_day also refreshes the standings tab)
 """
 
+import time
+_T0 = time.perf_counter()   # import-time budget (core/startup.py)
+
 import os
-import re
-from typing import List, Optional, Dict
+from typing import List, Dict
 from datetime import datetime, date, timedelta, timezone
 
-import google.auth
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from core import sheets_io, startup
+from core.rows import resolve_schema
+from core.snapshot import open_snapshot
+from core import partitions, leaderboard, export
+from core.summary import (
+    COL_TS, COL_TEAM, COL_EID, COL_MAN, COL_WHERE, OUT_STATUS, IN_STATUS, OUT_DIST, MACH_DIST,
+    OUT_DUR, DIGI_DUR, MACH_DUR, COL_SHOT_DATE, OUT_HEADER, WORK_FIELDS, REQUIRED_FIELDS,
+    TS_PARSER, date_of, parse_date_only, build_summary_rows, latest_per_employee,
+    FINGERPRINT_KEY, input_fingerprint,
+)
+from core.sheets_reader import SERIAL_READS, read_columns_unformatted
+
 
 # =============== TIME / CONFIG ===============
 LOCAL_TZ_OFFSET_HOURS = int(os.getenv("LOCAL_TZ_OFFSET_HOURS", "7"))
@@ -44,372 +69,320 @@ _DEFAULT_YESTERDAY = (datetime.now(_LOCAL_TZ) - timedelta(days=1)).date().isofor
 SPREADSHEET_ID   = os.getenv("SPREADSHEET_ID", "1-ht6PyQtynMG-dMpSGM4I3sVr7HBhb8y33xwl_QZvVA")
 WORK_SHEET_NAME  = os.getenv("WORK_SHEET_NAME", "Form Responses 1 (Working)")
 SUMMARY_DATE_STR = os.getenv("SUMMARY_DATE", _DEFAULT_YESTERDAY)   # YYYY-MM-DD
+SUMMARY_MAX_DAYS = int(os.getenv("SUMMARY_MAX_DAYS", "31"))      # เพดานจำนวนวันต่อคำขอ
 SORT_DESCENDING  = False  # False = old->new, True = newest first
+SKIP_UNCHANGED   = os.getenv("SUMMARY_SKIP_UNCHANGED", "1") == "1"   # input ของวันไม่เปลี่ยน → ไม่เขียนแท็บซ้ำ
+LEADERBOARD_AFTER_SUMMARY = os.getenv("LEADERBOARD_AFTER_SUMMARY", "0") == "1"   # สรุปเสร็จ → อัปเดต standings ต่อ
+
+# Local snapshot column mapping (core/snapshot.py)
+SNAPSHOT_COLUMNS = {
+    "ts": COL_TS, "emp_id": COL_EID, "team": COL_TEAM, "where_val": COL_WHERE, "man_km": COL_MAN,
+    "out_status": OUT_STATUS, "in_status": IN_STATUS, "out_km": OUT_DIST, "mach_km": MACH_DIST,
+    "out_dur_sec": OUT_DUR, "digi_dur_sec": DIGI_DUR, "mach_dur_sec": MACH_DUR,
+    "shot_date": COL_SHOT_DATE,
+}
 
-# =============== COLUMN NAMES (TH / EN) ===============
-# Base (from Working)
-COL_TS    = "Timestamp"  # e.g. '9/17/2025 9:28:21'
-COL_TEAM  = "เลือกทีมของตัวเอง (Select your team)"
-COL_EID   = "รหัสพนักงาน (Employee ID)"
-COL_MAN   = "ระยะทาง หน่วยกิโลเมตร  (Distance in km unit)"
-COL_WHERE = "ลักษณะสถานที่วิ่ง (Where did you run?)"
-
-# Images (pass-through)
-COL_IMG_OUT     = "รูปถ่ายแสดงระยะทาง Outdoor และเวลาจากอุปกรณ์สมาร์ทวอทช์ หรือแอปพลิเคชันจากมือถือ  (Photo showing distance and time from a smartwatch or mobile application)"
-COL_SELFIE_OUT  = "รูปถ่ายตัวเองระหว่างร่วมกิจกรรมแบบ Outdoor (Selfie)"
-COL_IMG_IN_DIGI = "รูปถ่ายแสดงระยะทาง Indoor และเวลาจากอุปกรณ์สมาร์ทวอทช์ หรือแอปพลิเคชันจากมือถือ  (Photo showing distance and time from a smartwatch or mobile application)"
-COL_IMG_IN_MACH = "รูปถ่ายระยะทางจากเครื่องออกกำลังกาย (Photo of the distance display from the exercise machine.)"
-COL_SELFIE_IN   = "รูปถ่ายตัวเองระหว่างร่วมกิจกรรมแบบ Indoor (Selfie)"
-
-# Inputs for merge (from Working)
-OUT_STATUS = "Out_Status"
-IN_STATUS  = "In_Status"
-
-OUT_DIST   = "Out_Distance_km"
-MACH_DIST  = "mach_distance_km"
-
-OUT_DUR    = "Out_Duration_hms"
-DIGI_DUR   = "digi_duration_hms"
-MACH_DUR   = "mach_duration_hms"
-
-# Shot date parsed from OCR (M/D/YYYY), e.g. '3/17/2025'
-COL_SHOT_DATE = "Shot_Date"
-
-# Output column names (Summary sheet)
-OUT_STATUS_COL    = "Value condition"                      # (merged status)
-OUT_DISTANCE_COL  = "Distance"
-OUT_DURATION_COL  = "Duration"
-OUT_CHECK_COL     = "Check distance with input distance"   # ("OK"/"Different"/"N/A")
-OUT_CHECK_DATE    = "Check Date"                           # ("OK"/"NG"/"N/A")
-OUT_SUMMARY       = "Summary"                              # ("OK"/"NG")
-
-
-# =============== SHEETS HELPERS ===============
+
+# =============== SHEETS HELPERS (core/sheets_io.py) ===============
 def _sheets():
-    creds, _ = google.auth.default(scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-    ])
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    return sheets_io.sheets_client()
 
 def _get_values(sheets, a1: str) -> List[List[str]]:
-    return sheets.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID, range=a1
-    ).execute().get("values", [])
+    return sheets_io.get_values(sheets, SPREADSHEET_ID, a1)
 
-def _update_values(sheets, a1: str, values: List[List[str]]):
-    return sheets.spreadsheets().values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=a1,
-        valueInputOption="RAW",
-        body={"values": values},
-    ).execute()
 
-def _list_sheet_titles(sheets) -> List[str]:
-    meta = sheets.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-    return [sh["properties"]["title"] for sh in meta.get("sheets", [])]
-
-def _ensure_sheet_exists(sheets, title: str):
-    if title not in _list_sheet_titles(sheets):
-        sheets.spreadsheets().batchUpdate(
+# =============== CORE ===============
+def _request_params(request) -> dict:
+    """query string และ/หรือ JSON body (JSON ชนะ)"""
+    params: dict = {}
+    if request is not None:
+        params.update(request.args.to_dict() if getattr(request, "args", None) else {})
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            params.update(body)
+    return params
+
+
+def _tab_info(meta: dict) -> Dict[str, Dict]:
+    """title → {"sheet_id", "fp", "fp_id"} (fingerprint ใน developerMetadata ของแท็บ)"""
+    out: Dict[str, Dict] = {}
+    for sh in meta.get("sheets", []):
+        info = {"sheet_id": sh["properties"].get("sheetId"), "fp": None, "fp_id": None}
+        for m in sh.get("developerMetadata", []) or []:
+            if m.get("metadataKey") == FINGERPRINT_KEY:
+                info["fp"], info["fp_id"] = m.get("metadataValue"), m.get("metadataId")
+        out[sh["properties"]["title"]] = info
+    return out
+
+
+def _save_fingerprints(sheets, fps: Dict[str, str], tabs: Dict[str, Dict]):
+    """สร้าง / อัปเดต fingerprint ของแท็บที่เพิ่งเขียน ใน batchUpdate เดียว"""
+    reqs = []
+    for title, fp in fps.items():
+        info = tabs.get(title) or {}
+        if info.get("fp_id") is not None:
+            reqs.append({"updateDeveloperMetadata": {
+                "dataFilters": [{"developerMetadataLookup": {"metadataId": info["fp_id"]}}],
+                "developerMetadata": {"metadataValue": fp},
+                "fields": "metadataValue",
+            }})
+        elif info.get("sheet_id") is not None:
+            reqs.append({"createDeveloperMetadata": {"developerMetadata": {
+                "metadataKey": FINGERPRINT_KEY, "metadataValue": fp,
+                "location": {"sheetId": info["sheet_id"]}, "visibility": "DOCUMENT",
+            }}})
+    if reqs:
+        sheets.spreadsheets().batchUpdate(spreadsheetId=SPREADSHEET_ID, body={"requests": reqs}).execute()
+
+
+def _summary_days(request) -> List[date]:
+    """
+    วันที่ต้องสรุป จาก query string และ/หรือ JSON body (JSON ชนะ):
+      date=YYYY-MM-DD[,YYYY-MM-DD,...]   หรือ   from=YYYY-MM-DD&to=YYYY-MM-DD (รวมทั้งสองวัน)
+    ไม่ส่งมา → SUMMARY_DATE (env; default = เมื่อวาน)
+    ค่าไม่ถูกต้อง / เกิน SUMMARY_MAX_DAYS วัน → ValueError
+    """
+    params = _request_params(request)
+
+    def _day(key: str, v) -> date:
+        d = parse_date_only(str(v).strip())
+        if not d:
+            raise ValueError(f"invalid '{key}': {v!r} (YYYY-MM-DD)")
+        return d
+
+    days: List[date] = []
+    if params.get("date") not in (None, ""):
+        raw = params["date"]
+        items = raw if isinstance(raw, list) else str(raw).split(",")
+        days = [_day("date", v) for v in items if str(v).strip()]
+    elif params.get("from") not in (None, "") or params.get("to") not in (None, ""):
+        d_from = _day("from", params.get("from") or params.get("to"))
+        d_to   = _day("to", params.get("to") or params.get("from"))
+        if d_to < d_from:
+            raise ValueError(f"'to' ({d_to}) is before 'from' ({d_from})")
+        if (d_to - d_from).days + 1 > SUMMARY_MAX_DAYS:
+            raise ValueError(f"range {d_from}..{d_to} exceeds SUMMARY_MAX_DAYS={SUMMARY_MAX_DAYS}")
+        days = [d_from + timedelta(days=k) for k in range((d_to - d_from).days + 1)]
+    else:
+        d = parse_date_only(SUMMARY_DATE_STR)
+        if not d:
+            raise ValueError(f'SUMMARY_DATE "{SUMMARY_DATE_STR}" invalid (YYYY-MM-DD).')
+        days = [d]
+
+    days = sorted(set(days))
+    if len(days) > SUMMARY_MAX_DAYS:
+        raise ValueError(f"{len(days)} dates exceeds SUMMARY_MAX_DAYS={SUMMARY_MAX_DAYS}")
+    return days
+
+
+def _read_working(sheets, work_sheet: str, days: List[date]):
+    """
+    อ่าน Working ครั้งเดียว แล้วแบ่งแถวตามวันที่ (local) ของ Timestamp ในรอบเดียว
+    คืน (header, schema, {day: (rows, unformatted)}); header ว่าง / ขาดคอลัมน์ → buckets = {}
+    """
+    # local snapshot -> indexed day query; otherwise full read + bucket
+    snap = open_snapshot(sheets, SPREADSHEET_ID, work_sheet, columns=SNAPSHOT_COLUMNS)
+    if snap is not None:
+        # full reload: drift check ดูแค่ Timestamp + สถานะ แต่สรุป / fingerprint อ่าน km, Employee ID, Where ฯลฯ ด้วย
+        snap.refresh(force=True)
+        header, rows = list(snap.header), None
+    else:
+        values = _get_values(sheets, f"{work_sheet}!A:AZ")
+        header, rows = (values[0], values[1:]) if values else ([], [])
+    if not header:
+        return header, None, {}
+
+    # columns (resolved + validated once per header, cached in the warm instance)
+    schema = resolve_schema(header, WORK_FIELDS)
+    if schema.missing(*REQUIRED_FIELDS):
+        return header, schema, {}
+    idx_ts = schema.col("ts")
+
+    buckets: Dict[date, tuple] = {}
+    if snap is not None:
+        for d in days:
+            buckets[d] = (snap.rows_for_day(d.isoformat()), {})
+        TS_PARSER.sniff(r[idx_ts] for rows_d, _ in buckets.values() for r in rows_d if idx_ts < len(r))
+        return header, schema, buckets
+
+    if SERIAL_READS:
+        # SERIAL_READS: ค่า serial / ตัวเลข คู่ขนานกับแถว
+        cols = {f: schema.col(f) for f in ("ts", "man", "out_dist", "mach_dist")}
+        all_unf = read_columns_unformatted(sheets, SPREADSHEET_ID, work_sheet, cols, 2, len(rows) + 1)
+        ts_vals = all_unf["ts"]
+    else:
+        all_unf = {}
+        ts_vals = [r[idx_ts] if idx_ts < len(r) else "" for r in rows]
+    TS_PARSER.sniff(ts_vals)
+    pos: Dict[date, List[int]] = {d: [] for d in days}
+    for k in range(len(rows)):
+        ks = pos.get(date_of(TS_PARSER, ts_vals[k]))
+        if ks is not None:
+            ks.append(k)
+    for d, ks in pos.items():
+        buckets[d] = ([rows[k] for k in ks], {f: [vals[k] for k in ks] for f, vals in all_unf.items()})
+    return header, schema, buckets
+
+
+def _latest_rows(schema, day_rows: List[List[str]], unformatted: Dict[str, List]):
+    """แถวของวันหนึ่ง → (แถวล่าสุดต่อ Employee ID เรียงตาม Timestamp, ค่า Timestamp serial คู่ขนาน)"""
+    # เลือกแถวล่าสุดต่อพนักงานก่อน (รอบเดียว) แล้วค่อยคำนวณคอลัมน์สรุปเฉพาะแถวที่รอด
+    survivors, ts_raws = [], []
+    for _key, r in latest_per_employee(schema.wrap_all(day_rows), descending=SORT_DESCENDING):
+        k = r.row_num - 2   # ตำแหน่งใน day_rows (wrap_all เริ่มที่แถว 2)
+        for f in ("man", "out_dist", "mach_dist"):
+            if f in unformatted:
+                r.preset_num(f, unformatted[f][k])
+        survivors.append(r)
+        ts_raws.append(unformatted["ts"][k] if unformatted else None)
+    return survivors, ts_raws
+
+
+def _write_summaries(sheets, outputs: Dict[str, List[List[str]]], titles: List[str]) -> Dict[str, int]:
+    """
+    สร้างแท็บที่ยังไม่มีใน batchUpdate เดียว แล้วเขียนทุกแท็บใน values.batchUpdate เดียว
+    คืน {title: sheetId} ของแท็บที่สร้างใหม่
+    """
+    new_tabs = [t for t in outputs if t not in titles]
+    created: Dict[str, int] = {}
+    if new_tabs:
+        resp = sheets.spreadsheets().batchUpdate(
             spreadsheetId=SPREADSHEET_ID,
-            body={"requests": [{"addSheet": {"properties": {"title": title}}}]},
+            body={"requests": [{"addSheet": {"properties": {"title": t}}} for t in new_tabs]},
         ).execute()
+        for rep in (resp or {}).get("replies", []):
+            props = (rep.get("addSheet") or {}).get("properties") or {}
+            if "title" in props:
+                created[props["title"]] = props.get("sheetId")
+    sheets.spreadsheets().values().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"valueInputOption": "RAW",
+              "data": [{"range": f"{t}!A1", "values": v} for t, v in outputs.items()]},
+    ).execute()
+    return created
 
 
-# =============== GENERIC HELPERS ===============
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
-
-def _idx(header: List[str], name: str) -> Optional[int]:
-    want = _norm(name)
-    for i, h in enumerate(header or []):
-        if _norm(h) == want:
-            return i
-    return None
-
-# Put US-style first to match your actual data patterns,
-# then Thai-style, then ISO.
-_DATE_FORMATS = [
-    "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y",
-    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
-    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
-]
-
-def _parse_date_only(v) -> Optional[date]:
-    """Return date from various formats (also supports Google serial date)."""
-    if v is None or v == "":
-        return None
-    if isinstance(v, (int, float)):
-        # Google serial date
-        try:
-            base = datetime(1899, 12, 30)
-            return (base + timedelta(days=float(v))).date()
-        except Exception:
-            return None
-    s = str(v).strip()
-    # Trim milliseconds if present
-    s2 = re.sub(r"\.\d+$", "", s)
-    for f in _DATE_FORMATS:
-        try:
-            return datetime.strptime(s, f).date()
-        except ValueError:
-            pass
-        if s2 != s:
-            try:
-                return datetime.strptime(s2, f).date()
-            except ValueError:
-                pass
-    # Tolerant: pull M/D/Y anywhere at head; ignore trailing time/noise
-    m = re.search(r"(?<!\d)(\d{1,2})/(\d{1,2})/(\d{2,4})", s)
-    if m:
-        mm, dd, yy = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        if yy < 100: yy += 2000
-        if yy > 2400: yy -= 543  # BE -> CE
-        try:
-            return date(yy, mm, dd)
-        except Exception:
-            return None
-    return None
-
-def _parse_datetime(v) -> Optional[datetime]:
-    """Return datetime; supports Google serial date."""
-    if v is None or v == "":
-        return None
-    if isinstance(v, (int, float)):
-        try:
-            base = datetime(1899, 12, 30)
-            return base + timedelta(days=float(v))
-        except Exception:
-            return None
-    s = str(v).strip()
-    s2 = re.sub(r"\.\d+$", "", s)
-    for f in _DATE_FORMATS:
-        try:
-            return datetime.strptime(s, f)
-        except ValueError:
-            pass
-        if s2 != s:
-            try:
-                return datetime.strptime(s2, f)
-            except ValueError:
-                pass
-    # ISO-ish
-    m = re.search(r"(?<!\d)(20\d{2})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2})(?::(\d{2}))?", s)
-    if m:
-        y, mo, dd = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        hh, mm = int(m.group(4)), int(m.group(5))
-        ss = int(m.group(6) or "0")
-        try:
-            return datetime(y, mo, dd, hh, mm, ss)
-        except Exception:
-            return None
-    return None
-
-def _to_float(x) -> Optional[float]:
-    try:
-        if x is None or x == "":
-            return None
-        s = str(x).strip().replace(",", ".")
-        return float(s)
-    except Exception:
-        return None
-
-def _first_non_empty(*vals: str) -> str:
-    for v in vals:
-        if v is None:
-            continue
-        s = str(v).strip()
-        if s != "":
-            return s
-    return ""
-
-def _min_duration_hms(a: Optional[str], b: Optional[str]) -> str:
-    """Pick the smaller HH:MM:SS; return '' if both missing/invalid."""
-    def to_sec(hms: Optional[str]) -> Optional[int]:
-        if not hms:
-            return None
-        try:
-            h, m, s = hms.strip().split(":")
-            return int(h)*3600 + int(m)*60 + int(s)
-        except Exception:
-            return None
-    sa, sb = to_sec(a), to_sec(b)
-    if sa is None and sb is None:
-        return ""
-    if sa is None:
-        return b or ""
-    if sb is None:
-        return a or ""
-    return a if sa <= sb else b
-
-
-# =============== CORE ===============
 def summarize_day(request):
     if not SPREADSHEET_ID or SPREADSHEET_ID == "PUT_YOUR_SHEET_ID":
         return ("[CONFIG] SPREADSHEET_ID is missing.", 400)
 
-    target_day = _parse_date_only(SUMMARY_DATE_STR)
-    if not target_day:
-        return (f'[CONFIG] SUMMARY_DATE "{SUMMARY_DATE_STR}" invalid (YYYY-MM-DD).', 400)
+    try:
+        days = _summary_days(request)
+    except ValueError as e:
+        return (f"[CONFIG] {e}", 400)
+    force = str(_request_params(request).get("force", "")).strip().lower() in ("1", "true", "yes")
 
     try:
         sheets = _sheets()
+        # metadata ครั้งเดียว: ชื่อแท็บ + fingerprint เดิมของแท็บผลลัพธ์
+        tabs = _tab_info(sheets.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute())
+        titles = list(tabs)
+
+        # WORK_PARTITION=day → อ่านเฉพาะแท็บ Working ของแต่ละวัน (ไม่มีแท็บ = ไม่มีแถว)
+        # ปกติ → อ่านแท็บ Working ครั้งเดียวสำหรับทุกวัน
+        buckets: Dict[date, tuple] = {}
+        if partitions.enabled():
+            for d in days:
+                work_sheet = partitions.partition_tab(WORK_SHEET_NAME, d.isoformat())
+                if work_sheet not in titles:
+                    buckets[d] = (None, [], {})
+                    continue
+                header, schema, got = _read_working(sheets, work_sheet, [d])
+                if header and schema.missing(*REQUIRED_FIELDS):
+                    return (f"[ERROR] Missing columns in Working. Header={header}", 400)
+                rows_d, unf = got.get(d, ([], {}))
+                buckets[d] = (schema, rows_d, unf)
+        else:
+            work_sheet = WORK_SHEET_NAME
+            if work_sheet not in titles:
+                return (f"[ERROR] Sheet '{work_sheet}' not found. Available: {titles}", 400)
+            header, schema, got = _read_working(sheets, work_sheet, days)
+            if not header:
+                return (f"[DATA] Sheet '{work_sheet}' is empty.", 200)
+            if schema.missing(*REQUIRED_FIELDS):
+                return (f"[ERROR] Missing columns in Working. Header={header}", 400)
+            buckets = {d: (schema, rows_d, unf) for d, (rows_d, unf) in got.items()}
+
+        # input ของวันเหมือนรอบก่อน (fingerprint ตรงกับที่เก็บในแท็บ) → ไม่ต้องคำนวณ / เขียนซ้ำ
+        fps = {d.isoformat(): input_fingerprint(*buckets[d], extra=[SORT_DESCENDING]) for d in days}
+        unchanged = set()
+        if SKIP_UNCHANGED and not force:
+            unchanged = {d for d in days if (tabs.get(d.isoformat()) or {}).get("fp") == fps[d.isoformat()]
+                         and (not export.enabled() or export.exported(d.isoformat()))}
+        todo = [d for d in days if d not in unchanged]
+        if not todo:
+            if len(days) == 1:
+                return (f"[SKIP] '{days[0].isoformat()}' unchanged since last summary.", 200)
+            return (f"[SKIP] {len(days)} days unchanged since last summary.", 200)
+
+        # แถวที่รอดของทุกวัน → คำนวณคอลัมน์สรุปในครั้งเดียว (numpy ถ้ามี: core/summary.build_summary_rows)
+        spans: Dict[date, tuple] = {}
+        survivors, ts_raws = [], []
+        for d in todo:
+            schema, day_rows, unformatted = buckets[d]
+            rows_d, raws_d = _latest_rows(schema, day_rows, unformatted) if day_rows else ([], [])
+            spans[d] = (len(survivors), len(survivors) + len(rows_d))
+            survivors += rows_d
+            ts_raws += raws_d
+        built = build_summary_rows(survivors, ts_raws)
+
+        outputs: Dict[str, List[List[str]]] = {}
+        counts: Dict[str, object] = {d.isoformat(): "unchanged" for d in unchanged}
+        for d in todo:
+            a, b = spans[d]
+            outputs[d.isoformat()] = [OUT_HEADER] + built[a:b]
+            counts[d.isoformat()] = (b - a) if buckets[d][1] else -1
+
+        created = _write_summaries(sheets, outputs, titles)
+        for t, sid in created.items():
+            tabs[t] = {"sheet_id": sid, "fp": None, "fp_id": None}
+        if export.enabled():
+            try:
+                export.export_days(outputs)
+            except OSError as e:
+                # แท็บเขียนแล้วแต่ยังไม่เก็บ fingerprint → รอบถัดไปสรุป + export วันนี้ใหม่
+                return (f"[EXPORT error] {e}", 500)
+        # เก็บ fingerprint หลังทุกปลายทางเขียนสำเร็จเท่านั้น (export ล้มแบบไหนก็ไม่ถูกข้ามรอบหน้า)
+        _save_fingerprints(sheets, {t: fps[t] for t in outputs}, tabs)
+        if LEADERBOARD_AFTER_SUMMARY:
+            leaderboard.publish(sheets, SPREADSHEET_ID)
+
+        if len(days) == 1:
+            dest_title = days[0].isoformat()
+            if counts[dest_title] < 0:
+                return (f"[RESULT] No rows for {dest_title}.", 200)
+            return (f"[OK] summarized {counts[dest_title]} employees -> '{dest_title}'", 200)
+        parts = [f"'{t}'={n if n == 'unchanged' or n >= 0 else 'no rows'}" for t, n in sorted(counts.items())]
+        return (f"[OK] summarized {len(days)} days: " + ", ".join(parts), 200)
+
+    except HttpError as e:
+        return (f"[Google API error] {str(e)}", 500)
+    except Exception as e:
+        return (f"[Unhandled error] {e}", 500)
 
-        # Ensure working sheet exists
-        titles = _list_sheet_titles(sheets)
-        if WORK_SHEET_NAME not in titles:
-            return (f"[ERROR] Sheet '{WORK_SHEET_NAME}' not found. Available: {titles}", 400)
-
-        # Load working
-        values = _get_values(sheets, f"{WORK_SHEET_NAME}!A:AZ")
-        if not values:
-            return (f"[DATA] Sheet '{WORK_SHEET_NAME}' is empty.", 200)
-
-        header, rows = values[0], values[1:]
-
-        # indexes
-        idx_ts        = _idx(header, COL_TS)
-        idx_team      = _idx(header, COL_TEAM)
-        idx_eid       = _idx(header, COL_EID)
-        idx_man       = _idx(header, COL_MAN)
-        idx_where     = _idx(header, COL_WHERE)
-
-        idx_out_sta   = _idx(header, OUT_STATUS)
-        idx_in_sta    = _idx(header, IN_STATUS)
-
-        idx_out_dist  = _idx(header, OUT_DIST)
-        idx_mach_dist = _idx(header, MACH_DIST)
-
-        idx_out_dur   = _idx(header, OUT_DUR)
-        idx_digi_dur  = _idx(header, DIGI_DUR)
-        idx_mach_dur  = _idx(header, MACH_DUR)
-
-        idx_img_out     = _idx(header, COL_IMG_OUT)
-        idx_selfie_out  = _idx(header, COL_SELFIE_OUT)
-        idx_img_in_digi = _idx(header, COL_IMG_IN_DIGI)
-        idx_img_in_mach = _idx(header, COL_IMG_IN_MACH)
-        idx_selfie_in   = _idx(header, COL_SELFIE_IN)
-
-        idx_shot_date   = _idx(header, COL_SHOT_DATE)
-
-        required = [idx_ts, idx_team, idx_eid, idx_man, idx_where,
-                    idx_out_sta, idx_in_sta, idx_out_dist, idx_mach_dist,
-                    idx_out_dur, idx_digi_dur, idx_mach_dur]
-        if any(x is None for x in required):
-            return (f"[ERROR] Missing columns in Working. Header={header}", 400)
-
-        # filter by day
-        day_rows: List[List[str]] = []
-        for r in rows:
-            d = _parse_date_only(r[idx_ts] if idx_ts is not None and idx_ts < len(r) else "")
-            if d == target_day:
-                day_rows.append(r)
-
-        # prepare destination header
-        dest_title = target_day.isoformat()
-        _ensure_sheet_exists(sheets, dest_title)
-
-        out_header = [
-            COL_TS, COL_TEAM, COL_EID, COL_MAN, COL_WHERE,
-            COL_IMG_OUT, COL_SELFIE_OUT, COL_IMG_IN_DIGI, COL_IMG_IN_MACH, COL_SELFIE_IN,
-            OUT_DISTANCE_COL, OUT_DURATION_COL, OUT_STATUS_COL, OUT_CHECK_COL,
-            OUT_CHECK_DATE, OUT_SUMMARY
-        ]
-
-        if not day_rows:
-            _update_values(sheets, f"{dest_title}!A1", [out_header])
-            return (f"[RESULT] No rows for {dest_title}.", 200)
-
-        # build rows with merged columns
-        built: List[List[str]] = []
-        for r in day_rows:
-            ts     = r[idx_ts]    if idx_ts    is not None and idx_ts    < len(r) else ""
-            team   = r[idx_team]  if idx_team  is not None and idx_team  < len(r) else ""
-            eid    = r[idx_eid]   if idx_eid   is not None and idx_eid   < len(r) else ""
-            man    = r[idx_man]   if idx_man   is not None and idx_man   < len(r) else ""
-            wherev = r[idx_where] if idx_where is not None and idx_where < len(r) else ""
-
-            # images
-            img_out     = r[idx_img_out]     if idx_img_out     is not None and idx_img_out     < len(r) else ""
-            selfie_out  = r[idx_selfie_out]  if idx_selfie_out  is not None and idx_selfie_out  < len(r) else ""
-            img_in_digi = r[idx_img_in_digi] if idx_img_in_digi is not None and idx_img_in_digi < len(r) else ""
-            img_in_mach = r[idx_img_in_mach] if idx_img_in_mach is not None and idx_img_in_mach < len(r) else ""
-            selfie_in   = r[idx_selfie_in]   if idx_selfie_in   is not None and idx_selfie_in   < len(r) else ""
-
-            # Value condition (merged status)
-            out_sta = r[idx_out_sta] if idx_out_sta is not None and idx_out_sta < len(r) else ""
-            in_sta  = r[idx_in_sta]  if idx_in_sta  is not None and idx_in_sta  < len(r) else ""
-            value_condition = _first_non_empty(out_sta, in_sta)
-
-            # Distance (merged)
-            out_dist  = r[idx_out_dist]  if idx_out_dist  is not None and idx_out_dist  < len(r) else ""
-            mach_dist = r[idx_mach_dist] if idx_mach_dist is not None and idx_mach_dist < len(r) else ""
-            distance  = _first_non_empty(out_dist, mach_dist)
-
-            # Duration (by where)
-            where_lc = (wherev or "").strip().lower()
-            if "indoor" in where_lc or "ในร่ม" in where_lc:
-                digi_dur = r[idx_digi_dur] if idx_digi_dur is not None and idx_digi_dur < len(r) else ""
-                mach_dur = r[idx_mach_dur] if idx_mach_dur is not None and idx_mach_dur < len(r) else ""
-                duration = _min_duration_hms(digi_dur, mach_dur)
-            else:
-                duration = r[idx_out_dur] if idx_out_dur is not None and idx_out_dur < len(r) else ""
-
-            # Check distance with input distance
-            dist_num = _to_float(distance)
-            man_num  = _to_float(man)
-            if (dist_num is None) or (man_num is None):
-                check_distance = "N/A"
-            else:
-                check_distance = "OK" if dist_num == man_num else "Different"
-
-            # Check Date
-            ts_date_only = _parse_date_only(ts)  # expects '9/17/2025 9:28:21' etc.
-            shot_raw = r[idx_shot_date] if (idx_shot_date is not None and idx_shot_date < len(r)) else ""
-            shot_raw_stripped = str(shot_raw).strip()
-            if not shot_raw_stripped:
-                check_date = "N/A"  # ว่าง = N/A
-            else:
-                shot_date_only = _parse_date_only(shot_raw_stripped)  # expects '3/17/2025'
-                if (ts_date_only is not None) and (shot_date_only is not None) and (ts_date_only == shot_date_only):
-                    check_date = "OK"
-                elif (ts_date_only is not None) and (shot_date_only is not None):
-                    check_date = "Different"   # <-- เปลี่ยนจากเดิมที่เป็น "NG"
-                else:
-                    check_date = "N/A"
-
-            # Summary
-            summary = "OK" if (value_condition == "OK" and check_distance == "OK" and check_date == "OK") else "NG"
-
-            built.append([
-                ts, team, eid, man, wherev,
-                img_out, selfie_out, img_in_digi, img_in_mach, selfie_in,
-                distance, duration, value_condition, check_distance,
-                check_date, summary
-            ])
-
-        # group by Employee ID -> pick latest timestamp
-        def _dt_for_sort(row: List[str]) -> datetime:
-            return _parse_datetime(row[0]) or datetime(1970, 1, 1)
-
-        groups: Dict[str, List[List[str]]] = {}
-        for row in built:
-            emp = (row[2] or "").strip()
-            if not emp:
-                continue
-            groups.setdefault(emp, []).append(row)
-
-        chosen: List[List[str]] = []
-        for emp, items in groups.items():
-            latest = max(items, key=_dt_for_sort)
-            chosen.append(latest)
-
-        chosen.sort(key=_dt_for_sort, reverse=SORT_DESCENDING)
-
-        _update_values(sheets, f"{dest_title}!A1", [out_header] + chosen)
-        return (f"[OK] summarized {len(chosen)} employees -> '{dest_title}'", 200)
 
+def publish_leaderboard(request):
+    """
+    Entry point: อัปเดตแท็บ standings จากแท็บสรุปรายวัน
+    พารามิเตอร์ (ไม่บังคับ) date / from / to เหมือน summarize_day; ไม่ส่ง = ทุกวันที่มีแท็บ
+    """
+    if not SPREADSHEET_ID or SPREADSHEET_ID == "PUT_YOUR_SHEET_ID":
+        return ("[CONFIG] SPREADSHEET_ID is missing.", 400)
+    days = None
+    params = _request_params(request)
+    if any(params.get(k) not in (None, "") for k in ("date", "from", "to")):
+        try:
+            days = [d.isoformat() for d in _summary_days(request)]
+        except ValueError as e:
+            return (f"[CONFIG] {e}", 400)
+    try:
+        stats = leaderboard.publish(_sheets(), SPREADSHEET_ID, days)
+        return (f"[OK] leaderboard -> '{leaderboard.LEADERBOARD_SHEET_NAME}': "
+                f"{stats['participants']} employees, {stats['teams']} teams, {stats['days']} days", 200)
     except HttpError as e:
         return (f"[Google API error] {str(e)}", 500)
     except Exception as e:
         return (f"[Unhandled error] {e}", 500)
+
+
+IMPORT_STATS = startup.report("summary_daily_record", _T0)